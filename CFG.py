@@ -1,6 +1,6 @@
 import parse
+import analysis
 import operator
-import copy
 import re
 from stack import *
 from structure import *
@@ -14,10 +14,38 @@ function_table = Function_Table()
 global_symbol_table = Symbol_Table(None)
 global_value_table = ValueTable()
 
-temp_dictionary = {}
-
 line_num = -1
 
+# Global variables of the program, for analyzing functions as they are built
+global_runtime_table = None
+# Defaults of the settings of a Program.
+# False: run graphs as build_graph makes them, without compact_graph
+compact = True
+# False: run statements with evaluate instead of compiling them into closures
+compiled = True
+# Entries into a loop or function after which it is compiled into closures, 0 for always
+tier_threshold = 16
+# "graph": step through graphs with Stepper, "vm": run their bytecode on vm.Machine
+engine = "vm"
+
+
+# Settings of a program being run, and counters of how its graphs were built and compiled
+class Program:
+    def __init__(self):
+        self.compact = compact
+        self.compiled = compiled
+        self.tier_threshold = tier_threshold
+        self.engine = engine
+        # Function name -> names of the functions it calls, in call order, for the functions built so far
+        self.call_graph = {}
+        self.functions_materialized = 0 # Functions whose graph has been built
+        # Nodes and edges compact_graph has removed
+        self.nodes_removed = 0
+        self.edges_removed = 0
+        self.nodes_compiled = 0 # Nodes compiled into closures
+        # Tier-ups so far: (kind, first line, entries, nodes compiled), kind "loop" or "function"
+        self.tier_ups = []
+
 
 class Dummy:
     def __init__(self):
@@ -26,6 +54,9 @@ class Dummy:
     def __str__(self):
         return "Dummy Statement"
 
+# What a step onto a line without a statement runs
+skipped_line = Dummy()
+
 class Node:
     def __init__(self, block, line_list, pred=None):
         global node_index
@@ -33,16 +64,29 @@ class Node:
         node_index += 1
         self.prev = []
         self.next = []
+        # Per successor, whether compact_graph threaded the edge past empty nodes
+        self.quiet = []
 
         self.block = block
         self.pred = pred
         self.line_list = line_list
-        self.cursor = 0
+        # Line-step table, from prepare_steps: per statement, the line a step onto it from
+        # the statement before stops at, and per successor, the line a step onto it stops at
+        self.first_lines = None
+        self.edge_lines = None
+        self.code = None # Closures of the block and condition, from compile_graph
+        self.pred_code = None
+        self.runs = 0 # Times a step entered the node
+        # Loop or graph compiled once the node gets hot, from prepare_steps
+        self.region = None
 
         self.branch = False
+        # Name of the function whose graph runs after this node's block
+        self.callee = None
 
     def insert_next(self, node):
         self.next.append(node)
+        self.quiet.append(False)
         node.prev.append(self)
         if len(self.next) > 1:
             self.branch = True
@@ -50,6 +94,7 @@ class Node:
     def insert_prev(self, node):
         self.prev.append(node)
         node.next.append(self)
+        node.quiet.append(False)
 
     def get_next(self):
         return self.next
@@ -66,81 +111,269 @@ class Node:
     def find_prev_branch(self):
         pass
 
-    def next_line(self):
+    # The node after a non-branch node: a callee's entry, the next node, or the node
+    # the call into this graph continues from, popped from returns
+    def successor(self, program, returns):
+        if self.callee is not None:
+            returns.append(self.next[0])
+            return function_graph(self.callee, program)[0]
+        if len(self.next) > 0:
+            return self.next[0]
+        if len(returns) > 0:
+            return returns.pop()
+        return None
+
+    # Leaves the node by its true or false branch or its successor. Returns the next
+    # node, None at the end of the program, and the line a step onto it stops at
+    def leave(self, program, returns):
+        if self.branch:
+            if (self.pred_code() if self.pred_code is not None else evaluate(0, self.pred)):
+                return self.next[0], self.edge_lines[0]
+            return self.next[1], self.edge_lines[1]
+        if self.callee is None and len(self.next) > 0:
+            return self.next[0], self.edge_lines[0]
+        next_node = self.successor(program, returns)
+        return next_node, edge_line(self, next_node, False) if next_node is not None else None
+
+
+# Statement after which a step never stops on the lines it skips
+def is_call_related(stmt):
+    return (isinstance(stmt, parse.Statement) and stmt.returning) or is_call_stmt(stmt) or is_call_assign_stmt(stmt)
+
+
+# Line a step from a statement at line_num onto one at line stops at: the line after
+# line_num when the step skips lines, unless the statement is call-related
+def stop_line(stmt, line_num, line):
+    if is_call_related(stmt) or line_num == -1 or line <= line_num + 1:
+        return line
+    return line_num + 1
+
+
+# Line a step from the end of a node's block onto another node stops at, None if that
+# node is empty. Quiet edges and empty blocks never stop on the lines they skip
+def edge_line(node, next_node, quiet):
+    if len(next_node.block) == 0:
+        return None
+    line = next_node.line_list[0]
+    if quiet or len(node.block) == 0:
+        return line
+    return stop_line(node.block[-1], node.line_list[-1], line)
+
+
+# Line-step table of a graph: per node, the line a step onto each statement stops at,
+# from the statement before it or, for the first, from each predecessor. The table
+# stays as it is while the program runs, as graphs are shared by every call.
+# The entry and loop headers also get the region they compile when hot
+def prepare_steps(entry):
+    nodes = graph_nodes(entry)
+    for node in nodes:
+        node.first_lines = node.line_list[:1] + [
+            stop_line(node.block[index - 1], node.line_list[index - 1], node.line_list[index])
+            for index in range(1, len(node.block))]
+        node.edge_lines = [edge_line(node, next_node, quiet) for next_node, quiet in zip(node.next, node.quiet)]
+    for header, body in loops(entry):
+        header.region = ("loop", body)
+    entry.region = ("function", nodes)
+
+
+# Natural loops of a graph, as (header, nodes of the loop). Calls are not followed
+def loops(entry):
+    back_edges = []
+    on_path = {id(entry)}
+    seen = {id(entry)}
+    path = [(entry, iter(entry.next))]
+    while len(path) > 0:
+        node, next_nodes = path[-1]
+        next_node = next(next_nodes, None)
+        if next_node is None:
+            path.pop()
+            on_path.discard(id(node))
+        elif id(next_node) in on_path:
+            back_edges.append((node, next_node))
+        elif id(next_node) not in seen:
+            seen.add(id(next_node))
+            on_path.add(id(next_node))
+            path.append((next_node, iter(next_node.next)))
+    bodies = {}
+    for tail, header in back_edges:
+        body = bodies.setdefault(id(header), (header, [header]))[1]
+        members = {id(node) for node in body}
+        stack = [tail]
+        while len(stack) > 0:
+            node = stack.pop()
+            if id(node) not in members:
+                members.add(id(node))
+                body.append(node)
+                stack += node.prev
+    return list(bodies.values())
+
+
+# Counts a step entering a node, and compiles its region when it gets hot
+def enter(node, program):
+    node.runs += 1
+    if node.runs == program.tier_threshold and node.region is not None and program.compiled:
+        tier_up(program, *node.region, node.runs)
+
+
+# Loops of the functions built so far, as (first line, entries), in line order
+def loop_entries():
+    entries = []
+    for fun_entry in function_table.table.values():
+        if fun_entry.graph is not None:
+            for node in graph_nodes(fun_entry.graph[0]):
+                if node.region is not None and node.region[0] == "loop":
+                    entries.append((first_line(node.region[1]), node.runs))
+    return sorted(entries, key=lambda entry: entry[0] or 0)
+
+
+# Compiles the nodes of a region not compiled yet, and records the tier-up
+def tier_up(program, kind, nodes, runs):
+    cold = [node for node in nodes if node.code is None]
+    if len(cold) == 0:
+        return
+    for node in cold:
+        compile_node(node)
+    program.nodes_compiled += len(cold)
+    program.tier_ups.append((kind, first_line(nodes), runs, len(cold)))
+
+
+# Lowest line of the statements of some nodes, None if they have none
+def first_line(nodes):
+    lines = [line for node in nodes for line in node.line_list]
+    return min(lines) if len(lines) > 0 else None
+
+
+# Position of the running program: a node, the statement of its block the next step
+# runs, and the line that step stops at
+class Stepper:
+    def __init__(self, node, program):
+        self.node = node
+        self.program = program
+        self.index = 0 # Statement of node's block the next step runs
+        self.line = node.first_lines[0] if len(node.block) != 0 else None
+        self.returns = [] # Nodes to continue from when the graph of a called function ends
+
+    # Runs up to count steps, returning how many were taken: fewer at the end of the program
+    def run(self, count):
+        for steps in range(count):
+            if not self.step():
+                return steps
+        return count
+
+    # Runs one step, returning False at the end of the program
+    def step(self):
         global line_num
-        node = self
-        dummy_stmt = Dummy()
-        next_node = None
-        expr = None
-        if len(node.block) != 0:
-            expr = node.get_line(node.cursor)
-            evaluate(node.get_line_list()[node.cursor], expr)
-            line_num = node.get_line_list()[node.cursor]
-            if node.cursor < (len(node.block) -1):
-                node.cursor += 1
-                next_node = node
+        node, index, line = self.node, self.index, self.line
+        while len(node.block) == 0:
+            node, line = node.leave(self.program, self.returns)
+            if node is None:
+                self.node = None
+                return False
+            enter(node, self.program)
+            index = 0
+        if line < node.line_list[index]:
+            if node.code is not None:
+                skipped_line_code()
             else:
-                node.cursor = 0
-                if node.branch:
-                    # for i, pred in enumerate(self.pred):
-                    #     if evaluate(pred):
-                    #         next = self.get_next()[i]
-                    #         return next, next.get_line(self.get_line_list()[0]), self.get_line_list()[0]
-                    # raise Exception("no true branch")
-                    if evaluate(0, node.pred): # Ideally, substitution should not be here
-                        next_node = node.get_next()[0]
-                    else:
-                        next_node = node.get_next()[1]
-                else:
-                    if len(node.get_next()) > 0:
-                        next_node = node.get_next()[0]
-                    else:
-                        pass
+                evaluate(line, skipped_line)
+            line_num = line
+            self.node, self.index, self.line = node, index, line + 1
+            return True
+
+        if node.code is not None:
+            node.code[index]()
         else:
-            if node.branch:
-                # for i, pred in enumerate(self.pred):
-                #     if evaluate(pred):
-                #         next = self.get_next()[i]
-                #         return next, next.get_line(self.get_line_list()[0]), self.get_line_list()[0]
-                # raise Exception("no true branch")
-                if evaluate(0, node.pred):  # Ideally, substitution should not be here
-                    next_node = node.get_next()[0]
-                else:
-                    next_node = node.get_next()[1]
-            else:
-                if len(node.get_next()) > 0:
-                    next_node = node.get_next()[0]
-                else:
-                    pass
-            if next_node != None:
-                next_node = next_node.next_line()
-        if expr != None and next_node != None:
-            if len(next_node.block) != 0:
-                cur_line = next_node.get_line_list()[next_node.cursor]
-                # print(node.cursor, line_num, cur_line)
-                # print(expr)
-                if not ((isinstance(expr, parse.Statement) and expr.returning) or (
-                        isinstance(expr, parse.Statement) and isinstance(expr.content, parse.FuncCall)) or (
-                                isinstance(expr, parse.Statement) and isinstance(expr.content, parse.Assign) and isinstance(
-                                expr.content.rvalue, parse.FuncCall) or (
-                                        isinstance(expr, parse.Assign) and isinstance(expr.rvalue,
-                                                                                      parse.FuncCall)))) and line_num != -1 and cur_line > line_num + 1:
-                    # print("Insert Dummy")
-                    next_node.block.insert(next_node.cursor, dummy_stmt)
-                    next_node.line_list.insert(next_node.cursor, line_num + 1)
-        return next_node
+            evaluate(node.line_list[index], node.block[index])
+        line_num = node.line_list[index]
+        if index < len(node.block) - 1:
+            index += 1
+            line = node.first_lines[index]
+        else:
+            if node is self.node: # If the condition fails, the next step starts the block again
+                self.index, self.line = 0, node.first_lines[0]
+            node, line = node.leave(self.program, self.returns)
+            index = 0
+            if node is None:
+                self.node = None
+                return False
+            enter(node, self.program)
+        self.node, self.index, self.line = node, index, line
+        return True
+
+
+# Nodes reachable from a node, in breadth-first order
+def graph_nodes(node):
+    nodes = [node]
+    seen = {id(node)}
+    for node in nodes:
+        for next_node in node.next:
+            if id(next_node) not in seen:
+                seen.add(id(next_node))
+                nodes.append(next_node)
+    return nodes
+
+
+# Division of two ints truncates. +, - and * of ints are ints already
+def divide(lhs, rhs):
+    result = operator.truediv(lhs, rhs)
+    if type(lhs) == int and type(rhs) == int:
+        result = int(result)
+    return result
+
+
+operations = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': divide, '<': operator.lt, '>': operator.gt, '==': operator.eq}
+
 
 def binop(op, lhs, rhs):
-    operations = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '<': operator.lt, '>': operator.gt, '==': operator.eq}
-    result = operations[op](lhs, rhs)
-    if op in ['+', '-', '*', '/']:
-        if type(lhs) == int and type(rhs) == int:
-            result = int(result)
-    return result
+    return operations[op](lhs, rhs)
+
+
+# Division of operands analysis typed as ints, which truncates without checking types
+def int_divide(lhs, rhs):
+    return int(operator.truediv(lhs, rhs))
+
+
+# Operator of a BinOp, specialized on the static types of its operands. A float operand
+# makes division true division; int operands make it truncating. Other operators do
+# not depend on the types
+def typed_operation(expr):
+    if expr.op != '/':
+        return operations.get(expr.op)
+    types = [analysis.static_type(expr.left), analysis.static_type(expr.right)]
+    if 'float' in types:
+        return operator.truediv
+    elif types == ['int', 'int']:
+        return int_divide
+    return divide
+
+
+# Frame of a variable, as bound by analysis.resolve_names
+def frame_of(var):
+    scope = var.binding[0]
+    if scope is GLOBAL:
+        return global_value_table
+    return function_table.table[scope].ref_value
+
+
+# Address of a variable in its frame. Variables not allocated yet are KeyErrors
+def address_of(value_table, var):
+    slot = var.binding[1]
+    address = value_table.get_slot_address(slot) if slot is not None else None
+    if address is None:
+        raise KeyError(var.name)
+    return address
+
+
+# Globals are only looked up as whole variables: indexing or incrementing one is a KeyError
+def local_address(var):
+    if var.binding[0] is GLOBAL:
+        raise KeyError(var.name)
+    return address_of(frame_of(var), var)
 
 
 def evaluate(line, expr):
-    cur_fun_name = call_stack.called[0].name
+    cur_context = call_stack.called[0]
+    cur_fun_name = cur_context.name
     cur_fun_table = function_table.table[cur_fun_name]
     cur_symbol_table = cur_fun_table.ref_sym
     cur_value_table = cur_fun_table.ref_value
@@ -181,6 +414,8 @@ def evaluate(line, expr):
             # variables = expr.decl_assigns
             # var_type = expr.base_type.type
             # int a; no declaration with init value.
+            # In the frame of the function analysis.resolve_names found it in
+            decl_fun_table = function_table.table[expr.scope]
             variables = expr.desugar()
             for variable in variables:
                 var_name = variable.name
@@ -190,8 +425,8 @@ def evaluate(line, expr):
 
                 if isinstance(var_type, parse.Arrayed):
                     var_length = var_type.len
+                    var_init_value = new_array(var_type.base.type, var_length)
                     var_type = var_type.base.type + ' pointer'
-                    var_init_value = [None] * var_length
                 elif isinstance(var_type, parse.Asterisked):
                     var_type = var_type.base.type + ' pointer'
                 else:
@@ -208,8 +443,8 @@ def evaluate(line, expr):
 
 
 
-                cur_symbol_table.insert(var_name, var_type, var_length)
-                cur_value_table.allocate_local(var_name, var_init_value, expr.line_num)
+                decl_fun_table.ref_sym.insert(var_name, var_type, var_length)
+                decl_fun_table.ref_value.allocate_local(var_name, var_init_value, expr.line_num)
             return None
         elif isinstance(expr, parse.Assign):
             # a = 2;
@@ -224,48 +459,30 @@ def evaluate(line, expr):
             if value != None:
                 var = expr.lvalue
                 if isinstance(var, parse.ArrayIdx):
-                    array_name = var.array.name
-                    if array_name in cur_value_table.table:
-                        value_table = cur_value_table
-                    else:
-                        value_table = global_value_table
+                    value_table = frame_of(var.array)
                     array_index = evaluate(0, var.index)
-                    array_cur_value = value_table.get_value(array_name)
-                    array_value = copy.deepcopy(array_cur_value)
-                    array_value[array_index] = value
-                    value_table.set_value(array_name, array_value, line)
+                    value_table.set_element_from_address(address_of(value_table, var.array), array_index, value, line)
                 elif isinstance(var, parse.Temp_Ident):
-                    temp_var_name = var.name
-                    temp_dictionary[temp_var_name] = value
+                    cur_context.set_temp(var.slot, value)
                 else:
-                    var_name = var.name
-                    if var_name in cur_value_table.table:
-                        value_table = cur_value_table
-                        symbol_table = cur_symbol_table
-                    else:
-                        value_table = global_value_table
-                        symbol_table = global_symbol_table
-                    var_type = symbol_table.table[var_name].type
-                    if var_type == 'int':
-                        value = int(value)
-                    elif var_type == 'float':
-                        value = float(value)
-                    value_table.set_value(var_name, value, line)
+                    value_table = frame_of(var)
+                    address = address_of(value_table, var)
+                    if expr.convert is not None:
+                        value = expr.convert(value)
+                    value_table.set_value_from_address(address, value, line)
             return None
         elif isinstance(expr, parse.Identifier):
-            # variable: a
-            if expr.name in cur_value_table.table:
-                value_table = cur_value_table
-            else:
-                value_table = global_value_table
-            return value_table.get_value(expr.name)
+            # variable: a, from the frame it was resolved to
+            return cur_value_table.get_value_at(address_of(frame_of(expr), expr))
         elif isinstance(expr, parse.Temp_Ident):
-            return temp_dictionary[expr.name]
+            value = cur_context.get_temp(expr.slot)
+            if value is None:
+                raise KeyError(expr.name)
+            return value
         elif isinstance(expr, parse.ArrayIdx):
             # variable: a
-            array_name = expr.array.name
             array_index = evaluate(0, expr.index)
-            array_cur_value = cur_value_table.get_value(array_name)
+            array_cur_value = cur_value_table.get_value_at(local_address(expr.array))
             return array_cur_value[array_index]
         elif isinstance(expr, parse.Const):
             # const: 3
@@ -274,14 +491,13 @@ def evaluate(line, expr):
             # a + b
             lhs = evaluate(line, expr.left)
             rhs = evaluate(line, expr.right)
-            op = expr.op
-            return binop(op, lhs, rhs)
+            return operations[expr.op](lhs, rhs)
         elif isinstance(expr, parse.UniOp):
             # only a++?
             if expr.op == '++':
                 operand = evaluate(line, expr.operand)
                 value = binop('+', operand, 1)
-                cur_value_table.set_value(expr.operand.name, value, line)
+                cur_value_table.set_value_from_address(local_address(expr.operand), value, line)
                 return binop('+', operand, 1)
             elif expr.op == '-' and not expr.postfix:
                 operand = -1 * evaluate(line, expr.operand)
@@ -330,6 +546,230 @@ def evaluate(line, expr):
     return None
 
 
+# Closure compiler
+# compile_expr turns an expression into a closure run(context, fun_entry) doing what
+# evaluate(line, expr) does. Others fall back to evaluate
+def compile_expr(expr, line):
+    if expr is None:
+        def run(context, fun_entry):
+            return None
+    elif isinstance(expr, parse.Const):
+        value = expr.value
+        def run(context, fun_entry):
+            return value
+    elif isinstance(expr, parse.Identifier):
+        return compile_variable(expr)
+    elif isinstance(expr, parse.Temp_Ident):
+        slot = expr.slot
+        name = expr.name
+        def run(context, fun_entry):
+            value = context.get_temp(slot)
+            if value is None:
+                raise KeyError(name)
+            return value
+    elif isinstance(expr, parse.ArrayIdx) and isinstance(expr.array, parse.Identifier):
+        array = expr.array
+        index = compile_expr(expr.index, 0)
+        def run(context, fun_entry):
+            array_index = index(context, fun_entry)
+            return fun_entry.ref_value.get_value_at(local_address(array))[array_index]
+    elif isinstance(expr, parse.BinOp):
+        return compile_binop(expr, line)
+    elif isinstance(expr, parse.UniOp) and expr.op == '++' and isinstance(expr.operand, parse.Identifier):
+        operand = compile_variable(expr.operand)
+        var = expr.operand
+        add = operations['+']
+        def run(context, fun_entry):
+            value = operand(context, fun_entry)
+            fun_entry.ref_value.set_value_from_address(local_address(var), add(value, 1), line)
+            return add(value, 1)
+    elif isinstance(expr, parse.UniOp) and expr.op in ['-', '+'] and not expr.postfix:
+        operand = compile_expr(expr.operand, line)
+        if expr.op == '-':
+            def run(context, fun_entry):
+                return -1 * operand(context, fun_entry)
+        else:
+            run = operand
+    elif isinstance(expr, parse.UniOp) and expr.op != '++':
+        def run(context, fun_entry):
+            raise Exception("not implemented uniop")
+    elif isinstance(expr, parse.FuncCall):
+        return compile_call(expr, line)
+    elif isinstance(expr, parse.Assign) and isinstance(expr.lvalue, (parse.Identifier, parse.Temp_Ident)):
+        return compile_assign(expr, line)
+    elif isinstance(expr, parse.Assign) and isinstance(expr.lvalue, parse.ArrayIdx) and isinstance(expr.lvalue.array, parse.Identifier):
+        return compile_element_assign(expr, line)
+    elif isinstance(expr, parse.Declaration):
+        return compile_declaration(expr)
+    elif isinstance(expr, parse.PrintStmt):
+        format = expr.format
+        value_of = compile_expr(expr.value, line)
+        def run(context, fun_entry):
+            value = value_of(context, fun_entry)
+            if value != None:
+                print(format %(value), end='')
+            else:
+                if "%d" in format or "%f" in format:
+                    raise Exception("formatting error")
+                else:
+                    print(format, end='')
+            return None
+    else:
+        def run(context, fun_entry):
+            return evaluate(line, expr)
+    return run
+
+
+# Variable read, from the frame it was resolved to
+def compile_variable(var):
+    value_table = frame_of(var)
+    def run(context, fun_entry):
+        return value_table.get_value_at(address_of(value_table, var))
+    return run
+
+
+# Binary operator, specialized for a constant right operand
+def compile_binop(expr, line):
+    left = compile_expr(expr.left, line)
+    right = compile_expr(expr.right, line)
+    op = typed_operation(expr)
+    if op is None:
+        def run(context, fun_entry):
+            left(context, fun_entry)
+            right(context, fun_entry)
+            raise KeyError(expr.op)
+    elif isinstance(expr.right, parse.Const):
+        value = expr.right.value
+        def run(context, fun_entry):
+            return op(left(context, fun_entry), value)
+    else:
+        def run(context, fun_entry):
+            return op(left(context, fun_entry), right(context, fun_entry))
+    return run
+
+
+# Call: enters the callee's frame, or gives its return value once it has returned
+def compile_call(expr, line):
+    fn_name = expr.fn_name.name
+    args = [compile_expr(arg, line) for arg in expr.args]
+    def run(context, fun_entry):
+        callee = function_table.table[fn_name]
+        if callee.return_value == None:
+            for param, arg in zip(callee.p_name, args):
+                callee.ref_value.allocate_local(param, None, callee.line)
+                callee.ref_value.set_value(param, arg(context, fun_entry), line)
+            call_stack.link(CallContext(fn_name, line))
+        else:
+            return_value = callee.return_value
+            callee.return_value = None
+            return return_value
+        return None
+    return run
+
+
+# Assignment to a variable or a temporary. The value is converted as infer_types decided
+def compile_assign(expr, line):
+    rvalue = compile_expr(expr.rvalue, line)
+    var = expr.lvalue
+    if isinstance(var, parse.Temp_Ident):
+        slot = var.slot
+        def run(context, fun_entry):
+            value = rvalue(context, fun_entry)
+            if value != None:
+                context.set_temp(slot, value)
+            return None
+        return run
+    convert = expr.convert
+    value_table = frame_of(var)
+    def run(context, fun_entry):
+        value = rvalue(context, fun_entry)
+        if value != None:
+            address = address_of(value_table, var)
+            if convert is not None:
+                value = convert(value)
+            value_table.set_value_from_address(address, value, line)
+        return None
+    return run
+
+
+# Assignment to an array element
+def compile_element_assign(expr, line):
+    rvalue = compile_expr(expr.rvalue, line)
+    array = expr.lvalue.array
+    index = compile_expr(expr.lvalue.index, 0)
+    value_table = frame_of(array)
+    def run(context, fun_entry):
+        value = rvalue(context, fun_entry)
+        if value != None:
+            array_index = index(context, fun_entry)
+            value_table.set_element_from_address(address_of(value_table, array), array_index, value, line)
+        return None
+    return run
+
+
+# Declaration of locals in the frame of the function analysis.resolve_names found it in
+def compile_declaration(expr):
+    variables = expr.desugar()
+    line = expr.line_num
+    scope = expr.scope
+    def run(context, fun_entry):
+        decl_fun_entry = function_table.table[scope]
+        for variable in variables:
+            var_type = variable.type
+            var_length = 1
+            var_init_value = None
+            if isinstance(var_type, parse.Arrayed):
+                var_length = var_type.len
+                var_init_value = new_array(var_type.base.type, var_length)
+                var_type = var_type.base.type + ' pointer'
+            elif isinstance(var_type, parse.Asterisked):
+                var_type = var_type.base.type + ' pointer'
+            else:
+                var_type = var_type.type
+            decl_fun_entry.ref_sym.insert(variable.name, var_type, var_length)
+            decl_fun_entry.ref_value.allocate_local(variable.name, var_init_value, line)
+        return None
+    return run
+
+
+# Statement, or branch condition, run in the current frame
+def compile_stmt(stmt, line):
+    if isinstance(stmt, Dummy):
+        code = compile_expr(None, line)
+    elif isinstance(stmt, parse.Statement) and stmt.returning:
+        value_of = compile_expr(stmt.content, stmt.line_num)
+        def code(context, fun_entry):
+            fun_entry.return_value = value_of(context, fun_entry)
+            call_stack.ret()
+            fun_entry.ref_value.free_local()
+            return None
+    elif isinstance(stmt, parse.Statement):
+        code = compile_expr(stmt.content, stmt.line_num)
+    else:
+        code = compile_expr(stmt, line)
+    def run():
+        context = call_stack.called[0]
+        return code(context, function_table.table[context.name])
+    return run
+
+
+# Compiles the statements and branch condition of a node
+def compile_node(node):
+    node.code = [compile_stmt(stmt, line) for stmt, line in zip(node.block, node.line_list)]
+    if node.branch:
+        node.pred_code = compile_stmt(node.pred, 0)
+
+
+# Compiles the statements and branch conditions of a graph
+def compile_graph(entry, program):
+    for node in graph_nodes(entry):
+        compile_node(node)
+        program.nodes_compiled += 1
+
+
+skipped_line_code = compile_stmt(skipped_line, 0)
+
+
 def get_pred(stmt):
     if isinstance(stmt, parse.Selection):
         return stmt.cond
@@ -347,201 +787,274 @@ def get_branch(stmt):
         return [stmt.thenB]
 
 
-def generate_graph(ast):
-    block = []
-    line_list = []
-    pred = []
-    root = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
-    last_nodes = [root]
+# Statement that calls a function. It ends its block, whose node enters the callee's graph
+def is_call_stmt(stmt):
+    return isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.FuncCall)
+
+
+# Assignment of a call result. It also starts the block the call continues with,
+# where it runs again to store the returned value
+def is_call_assign_stmt(stmt):
+    return (isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.Assign) and isinstance(stmt.content.rvalue, parse.FuncCall)) or (
+            isinstance(stmt, parse.Assign) and isinstance(stmt.rvalue, parse.FuncCall))
+
+
+# Registers the functions and globals of a program and enters main.
+# Returns main's body, or the program itself if it has no main
+def declare_program(ast):
+    global global_runtime_table, global_value_table
+    global_runtime_table = analysis.global_runtime_table(ast)
+    global_value_table = ValueTable(analysis.slot_numbers(global_runtime_table.table))
+    body = ast
+    for decl in ast.decls:
+        if isinstance(decl, parse.FunctionDefn):
+            fun_name = decl.declarator.base.name
+            fun_type = decl.r_type.type
+            p_types = []
+            p_names = []
+
+            symbol_table = Symbol_Table(None)
+            value_table = ValueTable(analysis.frame_slots(decl))
+
+            for p in decl.declarator.params:
+                p_type = p.base_type
+                p_name = p.desugar()[0].name
+                p_types.append(p_type)
+                p_names.append(p_name)
+                symbol_table.insert(p_name, p_type, None)
+
+            if function_table.insert(fun_name, fun_type, p_types, p_names, decl.line_num, decl.body, symbol_table, value_table, None):
+                function_table.table[fun_name].defn = decl
+            if fun_name == 'main':
+                body = decl.body
+                call_stack.link(CallContext(fun_name, function_table.table['main'].line))
+        elif isinstance(decl, parse.Declaration):
+            for variable in decl.desugar():
+                var_name = variable.name
+                var_type = variable.type
+                var_length = 1
+                var_init_value = None
 
-    if isinstance(ast, parse.TranslationUnit):
-        for decl in ast.decls:
-            if isinstance(decl, parse.FunctionDefn):
-                fun_name = decl.declarator.base.name
-                fun_type = decl.r_type.type
-                params = []
-                p_types = []
-                p_names = []
-
-                symbol_table = Symbol_Table(None)
-                value_table = ValueTable()
-
-                for p in decl.declarator.params:
-                    p_type = p.base_type
-                    p_name = p.desugar()[0].name
-                    p_types.append(p_type)
-                    p_names.append(p_name)
-                    symbol_table.insert(p_name, p_type, None)
-                    # value_table.allocate_local(p_name, None, decl.line_num)
+                if isinstance(var_type, parse.Arrayed):
+                    var_length = var_type.len
+                    var_init_value = new_array(var_type.base.type, var_length)
+                    var_type = var_type.base.type + ' array'
+                else:
+                    var_type = var_type.type
 
-                body = decl.body
+                global_symbol_table.insert(var_name, var_type, var_length)
+                global_value_table.allocate_local(var_name, var_init_value, decl.line_num)
+    check_recursion(ast)
+    return body
 
-                function_table.insert(fun_name, fun_type, p_types, p_names, decl.line_num, body, symbol_table, value_table, None)
-                if fun_name == 'main':
-                    ast = body
-                    call_stack.link(CallContext(fun_name, function_table.table['main'].line))
-                    block = [Dummy()]
-                    line_list = [function_table.table['main'].line+1]
-            elif isinstance(decl, parse.Declaration):
-                variables = decl.desugar()
-                for variable in variables:
-                    var_name = variable.name
-                    var_type = variable.type
-                    var_length = 1
-                    var_init_value = None
-
-                    if isinstance(var_type, parse.Arrayed):
-                        var_length = var_type.len
-                        var_type = var_type.base.type + ' array'
-                        var_init_value = [None] * var_length
-                    else:
-                        var_type = var_type.type
-
-                    # p = re.compile(r"(.+)\[(.+)\]")
-                    # m = p.match(var_name)
-                    # if m != None:
-                    #     var_name = m.group(1)
-                    #     var_length = m.group(2)
-                    #     var_init_value = [None] * var_length
-                    # else:
-                    #     var_length = 1
-
-                    global_symbol_table.insert(var_name, var_type, var_length)
-                    global_value_table.allocate_local(var_name, var_init_value, decl.line_num)
-            else:
-                pass
 
-    # if isinstance(expr, parse.TranslationUnit):
-    #     body = function_table.find('main')
-    # else:
-    #     body = ast
+# Builds the graph of a statement list, starting with the statements already in block.
+# Returns the first node and the last nodes
+def build_graph(stmts, block=None, line_list=None):
+    if block is None:
+        block = []
+        line_list = []
+    pred = []
+    root = Node([], [], [])
+    last_nodes = [root]
 
-    for stmt in ast.stmts:
-        if not isinstance(stmt, parse.Selection) and not isinstance(stmt, parse.Iteration) and not (isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.FuncCall)) and not (isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.Assign) and isinstance(stmt.content.rvalue, parse.FuncCall)) and not (isinstance(stmt, parse.Assign) and isinstance(stmt.rvalue, parse.FuncCall)):
-            block.append(stmt)
-            line_num = stmt.line_num
-            line_list.append(line_num)
-        elif isinstance(stmt, parse.Iteration):
-            for_init = stmt.loopDesc.init
-            init_stmt = parse.Statement(for_init)
+    for stmt in stmts:
+        if isinstance(stmt, parse.Iteration):
+            init_stmt = parse.Statement(stmt.loopDesc.init)
             init_stmt.set_line(stmt.line_num)
             block.append(init_stmt)
-            line_num = init_stmt.line_num
-            line_list.append(line_num)
-
-            pred = get_pred(stmt)  # [true_pred, false_pred]
-            node = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
+            line_list.append(init_stmt.line_num)
 
+            pred = get_pred(stmt)
+            node = Node(block, line_list, pred)
             for last_node in last_nodes:
                 last_node.insert_next(node)
             last_nodes = [node]
-
             block = []
             line_list = []
 
-            branch_last_node = []
-
-            # for br in get_branch(stmt):  # br = body
-            #     br_node, br_last_node = generate_graph(br)  # for nested branch
-            #     last_nodes[0].insert_next(br_node)
-            #     branch_last_node += br_last_node
-
-            for_iter = stmt.loopDesc.iter
-
-            iter_stmt = parse.Statement(for_iter)
+            # The body runs the loop's iteration expression last
+            iter_stmt = parse.Statement(stmt.loopDesc.iter)
             iter_stmt.set_line(stmt.line_num)
+            loop_node, loop_last_node = build_graph(stmt.body.stmts + [iter_stmt])
 
-            body = stmt.body
-            body.stmts.append(iter_stmt)
-            loop_node, loop_last_node = generate_graph(body)
-
-            loop_end_node = Node([], [], copy.deepcopy(pred))
+            loop_end_node = Node([], [], pred)
             loop_last_node[0].insert_next(loop_end_node)
             last_nodes.append(loop_end_node)
             pred = []
             for last_node in last_nodes:
                 last_node.insert_next(loop_node)
-        elif (isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.FuncCall)):
-            block.append(stmt)
-            line_num = stmt.line_num
-            line_list.append(line_num)
-            node = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
-
-            for last_node in last_nodes:
-                last_node.insert_next(node)
-            last_nodes = [node]
-
-            block = []
-            line_list = []
-
-            fun_name = stmt.content.fn_name.name
-            # fun_args = stmt.content.args
-            #
-            # fun_params = function_table.table[fun_name].p_name
-
-            # for param, arg in zip(fun_params, fun_args):
-            #     function_table.table[fun_name].ref_value.set_value(param, evaluate(arg), 1)
-
-            body = function_table.table[fun_name].body
-
-            call_node, call_last_node = generate_graph(body)
-
-            last_nodes[0].insert_next(call_node)
-            last_nodes = call_last_node
-        elif isinstance(stmt, parse.Statement) and isinstance(stmt.content, parse.Assign) and isinstance(stmt.content.rvalue, parse.FuncCall) or (isinstance(stmt, parse.Assign) and isinstance(stmt.rvalue, parse.FuncCall)):
-            block.append(stmt)
-            line_num = stmt.line_num
-            line_list.append(line_num)
-            node = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
-
-            for last_node in last_nodes:
-                last_node.insert_next(node)
-            last_nodes = [node]
-
-            block = []
-            line_list = []
-            if isinstance(stmt, parse.Statement):
-                fun_name = stmt.content.rvalue.fn_name.name
-            else:
-                fun_name = stmt.rvalue.fn_name.name
-            # fun_args = stmt.content.rvalue.args
-            #
-            # fun_params = function_table.table[fun_name].p_name
-
-            # for param, arg in zip(fun_params, fun_args):
-            #     function_table.table[fun_name].ref_value.set_value(param, evaluate(arg), 1)
-
-            body = function_table.table[fun_name].body
-
-            call_node, call_last_node = generate_graph(body)
-
-            last_nodes[0].insert_next(call_node)
-            last_nodes = call_last_node
-            block = [stmt]
-            line_list = [stmt.line_num]
-        else:  # if branch
+        elif isinstance(stmt, parse.Selection):
             pred = get_pred(stmt)
-            node = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
-
+            node = Node(block, line_list, pred)
             for last_node in last_nodes:
                 last_node.insert_next(node)
             last_nodes = [node]
-
             block = []
             line_list = []
             pred = []
-            br_last_nodes = []
 
-            for br in get_branch(stmt):  # br = body
-                br_node, br_last_node = generate_graph(br)  # for nested branch
+            br_last_nodes = []
+            for br in get_branch(stmt):
+                br_node, br_last_node = build_graph(br.stmts)
                 last_nodes[0].insert_next(br_node)
                 br_last_nodes += br_last_node
             if len(get_branch(stmt)) < 2:
                 br_last_nodes += last_nodes
             last_nodes = br_last_nodes
+        elif is_call_stmt(stmt) or is_call_assign_stmt(stmt):
+            block.append(stmt)
+            line_list.append(stmt.line_num)
+            node = Node(block, line_list, pred)
+            for last_node in last_nodes:
+                last_node.insert_next(node)
+            last_nodes = [node]
+            block = []
+            line_list = []
 
-    node = Node(copy.deepcopy(block), copy.deepcopy(line_list), copy.deepcopy(pred))
+            if is_call_stmt(stmt):
+                node.callee = stmt.content.fn_name.name
+            elif isinstance(stmt, parse.Statement):
+                node.callee = stmt.content.rvalue.fn_name.name
+            else:
+                node.callee = stmt.rvalue.fn_name.name
+            if is_call_assign_stmt(stmt):
+                block = [stmt]
+                line_list = [stmt.line_num]
+        else:
+            block.append(stmt)
+            line_list.append(stmt.line_num)
+
+    node = Node(block, line_list, pred)
     for last_node in last_nodes:
         last_node.insert_next(node)
-    last_nodes = [node]
-    return root.get_next()[0], last_nodes
\ No newline at end of file
+    return root.get_next()[0], [node]
+
+
+# Empty node that only hands control to its one successor, within the step that reaches it
+def is_pass_through(node):
+    return len(node.block) == 0 and not node.branch and node.callee is None and len(node.next) == 1
+
+
+# Simplifies a graph from build_graph without changing how it steps: edges past empty
+# nodes are threaded (and marked quiet), and blocks are merged into their only predecessor
+def compact_graph(graph, program):
+    entry, last_nodes = graph
+    nodes = graph_nodes(entry)
+    edges = sum(len(node.next) for node in nodes)
+
+    for node in nodes:
+        if node.callee is not None:
+            continue
+        for i, next_node in enumerate(node.next):
+            while is_pass_through(next_node) and next_node.next[0] is not next_node:
+                next_node = next_node.next[0]
+                node.quiet[i] = True
+            node.next[i] = next_node
+
+    reached = graph_nodes(entry)
+    pred_count = {id(node): 0 for node in reached}
+    for node in reached:
+        for next_node in node.next:
+            pred_count[id(next_node)] += 1
+    merged = set()
+    for node in reached:
+        if id(node) in merged:
+            continue
+        while len(node.block) != 0 and not node.branch and node.callee is None and len(node.next) == 1 and not node.quiet[0]:
+            next_node = node.next[0]
+            if next_node is node or next_node is entry or len(next_node.block) == 0 or pred_count[id(next_node)] != 1:
+                break
+            node.block = node.block + next_node.block
+            node.line_list = node.line_list + next_node.line_list
+            node.pred = next_node.pred
+            node.branch = next_node.branch
+            node.callee = next_node.callee
+            node.next = next_node.next
+            node.quiet = next_node.quiet
+            last_nodes = [node if last_node is next_node else last_node for last_node in last_nodes]
+            merged.add(id(next_node))
+
+    nodes_left = [node for node in reached if id(node) not in merged]
+    for node in nodes_left:
+        node.prev = []
+    for node in nodes_left:
+        for next_node in node.next:
+            next_node.prev.append(node)
+    program.nodes_removed += len(nodes) - len(nodes_left)
+    program.edges_removed += edges - sum(len(node.next) for node in nodes_left)
+    return entry, last_nodes
+
+
+# Functions called from a graph, in the order their calls were built
+def called_functions(entry):
+    called = []
+    for node in sorted(graph_nodes(entry), key=lambda node: node.index):
+        if node.callee is not None and node.callee not in called:
+            called.append(node.callee)
+    return called
+
+
+# Graph of a function, analyzed and built when control first reaches it
+def function_graph(fun_name, program):
+    fun_entry = function_table.table[fun_name]
+    if fun_entry.graph is None:
+        if fun_entry.defn is not None:
+            analysis.analyze_function(fun_entry.defn, global_runtime_table)
+        if fun_name == 'main':
+            fun_entry.graph = build_graph(fun_entry.body.stmts, [Dummy()], [fun_entry.line + 1])
+        else:
+            fun_entry.graph = build_graph(fun_entry.body.stmts)
+        if program.compact:
+            fun_entry.graph = compact_graph(fun_entry.graph, program)
+        prepare_steps(fun_entry.graph[0])
+        if program.compiled and program.tier_threshold == 0:
+            compile_graph(fun_entry.graph[0], program)
+        program.call_graph[fun_name] = called_functions(fun_entry.graph[0])
+        program.functions_materialized += 1
+    return fun_entry.graph
+
+
+# Recursion is not supported: rejects a program whose functions call each other in a
+# cycle, at the call in the first function of the cycle
+def check_recursion(ast):
+    calls = {}
+    for decl in ast.decls:
+        if isinstance(decl, parse.FunctionDefn):
+            calls[decl.declarator.base.name] = analysis.function_calls(decl.body, [])
+    call_graph = {fun_name: [callee for _, callee in fun_calls] for fun_name, fun_calls in calls.items()}
+    for fun_name, fun_calls in calls.items():
+        cycle = call_cycle(fun_name, call_graph)
+        if cycle is not None:
+            line = next(line for line, callee in fun_calls if callee == cycle[1])
+            print("line {}: recursive call not supported, in {}".format(line, " -> ".join(cycle)))
+            raise ValueError("semantic error")
+
+
+# Cycle of calls from a function back to itself, or None
+def call_cycle(fun_name, call_graph):
+    paths = [[fun_name]]
+    seen = set()
+    while len(paths) > 0:
+        path = paths.pop()
+        for callee in call_graph.get(path[-1], []):
+            if callee == fun_name:
+                return path + [callee]
+            if callee not in seen:
+                seen.add(callee)
+                paths.append(path + [callee])
+    return None
+
+
+# Graph of a program, or of a statement list. A program starts in main's graph,
+# other functions are built as they are called
+def generate_graph(ast, program):
+    if isinstance(ast, parse.TranslationUnit):
+        ast = declare_program(ast)
+        if isinstance(ast, parse.Body):
+            return function_graph('main', program)
+    graph = build_graph(ast.stmts)
+    prepare_steps(graph[0])
+    if program.compiled and program.tier_threshold == 0:
+        compile_graph(graph[0], program)
+    return graph
@@ -1,9 +1,11 @@
 import itertools
 import functools
+import heapq
 
 import parse
 import structure
 import stack
+import hashcons
 
 # Syntax Analysis with Desugaring
 # Note desugar_ast
@@ -36,14 +38,17 @@ def is_branching(stmt):
     as_fn_call = isinstance(stmt, Fn_Call_Stmt) or (isinstance(stmt, parse.Statement) and stmt.returning)
     return as_stmt or as_fn_call
 
-# Desugars the entire AST (for the source code file)
+# Desugars the entire AST (for the source code file). Its expressions are shared in
+# a hash-consing table of their own, so nodes of earlier programs are not kept
 def desugar_ast(ast: parse.TranslationUnit):
+    hashcons.clear()
     top_decls = list(filter(is_instance(parse.Declaration), ast.decls))
     fns = list(filter(is_instance(parse.FunctionDefn), ast.decls))
     # print(is_instance(parse.FunctionDefn)(ast.decls[0]), isinstance(ast.decls[0], parse.FunctionDefn))
     desugar_tdecls = desugar_lines(top_decls)
     for fn in fns:
         fn.body = desugar_body(fn.body)
+        allocate_temps(fn)
     return parse.TranslationUnit(desugar_tdecls + fns)
 
 # Desugars the function body
@@ -54,22 +59,22 @@ def desugar_body(body: parse.Body):
     #return BlockBody(grouped)
     return parse.Body(lines)
 
-# Desugar mixed statements
-def desugar_line(stmt):
+# Desugar mixed statements, appending the result to out
+# Function calls hoisted out of the statement come before it, on its line
+def desugar_line(stmt, out):
+    start = len(out)
     if(isinstance(stmt, parse.Declaration)):
-        return desugar_decl(stmt)
+        out.extend(desugar_decl(stmt))
+        return out
     elif(isinstance(stmt, parse.Selection)):
-        exes, stmt.cond = desugar_expr(stmt.line_num, stmt.cond)
-        for exe in exes:
-            exe.set_line(stmt.line_num)
+        stmt.cond = desugar_expr(stmt.line_num, stmt.cond, out)[1]
         stmt.thenB = desugar_body(stmt.thenB)
         if stmt.hasElse:
             stmt.elseB = desugar_body(stmt.elseB)
-        return exes + [ stmt ]
     elif(isinstance(stmt, parse.Iteration)):
         desc = stmt.loopDesc
         if(isinstance(desc, parse.ForDesc)):
-            exes, res = desugar_expr(stmt.line_num, desc.init)
+            res = desugar_expr(stmt.line_num, desc.init, out)[1]
             exe2, res2 = desugar_expr(stmt.line_num, desc.until)
             exe3, res3 = desugar_expr(stmt.line_num, desc.iter)
             if exe2 != [] or exe3 != []:
@@ -78,37 +83,30 @@ def desugar_line(stmt):
             desc.init = res
         else:
             # While only has conditional statement
-            exes = []
             exe2, res2 = desugar_expr(stmt.line_num, desc)
             if exe2 != []:
                 print("line {}: function call in condition/iteration not yet supported, in {}".format(stmt.line_num, stmt))
                 raise ValueError("semantic error")
-        for exe in exes:
-            exe.line_num = stmt.line_num
         stmt.body = desugar_body(stmt.body)
-        return exes + [ stmt ]
     elif(isinstance(stmt, parse.Statement)):
-        exes, res = desugar_expr(stmt.line_num, stmt.content)
-        stmt.content = res
-        for exe in exes:
-            exe.line_num = stmt.line_num
-        return exes + [ stmt ]
+        stmt.content = desugar_expr(stmt.line_num, stmt.content, out)[1]
     elif(isinstance(stmt, parse.PrintStmt)):
         if stmt.value != None:
-            exes, res = desugar_expr(stmt.line_num, stmt.value)
-            stmt.value = res
-            for exe in exes:
-                exe.line_num = stmt.line_num
-            return exes + [ stmt ]
-        else:
-            return [ stmt ]
+            stmt.value = desugar_expr(stmt.line_num, stmt.value, out)[1]
     else:
         raise TypeError("Unexpected type", type(stmt))
+    for index in range(start, len(out)):
+        out[index].line_num = stmt.line_num
+    out.append(stmt)
+    return out
 
 # Desugar declration into EachDecl inside mixed statements
 # Can also be used to handle toplevel
 def desugar_lines(lines):
-    return list(itertools.chain(*map(desugar_line, lines)))
+    out = []
+    for stmt in lines:
+        desugar_line(stmt, out)
+    return out
 
 # Desugar a declaration into mix of expressions and declarations
 def desugar_decl(decl: parse.Declaration):
@@ -118,22 +116,23 @@ def desugar_decl(decl: parse.Declaration):
     return [ decl ]
 
 def is_lvalue(expr):
-    if(isinstance(expr, parse.Identifier)):
-        return True
-    elif(isinstance(expr, parse.UniOp)):
-        return expr.op == '*' and is_lvalue(expr.operand)
-    elif(isinstance(expr, parse.BinOp)):
-        return False
-    elif(isinstance(expr, parse.Assign)):
-        return False
-    elif(isinstance(expr, parse.ArrayIdx)):
-        return is_lvalue(expr.array)
-    elif(isinstance(expr, parse.FuncCall)):
-        return False
-    elif(isinstance(expr, parse.Const)):
-        return False
+    while True:
+        if(isinstance(expr, parse.Identifier)):
+            return True
+        elif(isinstance(expr, parse.UniOp)):
+            if expr.op != '*':
+                return False
+            expr = expr.operand
+        elif(isinstance(expr, parse.ArrayIdx)):
+            expr = expr.array
+        elif(isinstance(expr, parse.BinOp) or isinstance(expr, parse.Assign)
+             or isinstance(expr, parse.FuncCall) or isinstance(expr, parse.Const)):
+            return False
+        else:
+            return None
 
-def check_stmt(line, expr):
+# Checks a single node of a statement's expression, its operands are checked on their own
+def check_node(line, expr):
     if(isinstance(expr, parse.UniOp)):
         if(expr.op in ['++', '--']): # Changes
             if(not is_lvalue(expr.operand)):
@@ -142,67 +141,478 @@ def check_stmt(line, expr):
         elif(expr.op == '*' and isinstance(expr.operand, parse.Const)):
             print("line {}: illegal constant dereferencing in {}".format(line, expr))
             raise ValueError("semantic error")
-        check_stmt(line, expr.operand)
     elif(isinstance(expr, parse.Assign)):
         if(not is_lvalue(expr.lvalue)):
             print("line {}: {} is not lvalue".format(line, expr.lvalue))
             raise ValueError("semantic error")
-        is_lvalue(expr.lvalue)
-        check_stmt(line, expr.lvalue)
-        check_stmt(line, expr.rvalue)
+
+# Assignment of a call result to a variable, kept as is with only its arguments desugared
+def is_call_assign(expr):
+    return expr.op == '=' and isinstance(expr.lvalue, parse.Identifier) and isinstance(expr.rvalue, parse.FuncCall)
+
+# Operands of a node, in evaluation order
+def operands(expr):
+    if(isinstance(expr, parse.UniOp)):
+        return [ expr.operand ]
     elif(isinstance(expr, parse.BinOp)):
-        check_stmt(line, expr.left)
-        check_stmt(line, expr.right)
+        return [ expr.left, expr.right ]
+    elif(isinstance(expr, parse.Assign)):
+        if is_call_assign(expr):
+            return expr.rvalue.args
+        return [ expr.lvalue, expr.rvalue ]
     elif(isinstance(expr, parse.ArrayIdx)):
-        check_stmt(line, expr.array)
-        check_stmt(line, expr.index)
+        return [ expr.array, expr.index ]
     elif(isinstance(expr, parse.FuncCall)):
-        for arg in expr.args:
-            check_stmt(line, arg)
+        return expr.args
+    elif(isinstance(expr, parse.Identifier) or isinstance(expr, parse.Const)):
+        return []
+    raise TypeError("Unexpected type", type(expr))
 
-
-# Desugars a single expr into tuple of (expr_to_execute, result_to_use)
-def desugar_expr(line, expr):
-    check_stmt(line, expr)
+# Node rebuilt from its desugared operands. Function calls are hoisted into exes
+def rebuild(expr, results, exes):
     if(isinstance(expr, parse.UniOp)): # Nothing to desugar
-        exe, res = desugar_expr(line, expr.operand)
-        return (exe, parse.UniOp(res, expr.op))
+        return hashcons.uniop(results[0], expr.op)
     elif(isinstance(expr, parse.BinOp)):
-        exel, resl = desugar_expr(line, expr.left)
-        exer, resr = desugar_expr(line, expr.right)
-        return (exel + exer, parse.BinOp(resl, resr, expr.op))
+        return hashcons.binop(results[0], results[1], expr.op)
     elif(isinstance(expr, parse.Assign)):
-        if expr.op == '=' and isinstance(expr.lvalue, parse.Identifier) and isinstance(expr.rvalue, parse.FuncCall):
-            exes = list()
-            new_args = list()
-            for exe, arg in map(functools.partial(desugar_expr, line), expr.rvalue.args):
-                exes.extend(exe)
-                new_args.append(arg)
-            expr.rvalue.args = new_args
-            return (exes, expr)
-        else:
-            exel, resl = desugar_expr(line, expr.lvalue)
-            exer, resr = desugar_expr(line, expr.rvalue)
-            return (exel + exer, parse.Assign(resl, resr, expr.op))
+        if is_call_assign(expr):
+            expr.rvalue.args = results
+            return expr
+        return parse.Assign(results[0], results[1], expr.op)
     elif(isinstance(expr, parse.ArrayIdx)):
-        exel, resl = desugar_expr(line, expr.array)
-        exer, resr = desugar_expr(line, expr.index)
-        return (exel + exer, parse.ArrayIdx(resl, resr))
+        return hashcons.array_idx(results[0], results[1])
     elif(isinstance(expr, parse.FuncCall)):
-        exes = list()
-        new_args = list()
-        for exe, arg in map(functools.partial(desugar_expr, line), expr.args):
-            exes.extend(exe)
-            new_args.append(arg)
         temp_var = parse.Temp_Ident(temp_info.next())
-        call = parse.Assign(temp_var, parse.FuncCall(expr.fn_name, new_args), '=')
+        call = parse.Assign(temp_var, parse.FuncCall(expr.fn_name, results), '=')
         # call = Fn_Call_Stmt(expr.fn_name, expr.args, temp_var)
-        return (exes + [ call ], temp_var)
+        exes.append(call)
+        return temp_var
+    else:
+        return hashcons.share(expr)
+
+# Desugars a single expr into tuple of (expr_to_execute, result_to_use)
+# Pure parts of the result are shared through hashcons, so they must not be mutated.
+# One iterative pass: each node is checked on the way down, before its operands,
+# and rebuilt on the way up. Hoisted calls are appended to exes in evaluation order
+def desugar_expr(line, expr, exes=None):
+    if exes is None:
+        exes = []
+    results = []
+    pending = [(expr, None)]
+    while pending:
+        node, node_operands = pending.pop()
+        if node_operands is None:
+            check_node(line, node)
+            node_operands = operands(node)
+            pending.append((node, node_operands))
+            pending.extend((operand, None) for operand in reversed(node_operands))
+        else:
+            count = len(node_operands)
+            node_results = results[len(results) - count:]
+            del results[len(results) - count:]
+            results.append(rebuild(node, node_results, exes))
+    return (exes, results[0])
+
+
+# Temporary slots
+# A temporary holds the result of a call hoisted out of an expression. It is set
+# once, by the statement desugar_expr puts before its user, and dies after its
+# last use, within the statement it came from. Temporaries whose lifetimes do not
+# overlap share a slot, so an activation only needs a few slots, however many
+# calls its function makes
+
+# Temporaries of an expression, in evaluation order
+def expr_temps(expr):
+    temps = []
+    pending = [expr]
+    while pending:
+        node = pending.pop()
+        if(isinstance(node, parse.Temp_Ident)):
+            temps.append(node)
+        else:
+            pending.extend(reversed(subexprs(node)))
+    return temps
+
+# Temporaries of each statement of a body, in textual order. A branch or loop
+# header comes before the statements it runs
+def stmt_temps(stmt, out):
+    if(isinstance(stmt, parse.Body)):
+        for line in stmt.stmts:
+            stmt_temps(line, out)
+    elif(isinstance(stmt, parse.Selection)):
+        out.append(expr_temps(stmt.cond))
+        stmt_temps(stmt.thenB, out)
+        if stmt.hasElse:
+            stmt_temps(stmt.elseB, out)
+    elif(isinstance(stmt, parse.Iteration)):
+        desc = stmt.loopDesc
+        if(isinstance(desc, parse.ForDesc)):
+            out.append(expr_temps(desc.init) + expr_temps(desc.until) + expr_temps(desc.iter))
+        else:
+            out.append(expr_temps(desc))
+        stmt_temps(stmt.body, out)
+    elif(isinstance(stmt, parse.Statement)):
+        out.append(expr_temps(stmt.content))
+    elif(isinstance(stmt, parse.Assign)): # Hoisted call
+        out.append(expr_temps(stmt))
+    elif(isinstance(stmt, parse.PrintStmt) and stmt.value != None):
+        out.append(expr_temps(stmt.value))
+    return out
+
+# Assigns the temporaries of a desugared function to slots, by linear scan over
+# their lifetimes. Returns the number of slots
+def allocate_temps(fn: parse.FunctionDefn):
+    first = {} # temp name -> (position it is set at, temp)
+    last = {} # temp name -> position of its last use
+    for position, temps in enumerate(stmt_temps(fn.body, [])):
+        for temp in temps:
+            first.setdefault(temp.name, (position, temp))
+            last[temp.name] = position
+    free = []
+    live = [] # (last use, slot)
+    count = 0
+    for name, (position, temp) in sorted(first.items(), key=lambda item: item[1][0]):
+        while live and live[0][0] < position:
+            free.append(heapq.heappop(live)[1])
+        if free:
+            temp.slot = free.pop()
+        else:
+            temp.slot = count
+            count += 1
+        heapq.heappush(live, (last[name], temp.slot))
+    return count
+
+# Binds every variable use to (scope, slot, type) before execution, so frames are
+# indexed by slot instead of probed by name. scope is the function whose frame
+# declares the variable, or stack.GLOBAL; slot is its index in that frame, numbered
+# densely per function (parameters first, then locals) and apart for the globals;
+# type is the one of the declaration the use sees, None if it has none that
+# assignments convert to. A local is seen once declared, in textual order, and
+# shadows a global of its name from there on
+
+# Type a declared variable has in the runtime symbol tables, as CFG gives them
+def runtime_type(each: parse.EachDecl, local):
+    var_type = each.type
+    suffix = ''
+    if isinstance(var_type, parse.Arrayed) or (local and isinstance(var_type, parse.Asterisked)):
+        var_type = var_type.base
+        suffix = ' pointer' if local else ' array'
+    if not isinstance(var_type, parse.BaseType):
+        return None
+    return var_type.type + suffix
+
+# Symbol table of declared variables with their runtime types
+def runtime_symbol_table(eachs, local):
+    sym_table = structure.Symbol_Table(None)
+    for each in eachs:
+        sym_table.insert(each.name, runtime_type(each, local), each.type.len if isinstance(each.type, parse.Arrayed) else 1)
+    return sym_table
+
+# Declarations of a function body in textual order, nested bodies included
+def body_declarations(stmts, out):
+    for stmt in stmts:
+        if isinstance(stmt, parse.Declaration):
+            out.extend(stmt.desugar())
+        elif isinstance(stmt, parse.Body):
+            body_declarations(stmt.stmts, out)
+        elif isinstance(stmt, parse.Selection):
+            body_declarations([ stmt.thenB ], out)
+            if stmt.hasElse:
+                body_declarations([ stmt.elseB ], out)
+        elif isinstance(stmt, parse.Iteration):
+            body_declarations([ stmt.body ], out)
+    return out
+
+# Slots of distinct names, in order
+def slot_numbers(names):
+    numbers = {}
+    for name in names:
+        numbers.setdefault(name, len(numbers))
+    return numbers
+
+# Slots of a function's frame: its parameters, then its locals
+def frame_slots(fn: parse.FunctionDefn):
+    params = [p.desugar()[0].name for p in fn.declarator.params]
+    return slot_numbers(params + [each.name for each in body_declarations(fn.body.stmts, [])])
+
+# Bindings of the names used in one function
+class Scope:
+    def __init__(self, fn: parse.FunctionDefn, global_table):
+        self.fn_name = fn.declarator.base.name
+        self.global_table = global_table
+        self.global_slots = slot_numbers(global_table.table)
+        self.slots = frame_slots(fn)
+        self.frame_table = structure.Symbol_Table(None)
+        self.types = {} # Declared so far -> type of its last declaration
+        for p in fn.declarator.params: # Parameters keep their parse type, as in CFG
+            p_name = p.desugar()[0].name
+            self.frame_table.insert(p_name, p.base_type, None)
+            self.types[p_name] = p.base_type
+        for each in body_declarations(fn.body.stmts, []):
+            self.frame_table.insert(each.name, runtime_type(each, True), 1)
+        self.resolved = {} # id(expr) -> (expr, resolved expr), valid until the next declaration
+
+    def declare(self, decl: parse.Declaration):
+        decl.scope = self.fn_name
+        for each in decl.desugar():
+            self.types[each.name] = runtime_type(each, True)
+        self.resolved.clear()
+
+    # Type of a local, if every declaration of it agrees
+    def local_type(self, name):
+        entry = self.frame_table.table.get(name)
+        if entry is None:
+            return None
+        var_type = entry.type
+        while entry is not None:
+            if entry.type != var_type:
+                return None
+            entry = entry.next
+        return var_type
+
+    # Locals declared so far shadow globals. Other names are globals if there is one,
+    # else locals declared later (slot None if never declared)
+    def binding(self, name):
+        if name in self.types:
+            return (self.fn_name, self.slots[name], self.types[name])
+        global_entry = self.global_table.table.get(name)
+        if global_entry is not None:
+            return (stack.GLOBAL, self.global_slots[name], global_entry.type)
+        return (self.fn_name, self.slots.get(name), self.local_type(name))
+
+# Operands of an expression that are resolved, in order
+def subexprs(expr):
+    if(isinstance(expr, parse.UniOp)):
+        return [ expr.operand ]
+    elif(isinstance(expr, parse.BinOp)):
+        return [ expr.left, expr.right ]
+    elif(isinstance(expr, parse.Assign)):
+        return [ expr.lvalue, expr.rvalue ]
+    elif(isinstance(expr, parse.ArrayIdx)):
+        return [ expr.array, expr.index ]
+    elif(isinstance(expr, parse.FuncCall)):
+        return expr.args
+    return []
+
+# Node rebuilt from its resolved operands. Function names are left unbound
+def rebind(scope, expr, results):
+    if(isinstance(expr, parse.Identifier)):
+        return hashcons.identifier(expr.name, scope.binding(expr.name))
+    elif(isinstance(expr, parse.UniOp)):
+        return hashcons.uniop(results[0], expr.op, expr.postfix)
+    elif(isinstance(expr, parse.BinOp)):
+        return hashcons.binop(results[0], results[1], expr.op)
+    elif(isinstance(expr, parse.ArrayIdx)):
+        return hashcons.array_idx(results[0], results[1])
+    elif(isinstance(expr, parse.Assign)):
+        expr.lvalue, expr.rvalue = results
+    elif(isinstance(expr, parse.FuncCall)):
+        expr.args = results
+    return expr
+
+# Resolves the names of an expression, iteratively like desugar_expr.
+# Shared operands are resolved once per scope and declaration point
+def resolve_expr(scope, expr):
+    results = []
+    pending = [(expr, None)]
+    while pending:
+        node, node_operands = pending.pop()
+        seen = scope.resolved.get(id(node))
+        if seen is not None:
+            results.append(seen[1])
+        elif node_operands is None:
+            node_operands = subexprs(node)
+            pending.append((node, node_operands))
+            pending.extend((operand, None) for operand in reversed(node_operands))
+        else:
+            count = len(node_operands)
+            node_results = results[len(results) - count:]
+            del results[len(results) - count:]
+            done = rebind(scope, node, node_results)
+            scope.resolved[id(node)] = (node, done) # Keeps node alive, so its id is not reused
+            results.append(done)
+    return results[0]
+
+def resolve_stmt(scope, stmt):
+    if(isinstance(stmt, parse.Declaration)):
+        scope.declare(stmt)
+    elif(isinstance(stmt, parse.Body)):
+        for line in stmt.stmts:
+            resolve_stmt(scope, line)
+    elif(isinstance(stmt, parse.Selection)):
+        stmt.cond = resolve_expr(scope, stmt.cond)
+        resolve_stmt(scope, stmt.thenB)
+        if stmt.hasElse:
+            resolve_stmt(scope, stmt.elseB)
+    elif(isinstance(stmt, parse.Iteration)):
+        desc = stmt.loopDesc
+        if(isinstance(desc, parse.ForDesc)):
+            desc.init = resolve_expr(scope, desc.init)
+            desc.until = resolve_expr(scope, desc.until)
+            desc.iter = resolve_expr(scope, desc.iter)
+        else:
+            stmt.loopDesc = resolve_expr(scope, desc)
+        resolve_stmt(scope, stmt.body)
+    elif(isinstance(stmt, parse.Statement)):
+        stmt.content = resolve_expr(scope, stmt.content)
+    elif(isinstance(stmt, parse.Assign)): # Hoisted call
+        resolve_expr(scope, stmt)
+    elif(isinstance(stmt, parse.PrintStmt)):
+        if stmt.value != None:
+            stmt.value = resolve_expr(scope, stmt.value)
+
+# (line, function name) of each call in a statement of a desugared function, in order
+def function_calls(stmt, out):
+    exprs = []
+    if(isinstance(stmt, parse.Body)):
+        for line in stmt.stmts:
+            function_calls(line, out)
+    elif(isinstance(stmt, parse.Selection)):
+        exprs = [stmt.cond]
+        function_calls(stmt.thenB, out)
+        if stmt.hasElse:
+            function_calls(stmt.elseB, out)
+    elif(isinstance(stmt, parse.Iteration)):
+        desc = stmt.loopDesc
+        exprs = [desc.init, desc.until, desc.iter] if isinstance(desc, parse.ForDesc) else [desc]
+        function_calls(stmt.body, out)
+    elif(isinstance(stmt, parse.Statement)):
+        exprs = [stmt.content]
+    elif(isinstance(stmt, parse.Assign)): # Hoisted call
+        exprs = [stmt]
+    elif(isinstance(stmt, parse.PrintStmt)):
+        exprs = [stmt.value]
+    pending = list(reversed(exprs))
+    while pending:
+        expr = pending.pop()
+        if(isinstance(expr, parse.FuncCall)):
+            out.append((stmt.line_num, expr.fn_name.name))
+        pending.extend(reversed(subexprs(expr)))
+    return out
+
+# Variables of the global frame of a desugared AST
+def global_runtime_table(ast: parse.TranslationUnit):
+    top_decls = filter(is_instance(parse.Declaration), ast.decls)
+    return runtime_symbol_table([each for decl in top_decls for each in decl.desugar()], False)
+
+# Resolves the variables of every function of a desugared AST, in place
+def resolve_names(ast: parse.TranslationUnit):
+    global_table = global_runtime_table(ast)
+    for fn in filter(is_instance(parse.FunctionDefn), ast.decls):
+        resolve_stmt(Scope(fn, global_table), fn.body)
+    return ast
+
+# Static types
+# Records in static_type what each operator expression evaluates to: 'int', 'float',
+# 'bool' (comparisons) or None when that depends on the run (array elements, call
+# results, parameters, ambiguous names). The type only depends on the operands, so
+# shared nodes carry it too. Assignments to a variable record the conversion their
+# value needs (None if it already has the variable's type)
+arithmetic_ops = ['+', '-', '*']
+comparison_ops = ['<', '>', '==']
+
+def static_type(expr):
+    if(isinstance(expr, parse.BinOp) or isinstance(expr, parse.UniOp)):
+        return expr.static_type
     elif(isinstance(expr, parse.Identifier)):
-        return ([], expr)
+        if expr.binding is not None and expr.binding[2] in ['int', 'float']:
+            return expr.binding[2]
     elif(isinstance(expr, parse.Const)):
-        return ([], expr)
+        if type(expr.value) == int:
+            return 'int'
+        elif type(expr.value) == float:
+            return 'float'
+    return None
+
+# Result type of an operator, as CFG.binop computes it
+def operation_type(expr):
+    if(isinstance(expr, parse.UniOp)):
+        operand = static_type(expr.operand)
+        if operand is None:
+            return None
+        elif expr.op == '+' and not expr.postfix:
+            return operand
+        elif (expr.op == '-' and not expr.postfix) or expr.op == '++': # -1 * x, x + 1
+            return 'float' if operand == 'float' else 'int'
+        return None
+    if expr.op in comparison_ops:
+        return 'bool'
+    lhs, rhs = static_type(expr.left), static_type(expr.right)
+    if lhs is None or rhs is None:
+        return None
+    elif expr.op in arithmetic_ops:
+        return 'float' if 'float' in [lhs, rhs] else 'int'
+    elif expr.op == '/':
+        return 'int' if lhs == 'int' and rhs == 'int' else 'float'
+    return None
+
+# Types an assignment to a variable
+def type_assign(expr):
+    var = expr.lvalue
+    if not isinstance(var, parse.Identifier) or var.binding is None or var.binding[2] is None:
+        return
+    var_type = var.binding[2]
+    value_type = static_type(expr.rvalue)
+    expr.convert = None
+    if var_type == 'int' and value_type != 'int':
+        expr.convert = int
+    elif var_type == 'float' and value_type != 'float':
+        expr.convert = float
+
+# Types the operators of an expression, operands first
+def type_expr(expr, typed):
+    pending = [(expr, False)]
+    while pending:
+        node, ready = pending.pop()
+        if id(node) in typed:
+            continue
+        if not ready:
+            pending.append((node, True))
+            pending.extend((operand, False) for operand in reversed(subexprs(node)))
+            continue
+        if(isinstance(node, parse.BinOp) or isinstance(node, parse.UniOp)):
+            node.static_type = operation_type(node)
+            typed[id(node)] = node
+        elif(isinstance(node, parse.Assign)):
+            type_assign(node)
+
+def type_stmt(stmt, typed):
+    if(isinstance(stmt, parse.Body)):
+        for line in stmt.stmts:
+            type_stmt(line, typed)
+    elif(isinstance(stmt, parse.Selection)):
+        type_expr(stmt.cond, typed)
+        type_stmt(stmt.thenB, typed)
+        if stmt.hasElse:
+            type_stmt(stmt.elseB, typed)
+    elif(isinstance(stmt, parse.Iteration)):
+        desc = stmt.loopDesc
+        if(isinstance(desc, parse.ForDesc)):
+            for expr in [desc.init, desc.until, desc.iter]:
+                type_expr(expr, typed)
+        else:
+            type_expr(desc, typed)
+        type_stmt(stmt.body, typed)
+    elif(isinstance(stmt, parse.Statement)):
+        type_expr(stmt.content, typed)
+    elif(isinstance(stmt, parse.Assign)): # Hoisted call
+        type_expr(stmt, typed)
+    elif(isinstance(stmt, parse.PrintStmt)):
+        if stmt.value != None:
+            type_expr(stmt.value, typed)
+
+# Types every function of an AST that went through resolve_names, in place
+def infer_types(ast: parse.TranslationUnit):
+    typed = {} # id(expr) -> expr, operators already typed
+    for fn in filter(is_instance(parse.FunctionDefn), ast.decls):
+        type_stmt(fn.body, typed)
+    return ast
 
+# Resolves and types a single function, in place, as resolve_names and infer_types would
+def analyze_function(fn: parse.FunctionDefn, global_table):
+    resolve_stmt(Scope(fn, global_table), fn.body)
+    type_stmt(fn.body, {})
+    return fn
 
 # NOTE Not used
 # EachDecl into Symbol Entry
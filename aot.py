@@ -0,0 +1,345 @@
+import ast as python_ast
+import math
+
+import parse
+import analysis
+import CFG
+from stack import GLOBAL
+
+# Ahead-of-time translation of a desugared program into Python, for running it to the
+# end without stepping (python main.py --run <file.c>).
+# Each function becomes a Python function: locals are Python locals (v_<name>), globals
+# module variables (g_<name>), hoisted call results t_<slot>, functions f_<name>.
+# Values follow the interpreter's rules (CFG.operations: truncating int division,
+# int/float results); assignments to variables other than parameters convert to their
+# declared type, as the interpreter does, while array elements, arguments and return
+# values are stored and passed as they are. Control flow is C's: return leaves the
+# function and every call has its own locals. The source is compiled with line numbers
+# of the C file, so tracebacks point at C lines.
+
+# Python source of a program, as lines and the C line of each
+class Translator:
+    def __init__(self):
+        self.lines = []
+        self.line_map = []
+        self.depth = 0
+        self.global_types = {} # Global name -> (kind, base type), kind 'scalar', 'array' or 'pointer'
+        self.types = {} # Local name -> (kind, base type), as declared so far in the function
+        self.temp_types = {} # Temporary slot -> type of the call result stored there
+        self.fn_name = None
+
+    def emit(self, line, text):
+        self.lines.append("    " * self.depth + text)
+        self.line_map.append(line)
+
+    def source(self):
+        return "\n".join(self.lines) + "\n"
+
+    def program(self, ast):
+        fns = [decl for decl in ast.decls if isinstance(decl, parse.FunctionDefn)]
+        for decl in ast.decls:
+            if isinstance(decl, parse.Declaration):
+                for each in decl.desugar():
+                    self.global_types[each.name] = declared_type(each.type)
+                    self.emit(decl.line_num, "g_{} = {}".format(each.name, initial_value(each.type)))
+        for fn in fns:
+            self.function(fn)
+
+    def function(self, fn):
+        self.fn_name = fn.declarator.base.name
+        params = [p.desugar()[0] for p in fn.declarator.params]
+        self.types = {p.name: param_type(p.type) for p in params}
+        self.temp_types = {}
+        line = fn.line_num
+        self.emit(line, "def f_{}({}):".format(self.fn_name, ", ".join("v_" + p.name for p in params)))
+        self.depth += 1
+        if len(self.global_types) > 0:
+            self.emit(line, "global " + ", ".join("g_" + name for name in self.global_types))
+        for name in sorted(set(each.name for each in analysis.body_declarations(fn.body.stmts, [])) - set(self.types)):
+            self.emit(line, "v_{} = None".format(name))
+        self.body(fn.body.stmts, line)
+        self.depth -= 1
+
+    # Statements of a block, pass if there are none
+    def body(self, stmts, line):
+        start = len(self.lines)
+        for stmt in stmts:
+            self.statement(stmt)
+        if len(self.lines) == start:
+            self.emit(line, "pass")
+
+    def statement(self, stmt):
+        line = stmt.line_num
+        if isinstance(stmt, parse.Declaration):
+            for each in stmt.desugar():
+                self.types[each.name] = declared_type(each.type)
+                self.emit(line, "v_{} = {}".format(each.name, initial_value(each.type)))
+        elif isinstance(stmt, parse.Body):
+            self.body(stmt.stmts, line)
+        elif isinstance(stmt, parse.Selection):
+            self.emit(line, "if {}:".format(self.expr(stmt.cond)))
+            self.block(stmt.thenB, line)
+            if stmt.hasElse:
+                self.emit(line, "else:")
+                self.block(stmt.elseB, line)
+        elif isinstance(stmt, parse.Iteration) and isinstance(stmt.loopDesc, parse.ForDesc):
+            desc = stmt.loopDesc
+            self.effect(line, desc.init)
+            self.emit(line, "while {}:".format(self.expr(desc.until)))
+            self.depth += 1
+            self.body(stmt.body.stmts, line)
+            self.effect(line, desc.iter)
+            self.depth -= 1
+        elif isinstance(stmt, parse.Iteration):
+            self.emit(line, "while {}:".format(self.expr(stmt.loopDesc)))
+            self.block(stmt.body, line)
+        elif isinstance(stmt, parse.Statement) and stmt.returning:
+            self.emit(line, "return " + self.expr(stmt.content))
+        elif isinstance(stmt, parse.Statement):
+            self.effect(line, stmt.content)
+        elif isinstance(stmt, parse.Assign): # Hoisted call
+            self.effect(line, stmt)
+        elif isinstance(stmt, parse.PrintStmt):
+            value = "None" if stmt.value is None else self.expr(stmt.value)
+            self.emit(line, "printf({!r}, {})".format(stmt.format, value))
+
+    def block(self, body, line):
+        self.depth += 1
+        self.body(body.stmts, line)
+        self.depth -= 1
+
+    # Expression statement: assignments and increments become Python assignments
+    def effect(self, line, expr):
+        if isinstance(expr, parse.Assign) and self.is_target(expr.lvalue):
+            target = self.expr(expr.lvalue)
+            if isinstance(expr.lvalue, parse.Temp_Ident):
+                self.temp_types[expr.lvalue.slot] = self.value_type(expr.rvalue)
+                self.emit(line, "{} = {}".format(target, self.expr(expr.rvalue)))
+                return
+            rvalue = expr.rvalue
+            if expr.op in ['+=', '-=']:
+                rvalue = parse.BinOp(expr.lvalue, rvalue, expr.op[0])
+            if not may_be_none(rvalue):
+                self.emit(line, "{} = {}".format(target, self.converted(self.target_type(expr.lvalue), rvalue)))
+                return
+            # Storing no value leaves the variable as it was, as in the interpreter
+            self.emit(line, "value = " + self.expr(rvalue))
+            self.emit(line, "if value is not None:")
+            self.depth += 1
+            self.emit(line, "{} = {}".format(target, conversion(self.target_type(expr.lvalue), self.value_type(rvalue), "value")))
+            self.depth -= 1
+        elif isinstance(expr, parse.UniOp) and expr.op in ['++', '--'] and self.is_target(expr.operand):
+            target = self.expr(expr.operand)
+            self.emit(line, "{} = {} {} 1".format(target, target, expr.op[0]))
+        elif expr is not None:
+            self.emit(line, self.expr(expr))
+
+    # Lvalues translated to Python targets
+    def is_target(self, expr):
+        return isinstance(expr, (parse.Identifier, parse.Temp_Ident)) or (
+            isinstance(expr, parse.ArrayIdx) and isinstance(expr.array, parse.Identifier))
+
+    # Type values stored to an lvalue are converted to. Elements take values as they are
+    def target_type(self, expr):
+        if isinstance(expr, parse.ArrayIdx):
+            return None
+        kind, base = self.var_type(expr)
+        return base if kind == 'scalar' else None
+
+    def var_type(self, var):
+        if is_global(var):
+            return self.global_types.get(var.name, (None, None))
+        return self.types.get(var.name, (None, None))
+
+    def name(self, var):
+        return ("g_" if is_global(var) else "v_") + var.name
+
+    # Expression as Python source, with its value converted to var_type
+    def converted(self, var_type, expr):
+        if may_be_none(expr):
+            return conversion(var_type, self.value_type(expr), self.expr(expr), "to_")
+        return conversion(var_type, self.value_type(expr), self.expr(expr))
+
+    # 'int', 'float' or 'bool' if known when translating, else None
+    def value_type(self, expr):
+        if isinstance(expr, parse.Const):
+            return {int: 'int', float: 'float'}.get(type(expr.value))
+        elif isinstance(expr, parse.Identifier):
+            kind, base = self.var_type(expr)
+            return base if kind == 'scalar' else None
+        elif isinstance(expr, parse.Temp_Ident):
+            return self.temp_types.get(expr.slot)
+        elif isinstance(expr, parse.Assign):
+            return self.target_type(expr.lvalue)
+        elif isinstance(expr, parse.UniOp):
+            operand = self.value_type(expr.operand)
+            if expr.op in ['-', '++', '--'] and operand == 'bool':
+                return 'int'
+            return operand if expr.op in ['+', '-', '++', '--'] else None
+        elif isinstance(expr, parse.BinOp):
+            if expr.op in ['<', '>', '==', '<=', '>=', '!=']:
+                return 'bool'
+            lhs, rhs = self.value_type(expr.left), self.value_type(expr.right)
+            if lhs is None or rhs is None:
+                return None
+            if expr.op in ['+', '-', '*', '/', '%']:
+                return 'float' if 'float' in [lhs, rhs] else 'int'
+        return None
+
+    def expr(self, expr):
+        if isinstance(expr, parse.Const):
+            return repr(expr.value)
+        elif isinstance(expr, parse.Identifier):
+            return self.name(expr)
+        elif isinstance(expr, parse.Temp_Ident):
+            return "t_{}".format(expr.slot)
+        elif isinstance(expr, parse.ArrayIdx) and isinstance(expr.array, parse.Identifier):
+            return "{}[{}]".format(self.name(expr.array), self.expr(expr.index))
+        elif isinstance(expr, parse.BinOp):
+            return self.binop(expr)
+        elif isinstance(expr, parse.UniOp):
+            return self.uniop(expr)
+        elif isinstance(expr, parse.FuncCall):
+            return "f_{}({})".format(expr.fn_name.name, ", ".join(map(self.expr, expr.args)))
+        elif isinstance(expr, parse.Assign) and isinstance(expr.lvalue, parse.Identifier):
+            rvalue = expr.rvalue
+            if expr.op in ['+=', '-=']:
+                rvalue = parse.BinOp(expr.lvalue, rvalue, expr.op[0])
+            return "({} := {})".format(self.name(expr.lvalue), self.converted(self.target_type(expr.lvalue), rvalue))
+        return "unsupported({!r})".format(str(expr))
+
+    def binop(self, expr):
+        lhs, rhs = self.expr(expr.left), self.expr(expr.right)
+        if expr.op in ['+', '-', '*', '<', '>', '==', '<=', '>=', '!=']:
+            return "({} {} {})".format(lhs, expr.op, rhs)
+        lhs_type, rhs_type = self.value_type(expr.left), self.value_type(expr.right)
+        known = lhs_type is not None and rhs_type is not None
+        if expr.op == '/':
+            if known and 'float' not in [lhs_type, rhs_type]:
+                return "int({} / {})".format(lhs, rhs)
+            elif known or 'float' in [lhs_type, rhs_type]:
+                return "({} / {})".format(lhs, rhs)
+            return "divide({}, {})".format(lhs, rhs)
+        elif expr.op == '%':
+            return "remainder({}, {})".format(lhs, rhs)
+        return "unsupported({!r})".format(str(expr))
+
+    def uniop(self, expr):
+        if expr.op == '-' and not expr.postfix:
+            return "(-{})".format(self.expr(expr.operand))
+        elif expr.op == '+' and not expr.postfix:
+            return self.expr(expr.operand)
+        elif expr.op in ['++', '--'] and isinstance(expr.operand, parse.Identifier):
+            name = self.name(expr.operand)
+            if expr.postfix:
+                return "({}, {} := {} {} 1)[0]".format(name, name, name, expr.op[0])
+            return "({} := {} {} 1)".format(name, name, expr.op[0])
+        return "unsupported({!r})".format(str(expr))
+
+
+# Variables resolved to the global frame by analysis.resolve_names
+def is_global(var):
+    return var.binding is not None and var.binding[0] is GLOBAL
+
+
+# (kind, base type) of a declared type
+def declared_type(var_type):
+    if isinstance(var_type, parse.Arrayed):
+        return ('array', var_type.base.type)
+    elif isinstance(var_type, parse.Asterisked):
+        return ('pointer', None)
+    return ('scalar', var_type.type)
+
+
+# (kind, base type) of a parameter, which values are stored to as they are
+def param_type(var_type):
+    return (declared_type(var_type)[0], None)
+
+
+def initial_value(var_type):
+    if isinstance(var_type, parse.Arrayed):
+        return "[None] * {}".format(var_type.len)
+    return "None"
+
+
+# Converts code's value of value_type to var_type, with int(), float() or, for values
+# that may be None, to_int() and to_float()
+def conversion(var_type, value_type, code, prefix=""):
+    if var_type not in ['int', 'float'] or value_type == var_type:
+        return code
+    return "{}{}({})".format(prefix, var_type, code)
+
+
+# Variables, elements and call results, which are None while uninitialized
+def may_be_none(expr):
+    return isinstance(expr, (parse.Identifier, parse.Temp_Ident, parse.ArrayIdx, parse.FuncCall))
+
+
+# Runtime of translated programs
+
+def printf(format, value):
+    if value != None:
+        print(format %(value), end='')
+    else:
+        if "%d" in format or "%f" in format:
+            raise Exception("formatting error")
+        else:
+            print(format, end='')
+
+
+# Remainder of a division truncating toward zero, as CFG.divide truncates
+def remainder(lhs, rhs):
+    if type(lhs) == int and type(rhs) == int:
+        return lhs - rhs * int(lhs / rhs)
+    return math.fmod(lhs, rhs)
+
+
+def to_int(value):
+    return None if value is None else int(value)
+
+
+def to_float(value):
+    return None if value is None else float(value)
+
+
+def unsupported(expr):
+    raise Exception("not supported in run mode: {}".format(expr))
+
+
+runtime = {
+    "printf": printf,
+    "divide": CFG.divide,
+    "remainder": remainder,
+    "to_int": to_int,
+    "to_float": to_float,
+    "unsupported": unsupported,
+}
+
+
+# Python source of a desugared program, with the C line of each of its lines
+def translate(ast):
+    analysis.resolve_names(ast)
+    translator = Translator()
+    translator.program(ast)
+    return translator.source(), translator.line_map
+
+
+# Code object of a desugared program, with line numbers of the C file filename
+def compile_program(ast, filename):
+    source, line_map = translate(ast)
+    tree = python_ast.parse(source, filename)
+    for node in python_ast.walk(tree):
+        if getattr(node, "lineno", None) is not None:
+            node.lineno = node.end_lineno = line_map[node.lineno - 1]
+            node.col_offset = node.end_col_offset = 0 # Python columns mean nothing in the C file
+    return compile(tree, filename, "exec")
+
+
+# Runs a desugared program to the end of its main
+def run_program(ast, filename):
+    namespace = dict(runtime)
+    exec(compile_program(ast, filename), namespace)
+    if "f_main" not in namespace:
+        print("No main function")
+        raise KeyError("main")
+    namespace["f_main"]()
@@ -0,0 +1,171 @@
+import contextlib
+import io
+
+import common
+from common import timed, gen_program, parse_desugared
+from bench_parse import ast_footprint
+import parse
+import analysis
+import optimize
+import hashcons
+import CFG
+import main
+
+# Benchmarks of desugaring, hash-consing and name resolution
+# Usage: python benchmarks/bench_analysis.py <benchmark> [args...]
+
+
+UNROLLED_LOOP = '''int main(void) {
+    int i;
+    int a;
+    int b;
+    int c[8];
+    for (i = 0; i < 800; i++) {
+        a = a + b * (c[1] - 2);
+        b = b * 2 + a - c[2];
+        c[3] = a * b + (a - b) * (c[1] - 2);
+        a = (a + b * (c[1] - 2)) / (b * 2 + a - c[2]) + i;
+    }
+    return a;
+}
+'''
+
+
+def unrolled_loops(data):
+    tree = parse_desugared(data)
+    return [optimize.unroll_loop(stmt) for stmt in tree.decls[-1].body.stmts]
+
+
+# Desugared AST and unrolled loop, with and without hash-consed expressions
+def bench_hashcons(size=1000):
+    print("{:>22} {:>10} {:>12} {:>14} {:>14}".format("", "nodes", "bytes", "shared nodes", "shared bytes"))
+    for name, build, data in [("desugared program", parse_desugared, gen_program(int(size))),
+                              ("unrolled loop", unrolled_loops, UNROLLED_LOOP)]:
+        row = []
+        for enabled in [False, True]:
+            hashcons.enabled = enabled
+            hashcons.clear()
+            classes, total = ast_footprint(build(data))
+            row += [sum(count for count, _ in classes.values()), total]
+        print("{:>22} {:>10} {:>12} {:>14} {:>14}".format(name, *row))
+    hashcons.clear()
+
+
+# a0 + 1 + f(a2) + a3 + ... as the parser builds it: a left-leaning tree n deep
+def long_sum(n):
+    expr = parse.Identifier("a0")
+    for i in range(1, n):
+        if i % 3 == 1:
+            term = parse.Const(i, parse.Int())
+        elif i % 3 == 2:
+            term = parse.FuncCall(parse.Identifier("f"), [parse.Identifier("a{}".format(i))])
+        else:
+            term = parse.Identifier("a{}".format(i))
+        expr = parse.BinOp(expr, term, "+")
+    return parse.Assign(parse.Identifier("x"), expr, "=")
+
+
+# x = -(a * (b[c - -(a * (b[...])) ...]) + f(...)): nested n deep through every kind of operand
+def deep_nesting(n):
+    expr = parse.Identifier("a")
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            expr = parse.UniOp(expr, "-")
+        elif kind == 1:
+            expr = parse.BinOp(parse.Identifier("a"), expr, "*")
+        elif kind == 2:
+            expr = parse.ArrayIdx(parse.Identifier("b"), expr)
+        else:
+            expr = parse.FuncCall(parse.Identifier("f"), [expr, parse.Const(i, parse.Int())])
+    return parse.Assign(parse.Identifier("x"), expr, "=")
+
+
+# Desugaring of long and deeply nested expressions: the time per node should stay flat
+def bench_desugar(*sizes):
+    sizes = [int(size) for size in sizes] or [1000, 10000, 100000]
+    print("{:>14} {:>8} {:>10} {:>12} {:>8}".format("expr", "nodes", "time", "us per node", "calls"))
+    for name, build in [("long sum", long_sum), ("deep nesting", deep_nesting)]:
+        for size in sizes:
+            expr = build(size)
+            exes, elapsed = timed(lambda: analysis.desugar_expr(1, expr)[0])
+            print("{:>14} {:>8} {:>9.3f}s {:>12.2f} {:>8}".format(name, size, elapsed, elapsed / size * 1e6, len(exes)))
+
+
+# Globals and locals of main, each assigned once
+def gen_variables(n):
+    lines = ["int g{};".format(i) for i in range(n)]
+    lines.append("int main(void) {")
+    lines += ["    int l{};".format(i) for i in range(n)]
+    lines += ["    l{0} = {0};\n    g{0} = {0};".format(i) for i in range(n)]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+# Runs gen_variables(n), leaving its frames for evaluating expressions over them
+def run_variables(n):
+    ctxt = main.MainContext(parse_desugared(gen_variables(n)))
+    ctxt.begin()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not ctxt.done:
+            ctxt.cmd_next()
+    return ctxt
+
+
+# Sum of every variable, bound to the slots of the frames run_variables left
+def variable_sum(n):
+    expr = None
+    for i in range(n):
+        for name, scope, frame in [("l{}".format(i), "main", CFG.function_table.table["main"].ref_value), ("g{}".format(i), CFG.GLOBAL, CFG.global_value_table)]:
+            var = hashcons.identifier(name, (scope, frame.slot_numbers[name], "int"))
+            expr = var if expr is None else hashcons.binop(expr, var, "+")
+    return expr
+
+
+# Variable loads by resolved slot, once the program has run
+def bench_resolve(size=200, repeat=200):
+    size, repeat = int(size), int(repeat)
+    run_variables(size)
+    print("{:>8} {:>10} {:>10}".format("lookup", "loads", "ns per load"))
+    expr = variable_sum(size)
+    total, elapsed = timed(lambda: [CFG.evaluate(0, expr) for _ in range(repeat)][-1])
+    loads = 2 * size * repeat
+    print("{:>8} {:>10} {:>10.1f}  sum {}".format("by slot", loads, elapsed / loads * 1e9, total))
+
+
+CALLS_TEMPLATE = '''int twice(int v) {{
+    return v * 2;
+}}
+int main(void) {{
+    int x, i;
+    x = 1;
+    for (i = 0; i < {loops}; i++) {{
+{body}
+    }}
+}}
+'''
+
+
+# Temporaries of hoisted calls vs the slots they share, and what a run keeps of them
+def bench_temps(size=50, loops=3):
+    size, loops = int(size), int(loops)
+    body = "\n".join("        x = twice(x) - twice(i) + {};".format(n) for n in range(size))
+    ctxt = main.MainContext(parse_desugared(CALLS_TEMPLATE.format(loops=loops, body=body)))
+    ctxt.begin()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, elapsed = timed(lambda: [ctxt.cmd_next() for _ in iter(lambda: ctxt.done, 1)])
+    temps = 2 * size
+    slots = len(CFG.call_stack.top().temps)
+    print("{:>6} {:>6} {:>6} {:>10}".format("calls", "temps", "slots", "run"))
+    print("{:>6} {:>6} {:>6} {:>9.3f}s".format(temps * loops, temps, slots, elapsed))
+
+
+BENCHMARKS = {
+    "hashcons": bench_hashcons,
+    "desugar": bench_desugar,
+    "resolve": bench_resolve,
+    "temps": bench_temps,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
@@ -0,0 +1,159 @@
+import contextlib
+import io
+
+import common
+from common import timed, traced, parse_desugared, program_with, run_steps
+import CFG
+import main
+
+# Benchmarks of building and stepping through control flow graphs
+# Usage: python benchmarks/bench_cfg.py <benchmark> [args...]
+
+
+BRANCHY_TEMPLATE = '''    for (i = 0; i < 2; i++) {{
+        if (x > {n}) {{
+            x = x - 1;
+        }} else {{
+            x = x + 2;
+        }}
+    }}
+    if (x == {n}) {{
+        y = y + 1;
+    }}
+'''
+
+
+# main with n loops and n branches around them
+def gen_branchy(n):
+    body = "".join(BRANCHY_TEMPLATE.format(n=i) for i in range(n))
+    return "int main(void) {\n    int i, x, y;\n    x = 0;\n    y = 0;\n" + body + "}\n"
+
+
+# CFG build time and memory of main bodies with many loops and branches
+def bench_cfg(*sizes):
+    sizes = [int(size) for size in sizes] or [100, 300, 1000]
+    print("{:>6} {:>8} {:>10} {:>12}".format("loops", "nodes", "build", "bytes"))
+    for size in sizes:
+        body = parse_desugared(gen_branchy(size)).decls[-1].body
+        (entry, _), traced_bytes = traced(CFG.build_graph, body.stmts)
+        _, elapsed = timed(CFG.build_graph, body.stmts)
+        print("{:>6} {:>8} {:>9.3f}s {:>12}".format(size, len(CFG.graph_nodes(entry)), elapsed, traced_bytes))
+
+
+# helper_i calls helper_{i-1} twice; main calls the deepest
+def gen_helpers(depth):
+    lines = ["int helper_0(int v) {\n    return v + 1;\n}"]
+    for i in range(1, depth + 1):
+        lines.append("int helper_{0}(int v) {{\n    v = helper_{1}(v);\n    v = helper_{1}(v);\n    return v;\n}}".format(i, i - 1))
+    lines.append("int main(void) {{\n    int x;\n    x = helper_{}(0);\n}}".format(depth))
+    return "\n".join(lines) + "\n"
+
+
+# Nodes of the per-function graphs vs the nodes inlining every call would build
+def bench_callgraph(depth=12):
+    depth = int(depth)
+    tree = parse_desugared(gen_helpers(depth))
+    program = main.MainContext(tree).program
+    graphs, elapsed = timed(lambda: {fun_name: CFG.function_graph(fun_name, program)[0] for fun_name in CFG.function_table.table})
+    nodes = sum(len(CFG.graph_nodes(node)) for node in graphs.values())
+    inlined = {}
+    for fun_name in graphs:
+        own = CFG.graph_nodes(graphs[fun_name])
+        inlined[fun_name] = len(own) + sum(inlined[node.callee] for node in own if node.callee is not None)
+    print("{:>6} {:>10} {:>12} {:>10}".format("depth", "nodes", "inlined", "build"))
+    print("{:>6} {:>10} {:>12} {:>9.3f}s".format(depth, nodes, inlined["main"], elapsed))
+
+
+# main calls one of n functions, each with a loop and branches
+def gen_unused(n):
+    lines = ["int fn_{0}(int x) {{\n    int i, y;\n    y = 0;\n{1}    return y;\n}}".format(i, BRANCHY_TEMPLATE.format(n=i)) for i in range(n)]
+    lines.append("int main(void) {\n    int r;\n    r = fn_0(1);\n}")
+    return "\n".join(lines) + "\n"
+
+
+# Setup and the graphs it builds when main reaches one function of many
+def bench_lazy(*sizes):
+    sizes = [int(size) for size in sizes] or [10, 100, 1000]
+    print("{:>6} {:>10} {:>12} {:>8}".format("fns", "setup", "materialized", "nodes"))
+    for size in sizes:
+        tree = parse_desugared(gen_unused(size))
+        CFG.function_table.table.clear()
+        nodes = CFG.node_index
+        ctxt, elapsed = timed(main.MainContext, tree)
+        ctxt.begin()
+        with contextlib.redirect_stdout(io.StringIO()):
+            while not ctxt.done:
+                ctxt.cmd_next()
+        print("{:>6} {:>9.3f}s {:>12} {:>8}".format(size, elapsed, ctxt.program.functions_materialized, CFG.node_index - nodes))
+
+
+NESTED_TEMPLATE = '''    for (i = 0; i < 3; i++) {{
+        if (x > {n}) {{
+            if (x > {n} + 1) {{
+                x = x - 1;
+            }}
+        }} else {{
+            for (j = 0; j < 2; j++) {{
+                x = x + 1;
+            }}
+        }}
+    }}
+'''
+
+
+# Steps per second of nested loops and branches, on graphs as built and compacted
+def bench_compact(size=100, repeat=3):
+    size, repeat = int(size), int(repeat)
+    source = "int main(void) {\n    int i, j, x;\n    x = 0;\n" + "".join(NESTED_TEMPLATE.format(n=n) for n in range(size)) + "}\n"
+    print("{:>10} {:>8} {:>8} {:>8} {:>12}".format("graph", "nodes", "removed", "edges", "steps/s"))
+    for name, compact in [("built", False), ("compacted", True)]:
+        best = None
+        for _ in range(repeat):
+            CFG.function_table.table.clear()
+            ctxt = main.MainContext(parse_desugared(source), program_with(compact=compact))
+            ctxt.begin()
+            steps, elapsed = timed(run_steps, ctxt)
+            best = elapsed if best is None else min(best, elapsed)
+        nodes = len(CFG.graph_nodes(CFG.function_table.table["main"].graph[0]))
+        print("{:>10} {:>8} {:>8} {:>8} {:>12.0f}".format(name, nodes, ctxt.program.nodes_removed, ctxt.program.edges_removed, steps / best))
+
+
+GAPPED_LOOP = '''int main(void) {{
+    int i, x;
+    x = 0;
+
+    for (i = 0; i < {n}; i++) {{
+
+        x = x + 1;
+
+    }}
+}}
+'''
+
+
+# Time per step of `next N`, and the statements in the graph before and after
+def bench_steps(*counts):
+    counts = [int(count) for count in counts] or [1000, 10000, 100000]
+    print("{:>8} {:>10} {:>12} {:>12}".format("steps", "ns/step", "stmts before", "stmts after"))
+    for count in counts:
+        CFG.function_table.table.clear()
+        ctxt = main.MainContext(parse_desugared(GAPPED_LOOP.format(n=count)))
+        ctxt.begin()
+        nodes = CFG.graph_nodes(ctxt.CFG[0])
+        before = sum(len(node.block) for node in nodes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, elapsed = timed(ctxt.cmd_next, count)
+        after = sum(len(node.block) for node in nodes)
+        print("{:>8} {:>10.0f} {:>12} {:>12}".format(count, elapsed / count * 1e9, before, after))
+
+
+BENCHMARKS = {
+    "cfg": bench_cfg,
+    "callgraph": bench_callgraph,
+    "lazy": bench_lazy,
+    "compact": bench_compact,
+    "steps": bench_steps,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
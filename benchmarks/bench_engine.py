@@ -0,0 +1,109 @@
+import contextlib
+import io
+import time
+
+import common
+from common import timed, parse_desugared, program_with, run_steps
+import CFG
+import aot
+import main
+
+# Benchmarks of running programs: tree walking, closures, bytecode and aot
+# Usage: python benchmarks/bench_engine.py <benchmark> [args...]
+
+
+LOOPS_PROGRAM = '''int main(void) {{
+    int i, j, x;
+    int a[4];
+    float y;
+    x = 0;
+    y = 0.5;
+    for (i = 0; i < {n}; i++) {{
+        for (j = 0; j < 4; j++) {{
+            a[j] = i * j + x / 3;
+            x = x + a[j] - 2 * j;
+            if (x > 100) {{
+                x = x - 100;
+            }}
+            y = y * 0.5 + x;
+        }}
+    }}
+}}
+'''
+
+
+# Statements per second of loop-heavy code, evaluated by walking the tree, by closures
+# or by bytecode on vm.Machine
+def bench_closures(size=200, repeat=3):
+    size, repeat = int(size), int(repeat)
+    print("{:>10} {:>8} {:>12}".format("evaluator", "steps", "steps/s"))
+    for name, engine, compiled in [("tree", "graph", False), ("closures", "graph", True), ("vm", "vm", True)]:
+        best = None
+        for _ in range(repeat):
+            CFG.function_table.table.clear()
+            ctxt = main.MainContext(parse_desugared(LOOPS_PROGRAM.format(n=size)), program_with(engine=engine, compiled=compiled))
+            ctxt.begin()
+            steps, elapsed = timed(run_steps, ctxt)
+            best = elapsed if best is None else min(best, elapsed)
+        print("{:>10} {:>8} {:>12.0f}".format(name, steps, steps / best))
+
+
+# Time to run loop-heavy code to its end on the graph and translated to Python by
+# aot, translation and compilation included
+def bench_aot(size=500, repeat=3):
+    size, repeat = int(size), int(repeat)
+    source = LOOPS_PROGRAM.format(n=size)
+    print("{:>10} {:>10}".format("engine", "seconds"))
+    CFG.function_table.table.clear()
+    ctxt = main.MainContext(parse_desugared(source), program_with(engine="graph"))
+    ctxt.begin()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, elapsed = timed(ctxt.cmd_next, 10 ** 9)
+    print("{:>10} {:>10.4f}".format("graph", elapsed))
+    best = None
+    for _ in range(repeat):
+        tree = parse_desugared(source)
+        _, elapsed = timed(aot.run_program, tree, "<loops>")
+        best = elapsed if best is None else min(best, elapsed)
+    print("{:>10} {:>10.4f}".format("aot", best))
+
+
+COLD_TEMPLATE = '''    if (x > {n}) {{
+        x = x - {n};
+        y = y + x;
+    }} else {{
+        x = x + {n} / 2;
+    }}
+'''
+
+
+# Time to build and run to its end a program of cold code followed by a hot loop, with
+# statements evaluated by walking the tree, compiled as graphs are built, or compiled
+# once their loop or function gets hot
+def bench_tiers(cold=2000, hot=200, repeat=3):
+    cold, hot, repeat = int(cold), int(hot), int(repeat)
+    body = LOOPS_PROGRAM.format(n=hot).split("    for", 1)
+    source = body[0] + "".join(COLD_TEMPLATE.format(n=n) for n in range(cold)) + "    for" + body[1]
+    print("{:>10} {:>8} {:>10} {:>9}".format("evaluator", "steps", "compiled", "seconds"))
+    for name, compiled, threshold in [("tree", False, 0), ("eager", True, 0), ("tiered", True, 16)]:
+        best = None
+        for _ in range(repeat):
+            CFG.function_table.table.clear()
+            tree = parse_desugared(source)
+            begin = time.perf_counter()
+            ctxt = main.MainContext(tree, program_with(engine="graph", compiled=compiled, tier_threshold=threshold))
+            ctxt.begin()
+            steps = run_steps(ctxt)
+            elapsed = time.perf_counter() - begin
+            best = elapsed if best is None else min(best, elapsed)
+        print("{:>10} {:>8} {:>10} {:>8.3f}s".format(name, steps, ctxt.program.nodes_compiled, best))
+
+
+BENCHMARKS = {
+    "closures": bench_closures,
+    "aot": bench_aot,
+    "tiers": bench_tiers,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
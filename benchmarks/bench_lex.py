@@ -0,0 +1,141 @@
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import common
+from common import timed, traced, gen_source, lex_all_tokens
+import scanner
+import fastlex
+import tokstream
+import source
+
+# Benchmarks of the scanner: lexers, token streams and source input
+# Usage: python benchmarks/bench_lex.py <benchmark> [args...]
+
+
+def lex_all(lexer, data):
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in lex_all_tokens(lexer, data)]
+
+
+# PLY master regex lexer vs the hand-written fastlex.FastLexer
+def bench_lex(*sizes):
+    sizes = [int(size) for size in sizes] or [100, 1000, 5000]
+    print("{:>8} {:>10} {:>14} {:>14} {:>8}".format("funcs", "tokens", "ply tok/s", "fast tok/s", "speedup"))
+    for size in sizes:
+        data = gen_source(size)
+        ply_toks, ply_time = timed(lex_all, scanner.get_lexer(), data)
+        fast_toks, fast_time = timed(lex_all, fastlex.FastLexer(), data)
+        print("{:>8} {:>10} {:>14.0f} {:>14.0f} {:>7.2f}x".format(
+            size, len(ply_toks), len(ply_toks) / ply_time, len(fast_toks) / fast_time, ply_time / fast_time))
+
+
+def print_tokens(tokens, out):
+    for tok in tokens:
+        print("Line %d: (%s, '%s')" % (tok.lineno, tok.type, tok.value), file=out)
+
+
+def dump_stream(stream, out):
+    with tokstream.DumpWriter(out) as dump:
+        dump.write_stream(stream)
+
+
+def save_stream(stream):
+    out = io.BytesIO()
+    stream.save(out)
+    return out.getvalue()
+
+
+# LexToken list vs tokstream.TokenStream: memory, dump time and binary save and load
+def bench_tokstream(size=5000):
+    data = gen_source(int(size))
+    lexer = fastlex.FastLexer()
+    tokens, token_bytes = traced(lambda: list(lex_all_tokens(lexer, data)))
+    stream, stream_bytes = traced(tokstream.scan, lexer, data, scanner.tokens)
+    print("{} tokens".format(len(tokens)))
+    print("memory: LexToken list {:.1f} MB, TokenStream {:.1f} MB".format(token_bytes / 2**20, stream_bytes / 2**20))
+
+    printed, print_time = timed(lambda: print_tokens(tokens, io.StringIO()))
+    dumped, dump_time = timed(lambda: dump_stream(stream, io.StringIO()))
+    print("dump: print() {:.3f}s, DumpWriter {:.3f}s".format(print_time, dump_time))
+
+    encoded, save_time = timed(save_stream, stream)
+    loaded, load_time = timed(tokstream.load, encoded)
+    print("binary: {:.1f} MB, save {:.3f}s, load {:.3f}s".format(len(encoded) / 2**20, save_time, load_time))
+
+
+def read_by_lines(path):
+    input_file = open(path)
+    lines = input_file.readlines()
+    input_file.close()
+    strings = ""
+    for line in lines:
+        strings += line
+    return strings
+
+
+# Time to first token and total time of reading and scanning a file
+def measure_input(open_lexer, path):
+    begin = time.perf_counter()
+    lexer = open_lexer(path)
+    lexer.token()
+    first_time = time.perf_counter() - begin
+    count = 1
+    for _ in iter(lexer.token, None):
+        count += 1
+    return count, first_time, time.perf_counter() - begin
+
+
+# Peak traced memory of the same, measured in a separate pass
+def measure_peak(open_lexer, path):
+    tracemalloc.start()
+    try:
+        for _ in open_lexer(path):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def input_readlines(path):
+    lexer = fastlex.FastLexer()
+    lexer.input(read_by_lines(path))
+    return lexer
+
+
+def input_mmap(path):
+    lexer = fastlex.FastLexer()
+    lexer.input(source.read_source(path))
+    return lexer
+
+
+def input_chunked(path):
+    return source.feed(fastlex.FastLexer(), path, 1 << 16)
+
+
+# readlines() + concatenation vs the source module's mmap and chunked input
+def bench_input(size=2000):
+    fd, path = tempfile.mkstemp(suffix=".c")
+    try:
+        with os.fdopen(fd, "w") as out:
+            out.write(gen_source(int(size)))
+        print("{:.1f} MB source".format(os.path.getsize(path) / 2**20))
+        print("{:>10} {:>10} {:>14} {:>10} {:>12}".format("input", "tokens", "first token", "total", "peak MB"))
+        for name, open_lexer in [("readlines", input_readlines), ("mmap", input_mmap), ("chunked", input_chunked)]:
+            count, first_time, total_time = measure_input(open_lexer, path)
+            peak = measure_peak(open_lexer, path)
+            print("{:>10} {:>10} {:>12.1f}ms {:>9.2f}s {:>12.1f}".format(
+                name, count, first_time * 1000, total_time, peak / 2**20))
+    finally:
+        os.remove(path)
+
+
+BENCHMARKS = {
+    "lex": bench_lex,
+    "tokstream": bench_tokstream,
+    "input": bench_input,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
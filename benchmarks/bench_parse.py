@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+
+import common
+from common import timed, traced, gen_program, lex_all_tokens, parse_text
+import fastlex
+import parse
+import rdparse
+
+# Benchmarks of the parsers and of the AST they build
+# Usage: python benchmarks/bench_parse.py <benchmark> [args...]
+
+
+# A function whose body is n statements long
+def gen_body(n):
+    lines = ["int main(void) {\n", "    int x, y;\n"]
+    for i in range(n):
+        if i % 2:
+            lines.append("    x = add(x, {}, y);\n".format(i))
+        else:
+            lines.append("    y = y + {} * x;\n".format(i))
+    lines.append("    return 0;\n}\n")
+    return "".join(lines)
+
+
+# Parse time of growing function bodies: the time per statement should stay flat
+def bench_parse(*sizes):
+    sizes = [int(size) for size in sizes] or [1000, 10000, 100000]
+    print("{:>10} {:>10} {:>14}".format("stmts", "parse", "us per stmt"))
+    for size in sizes:
+        _, elapsed = timed(parse_text, gen_body(size))
+        print("{:>10} {:>9.2f}s {:>14.1f}".format(size, elapsed, elapsed / size * 1e6))
+
+
+# Attribute values of an object, whether kept in __slots__ or in a __dict__
+def attribute_values(obj):
+    if hasattr(obj, "__dict__"):
+        yield from vars(obj).values()
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            if hasattr(obj, name):
+                yield getattr(obj, name)
+
+
+# Size of every object reachable from the tree, each counted once.
+# Returns {class name: [count, bytes]} for the AST nodes and the total of everything
+def ast_footprint(tree):
+    classes = {}
+    total = 0
+    seen = set()
+    pending = [tree]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size = sys.getsizeof(obj)
+        if isinstance(obj, (list, tuple)):
+            pending.extend(obj)
+        elif type(obj).__module__ == parse.__name__:
+            if hasattr(obj, "__dict__"):
+                size += sys.getsizeof(vars(obj))
+            pending.extend(attribute_values(obj))
+            entry = classes.setdefault(type(obj).__name__, [0, 0])
+            entry[0] += 1
+            entry[1] += size
+        total += size
+    return classes, total
+
+
+# Bytes per AST node of a source file, or of a generated one of n functions
+def bench_ast(target="1000"):
+    if os.path.exists(target):
+        path = target
+        fd = None
+    else:
+        fd, path = tempfile.mkstemp(suffix=".c")
+        with os.fdopen(fd, "w") as out:
+            out.write(gen_program(int(target)))
+    try:
+        tree, traced_bytes = traced(parse.parse_file, path, fastlex.FastLexer())
+    finally:
+        if fd is not None:
+            os.remove(path)
+    classes, total = ast_footprint(tree)
+    nodes = sum(count for count, _ in classes.values())
+    print("{:>16} {:>10} {:>12} {:>10}".format("node", "count", "bytes", "per node"))
+    for name, (count, size) in sorted(classes.items(), key=lambda item: -item[1][1]):
+        print("{:>16} {:>10} {:>12} {:>10.1f}".format(name, count, size, size / count))
+    print("{} nodes, {} bytes reachable, {:.1f} bytes per node".format(nodes, total, total / nodes))
+    print("{} bytes traced after parsing".format(traced_bytes))
+
+
+# Lexer handing out tokens that were scanned beforehand.
+# yacc reads lineno and lexpos for empty rules, which do not reach the AST
+class ReplayLexer:
+    def __init__(self, tokens):
+        self.lineno = 0
+        self.lexpos = 0
+        self.token = iter(tokens + [None]).__next__
+
+
+def parse_yacc(tokens):
+    return parse.get_parser().parse(lexer=ReplayLexer(tokens), tracking=True)
+
+
+def parse_rd(tokens):
+    return rdparse.parse_tokens(ReplayLexer(tokens))
+
+
+# PLY's LALR tables vs the recursive-descent backend, on the same pre-scanned tokens
+def bench_parsers(*sizes):
+    sizes = [int(size) for size in sizes] or [100, 1000, 5000]
+    print("{:>8} {:>10} {:>10} {:>10} {:>8}".format("funcs", "tokens", "yacc", "rd", "speedup"))
+    for size in sizes:
+        tokens = list(lex_all_tokens(fastlex.FastLexer(), gen_program(size)))
+        _, yacc_time = timed(parse_yacc, tokens)
+        _, rd_time = timed(parse_rd, tokens)
+        print("{:>8} {:>10} {:>9.3f}s {:>9.3f}s {:>7.2f}x".format(size, len(tokens), yacc_time, rd_time, yacc_time / rd_time))
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "ast": bench_ast,
+    "parsers": bench_parsers,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
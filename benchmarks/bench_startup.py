@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from common import repo_dir
+import tablecache
+
+# Benchmark of the startup of the interpreter, with and without the table cache
+# Usage: python benchmarks/bench_startup.py <benchmark> [args...]
+
+
+SAMPLE_PROGRAM = '''int main(void) {
+    int i;
+    int total;
+    total = 0;
+    for (i = 0; i < 10; i++) {
+        total = total + i;
+    }
+    printf("%d\\n", total);
+    return 0;
+}
+'''
+
+
+legacy_files = ["parsetab.py", "parser.out"]
+
+
+# Runs python code in a fresh interpreter, with the table cache on or off
+def run_fresh(code, use_cache, options=(), stdin=""):
+    setup = "import tablecache; tablecache.use_cache = {}; ".format(use_cache)
+    return subprocess.run([sys.executable] + list(options) + ["-c", setup + code], cwd=repo_dir,
+                          input=stdin, capture_output=True, text=True, check=True)
+
+
+# Time to import the parse module and build its parser, in seconds
+def build_time(use_cache):
+    result = run_fresh("import time; begin = time.perf_counter(); import parse; parse.get_parser(); "
+                       "print(time.perf_counter() - begin)", use_cache)
+    return float(result.stdout)
+
+
+# Wall time of main.py until its first prompt, answered with an empty line
+def prompt_time(use_cache, path):
+    code = "import runpy, sys; sys.argv = ['main.py', {!r}]; runpy.run_path('main.py', run_name='__main__')".format(path)
+    begin = time.perf_counter()
+    run_fresh(code, use_cache, stdin="\n")
+    return time.perf_counter() - begin
+
+
+# Startup of the interpreter: tables built on every start vs cached table modules
+def bench_startup(repeat=5):
+    repeat = int(repeat)
+    existing = [name for name in legacy_files if os.path.exists(os.path.join(repo_dir, name))]
+    fd, path = tempfile.mkstemp(suffix=".c")
+    try:
+        with os.fdopen(fd, "w") as out:
+            out.write(SAMPLE_PROGRAM)
+        modes = [
+            ("legacy", False, lambda: None),
+            ("cold cache", True, tablecache.clear),
+            ("warm cache", True, lambda: None),
+        ]
+        print("{:>12} {:>14} {:>14}".format("mode", "parser built", "first prompt"))
+        for name, use_cache, prepare in modes:
+            run_fresh("import parse; parse.get_parser()", use_cache) # Writes the tables the mode expects to find
+            timings = []
+            for measure in [build_time, prompt_time]:
+                args = [use_cache] if measure is build_time else [use_cache, path]
+                best = None
+                for _ in range(repeat):
+                    prepare()
+                    elapsed = measure(*args)
+                    best = elapsed if best is None else min(best, elapsed)
+                timings.append(best)
+            print("{:>12} {:>12.1f}ms {:>12.1f}ms".format(name, timings[0] * 1000, timings[1] * 1000))
+    finally:
+        os.remove(path)
+        for name in legacy_files:
+            if name not in existing and os.path.exists(os.path.join(repo_dir, name)):
+                os.remove(os.path.join(repo_dir, name))
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import sys
+import time
+
+import common
+from common import timed, parse_desugared
+import CFG
+import main
+import stack
+
+# Benchmarks of the value stack, variable histories and arrays
+# Usage: python benchmarks/bench_values.py <benchmark> [args...]
+
+
+# The value stack as it was before stack.ValueStack became an arena: each allocation
+# and free copies the whole stack, and each slot is a dict
+class CopyingStack(stack.ValueStack):
+    def __init__(self):
+        self.values = []
+    def allocate(self, value, line):
+        index = len(self.values)
+        self.values = self.values + [{"value": value, "history": [(value, line)]}]
+        return index
+    def free(self, num):
+        if num != 0:
+            self.values = self.values[:-num]
+
+
+# Locals allocated and freed per second by chains of calls depth deep, each call
+# declaring width locals and freeing them when it returns
+def bench_stack(count=1000000, depth=1000, width=4):
+    count, depth, width = int(count), int(depth), int(width)
+    print("{:>10} {:>10} {:>8} {:>14}".format("stack", "locals", "depth", "locals/s"))
+    names = ["v{}".format(local) for local in range(width)]
+    saved = stack.value_stack
+    slot_numbers = {local: slot for slot, local in enumerate(names)}
+    for name, value_stack in [("copying", CopyingStack()), ("arena", stack.ValueStack())]:
+        stack.value_stack = value_stack
+        begin = time.perf_counter()
+        allocated = 0
+        while allocated < count:
+            frames = []
+            for call in range(depth):
+                frame = stack.ValueTable(slot_numbers)
+                for local in names:
+                    frame.allocate_local(local, call, call)
+                frames.append(frame)
+            for frame in reversed(frames):
+                frame.free_local()
+            allocated += depth * width
+        elapsed = time.perf_counter() - begin
+        print("{:>10} {:>10} {:>8} {:>14.0f}".format(name, allocated, depth, allocated / elapsed))
+    stack.value_stack = saved
+
+
+COUNTER_PROGRAM = '''int main(void) {{
+    int i, x;
+    x = 0;
+    for (i = 0; i < {n}; i++) {{
+        x = x + i;
+    }}
+}}
+'''
+
+
+# Time to run a loop whose counter and sum are written n times each, and to trace them
+def bench_history(*sizes):
+    sizes = [int(size) for size in sizes] or [1000, 10000, 100000]
+    print("{:>8} {:>10} {:>14} {:>10}".format("n", "writes", "writes/s", "trace"))
+    for size in sizes:
+        CFG.function_table.table.clear()
+        ctxt = main.MainContext(parse_desugared(COUNTER_PROGRAM.format(n=size)))
+        ctxt.begin()
+        writes = len(stack.value_stack.log_lines)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, elapsed = timed(ctxt.cmd_next, 4 * size + 10)
+            _, trace_elapsed = timed(ctxt.cmd_trace, "x", None)
+        writes = len(stack.value_stack.log_lines) - writes
+        print("{:>8} {:>10} {:>14.0f} {:>9.3f}s".format(size, writes, writes / elapsed, trace_elapsed))
+
+
+FILL_PROGRAM = '''int main(void) {{
+    int i;
+    int a[{n}];
+    for (i = 0; i < {n}; i++) {{
+        a[i] = i * 2;
+    }}
+}}
+'''
+
+
+# Time to fill an array of n elements in a loop, and to trace one of its elements
+def bench_arrays(*sizes):
+    sizes = [int(size) for size in sizes] or [1000, 10000, 100000]
+    print("{:>8} {:>10} {:>14} {:>10}".format("n", "steps", "steps/s", "trace"))
+    for size in sizes:
+        CFG.function_table.table.clear()
+        ctxt = main.MainContext(parse_desugared(FILL_PROGRAM.format(n=size)))
+        ctxt.begin()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, elapsed = timed(ctxt.cmd_next, 3 * size + 10)
+            _, trace_elapsed = timed(ctxt.cmd_trace, "a", 3)
+        steps = 3 * size + 3
+        print("{:>8} {:>10} {:>14.0f} {:>9.3f}s".format(size, steps, steps / elapsed, trace_elapsed))
+
+
+# Bytes of an array and of the elements it boxes
+def array_footprint(array):
+    if isinstance(array, stack.TypedArray):
+        return sys.getsizeof(array) + sys.getsizeof(array.items) + sys.getsizeof(array.kinds)
+    return sys.getsizeof(array) + sum(sys.getsizeof(element) for element in array if element is not None)
+
+
+# Bytes per element and steps per second of an int array filled in a loop, stored as
+# a list or as a typed buffer
+def bench_typed(size=100000):
+    size = int(size)
+    print("{:>8} {:>10} {:>14} {:>14}".format("array", "n", "bytes/elem", "steps/s"))
+    for name, typed in [("list", False), ("typed", True)]:
+        stack.typed_arrays = typed
+        CFG.function_table.table.clear()
+        ctxt = main.MainContext(parse_desugared(FILL_PROGRAM.format(n=size)))
+        ctxt.begin()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, elapsed = timed(ctxt.cmd_next, 3 * size + 10)
+        array = stack.value_stack.get_value(ctxt.cur_func_table.ref_value.get_address("a"))
+        footprint = array_footprint(array)
+        print("{:>8} {:>10} {:>14.1f} {:>14.0f}".format(name, size, footprint / size, (3 * size + 3) / elapsed))
+    stack.typed_arrays = True
+
+
+BENCHMARKS = {
+    "stack": bench_stack,
+    "history": bench_history,
+    "arrays": bench_arrays,
+    "typed": bench_typed,
+}
+
+if __name__ == '__main__':
+    common.run(BENCHMARKS)
@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import fastlex
+import parse
+import analysis
+import CFG
+
+# Helpers shared by the benchmarks of each subsystem, in bench_*.py.
+# Usage: python benchmarks/bench_<subsystem>.py <benchmark> [args...]
+
+
+def timed(fn, *args):
+    begin = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - begin
+
+
+def traced(fn, *args):
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+# A function exercising every token class the scanner knows
+FUNCTION_TEMPLATE = '''/* function {n}
+   multi-line block comment */
+int fn_{n}(int count, float *value) {{
+    int i, total;
+    float avg;
+    total = 0; // running sum
+    for (i = 0; i < count; i++) {{
+        total = total + value[i] * {n} - (i % 3);
+        avg = total / 2.5e1 + .5 + 1.;
+        if (total >= 100 && avg != 0.0) {{
+            printf("%d items, %f avg\\n", total);
+        }}
+    }}
+    return total;
+}}
+'''
+
+
+# Generates a C source of n functions
+def gen_source(n):
+    return "".join(FUNCTION_TEMPLATE.format(n=i) for i in range(n))
+
+
+# A function the parser accepts, for benchmarks past the scanner
+PARSED_TEMPLATE = '''int fn_{n}(int count, float *value) {{
+    int i;
+    int total;
+    float avg;
+    total = 0;
+    for (i = 0; i < count; i++) {{
+        total = total + value[i] * {n} - (i % 3);
+        avg = total / 2.5 + 0.5;
+        if (total >= 100) {{
+            printf("%d items\\n", total);
+        }} else {{
+            total = fn_{n}(count - 1, value);
+        }}
+    }}
+    return total;
+}}
+'''
+
+
+def gen_program(n):
+    return "".join(PARSED_TEMPLATE.format(n=i) for i in range(n))
+
+
+def lex_all_tokens(lexer, data):
+    lexer.lineno = 1
+    lexer.input(data)
+    return iter(lexer.token, None)
+
+
+def parse_text(data):
+    lexer = fastlex.FastLexer()
+    lexer.input(data)
+    return parse.get_parser().parse(lexer=lexer, tracking=True)
+
+
+def parse_desugared(data):
+    return analysis.desugar_ast(parse_text(data))
+
+
+# Settings of a program run by a benchmark
+def program_with(**settings):
+    program = CFG.Program()
+    for name, value in settings.items():
+        setattr(program, name, value)
+    return program
+
+
+# Runs a program to its end, returning the steps taken
+def run_steps(ctxt):
+    steps = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while not ctxt.done:
+            ctxt.cmd_next()
+            steps += 1
+    return steps
+
+
+# Runs the benchmark named on the command line
+def run(benchmarks):
+    if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+        print("usage: python {} [{}] [args...]".format(sys.argv[0], "|".join(benchmarks)))
+        sys.exit(1)
+    benchmarks[sys.argv[1]](*sys.argv[2:])
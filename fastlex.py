@@ -0,0 +1,242 @@
+import re
+import sys
+
+import ply.lex as lex
+import scanner
+
+# Scanner over the same rules as scanner.py, dispatching on the first character.
+# Gives the same tokens as the PLY lexer, so the parser can use it
+
+# Character classes used for dispatching
+NAME = 0
+SPACE = 1
+NUMBER = 2
+CHARACTER = 3
+STRING = 4
+SLASH = 5
+OPERATOR = 6
+ERROR = 7
+
+# Token rules reused from the scanner's function rules
+id_re = re.compile(scanner.t_ID.__doc__)
+invalid_id_re = re.compile(scanner.t_invalid_ID.__doc__)
+float_re = re.compile(scanner.t_FLOAT_NUM.__doc__)
+int_re = re.compile(scanner.t_INT_NUM.__doc__)
+character_re = re.compile(scanner.t_CHARACTER.__doc__)
+string_re = re.compile(scanner.t_STRING.__doc__)
+space_re = re.compile(scanner.t_SPACE.__doc__)
+comment_re = re.compile(scanner.t_COMMENT.__doc__)
+
+# Conversion specifiers accepted after '%', as checked by scanner.t_STRING
+format_chars = frozenset("dfcisouxXeEgG%")
+
+
+# Operator rules, in the order the PLY master regex tries them:
+# string rules sorted by the length of their regex, longest first
+def operator_table(module):
+    rules = [(name[2:], value) for name, value in vars(module).items()
+             if name.startswith("t_") and isinstance(value, str)]
+    rules.sort(key=lambda rule: len(rule[1]), reverse=True)
+    table = {}
+    for tok_type, regex in rules:
+        literal = re.sub(r"\\(.)", r"\1", regex)
+        table.setdefault(literal[0], []).append((literal, tok_type))
+    return table
+
+
+operators = operator_table(scanner)
+
+
+def char_kind(char):
+    if char.isascii():
+        if char.isalpha() or char == "_":
+            return NAME
+        if char.isdigit() or char == ".":
+            return NUMBER
+    if char.isspace():
+        return SPACE
+    if char.isdecimal():
+        return NUMBER
+    if char == "'":
+        return CHARACTER
+    if char == '"':
+        return STRING
+    if char == "/":
+        return SLASH
+    if char in operators:
+        return OPERATOR
+    return ERROR
+
+
+ascii_kinds = {chr(code): char_kind(chr(code)) for code in range(128)}
+
+
+class FastLexer:
+    def __init__(self):
+        self.lexdata = None
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lexbase = 0 # Offset of lexdata within the whole input, when scanning chunks
+        self.lineno = 1
+        self.stream = iter(())
+
+    # Same contract as lex.Lexer.input: line number is not reset
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self.lexlen = len(data)
+        self.lexbase = 0
+        self.stream = self.scan(None)
+
+    # Scans text given in pieces, keeping only the unscanned part in memory
+    def input_chunks(self, chunks):
+        self.lexdata = ""
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lexbase = 0
+        self.stream = self.scan(iter(chunks))
+
+    def token(self):
+        return next(self.stream, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
+
+    def error(self, pos):
+        self.lexpos = self.lexbase + pos
+        print("Syntax error : line", self.lineno)
+        raise scanner.Scanner_Error()
+
+    # Value of a string literal; ones with escapes go through scanner.t_STRING
+    def string_value(self, text, pos):
+        body = text[1:-1]
+        if "\\" in body or '"' in body:
+            tok = lex.LexToken()
+            tok.value = text
+            tok.lexer = self
+            return scanner.t_STRING(tok).value
+        percent = body.find("%")
+        while percent != -1:
+            if body[percent + 1:percent + 2] not in format_chars:
+                self.error(pos)
+            percent = body.find("%", percent + 2)
+        return body
+
+    # Reads chunks until the buffer ends with a whole line: (buffer, end of whole lines, input over)
+    def refill(self, data, pos, chunks):
+        self.lexbase += pos
+        data = data[pos:]
+        for chunk in chunks:
+            data += chunk
+            newline = data.rfind("\n", len(data) - len(chunk))
+            if newline != -1:
+                self.lexdata = data
+                return data, newline + 1, False
+        self.lexdata = data
+        self.lexlen = self.lexbase + len(data)
+        return data, len(data), True
+
+    # Only block comments and whitespace span lines, so chunk boundaries never cut other tokens
+    def scan(self, chunks):
+        data = self.lexdata
+        pos = 0
+        done = chunks is None
+        whole = len(data)
+        kinds = ascii_kinds
+        keywords = scanner.identifiers
+        new_token = lex.LexToken
+
+        while True:
+            if pos >= whole:
+                if done:
+                    break
+                data, whole, done = self.refill(data, pos, chunks)
+                pos = 0
+                continue
+
+            char = data[pos]
+            kind = kinds.get(char)
+            if kind is None:
+                kind = char_kind(char)
+
+            if kind == SPACE:
+                end = space_re.match(data, pos).end()
+                self.lineno += data.count("\n", pos, end)
+                pos = end
+                continue
+
+            tok_type = None
+            if kind == NAME:
+                value = id_re.match(data, pos).group()
+                tok_type = keywords.get(value, "ID")
+                end = pos + len(value)
+            elif kind == NUMBER:
+                if invalid_id_re.match(data, pos):
+                    self.error(pos)
+                match = float_re.match(data, pos)
+                if match:
+                    tok_type = "FLOAT_NUM"
+                    value = float(match.group())
+                else:
+                    match = int_re.match(data, pos)
+                    if match:
+                        tok_type = "INT_NUM"
+                        value = int(match.group())
+                if match:
+                    end = match.end()
+            elif kind == CHARACTER:
+                match = character_re.match(data, pos)
+                if match:
+                    tok_type = "CHARACTER"
+                    value = match.group()
+                    end = match.end()
+            elif kind == STRING:
+                match = string_re.match(data, pos)
+                if match:
+                    tok_type = "STRING"
+                    end = match.end()
+                    self.lexpos = self.lexbase + end
+                    value = self.string_value(match.group(), pos)
+            elif kind == SLASH:
+                match = comment_re.match(data, pos)
+                while not match and not done and data.startswith("/*", pos):
+                    # Block comment may end in a later chunk
+                    data, whole, done = self.refill(data, pos, chunks)
+                    pos = 0
+                    match = comment_re.match(data, pos)
+                if match:
+                    end = match.end()
+                    self.lineno += data.count("\n", pos, end)
+                    pos = end
+                    continue
+
+            if tok_type is None:
+                for literal, op_type in operators.get(char, ()):
+                    if data.startswith(literal, pos):
+                        tok_type = op_type
+                        value = literal
+                        end = pos + len(literal)
+                        break
+                else:
+                    self.error(pos)
+
+            tok = new_token()
+            tok.type = tok_type
+            tok.value = value
+            tok.lineno = self.lineno
+            tok.lexpos = self.lexbase + pos
+            pos = end
+            self.lexpos = self.lexbase + end
+            yield tok
+
+        self.lexpos = self.lexbase + pos + 1
+
+
+if __name__ == '__main__':
+    scanner.lex_scanner(FastLexer())
@@ -0,0 +1,108 @@
+import parse
+
+# Hash-consing of pure expressions.
+# Constants, identifiers and operator trees (UniOp, BinOp, ArrayIdx) built through
+# this module are shared: structurally equal expressions are one node, so they can be
+# compared with `is`, and copies of code only cost the expressions that differ.
+# Shared nodes must never be mutated in place; build a new node instead.
+# Assignments and function calls are never shared, only their operands.
+
+# False: every constructor returns a fresh node, as parse's classes do
+enabled = True
+
+# key_of(node) -> shared node, for the program being analyzed
+nodes = {}
+
+
+# Starts the table of a new program
+def clear():
+    nodes.clear()
+
+
+# The shared node equal to a freshly built one
+def intern(node):
+    if not enabled:
+        return node
+    return nodes.setdefault(key_of(node), node)
+
+
+def identifier(name, binding=None):
+    return intern(parse.Identifier(name, binding))
+
+
+def const(value, type):
+    return intern(parse.Const(value, type))
+
+
+def uniop(operand, op, postfix=False):
+    node = parse.UniOp(operand, op)
+    node.postfix = postfix
+    return intern(node)
+
+
+def binop(left, right, op):
+    return intern(parse.BinOp(left, right, op))
+
+
+def array_idx(array, index):
+    return intern(parse.ArrayIdx(array, index))
+
+
+# Shared version of an expression tree. Operands of assignments and calls are
+# replaced in place, since those nodes are never shared
+def share(expr):
+    if not enabled:
+        return expr
+    if isinstance(expr, parse.Identifier):
+        return identifier(expr.name, expr.binding)
+    elif isinstance(expr, parse.Const):
+        return const(expr.value, expr.type)
+    elif isinstance(expr, parse.UniOp):
+        return uniop(share(expr.operand), expr.op, expr.postfix)
+    elif isinstance(expr, parse.BinOp):
+        return binop(share(expr.left), share(expr.right), expr.op)
+    elif isinstance(expr, parse.ArrayIdx):
+        return array_idx(share(expr.array), share(expr.index))
+    elif isinstance(expr, parse.Assign):
+        expr.lvalue = share(expr.lvalue)
+        expr.rvalue = share(expr.rvalue)
+    elif isinstance(expr, parse.FuncCall):
+        expr.args = [share(arg) for arg in expr.args]
+    return expr
+
+
+# Structural equality of two expressions. Shared nodes are equal only if identical
+def same(lhs, rhs):
+    if lhs is rhs:
+        return True
+    if type(lhs) != type(rhs):
+        return False
+    if enabled and nodes.get(key_of(lhs)) is lhs and nodes.get(key_of(rhs)) is rhs:
+        return False
+    if isinstance(lhs, parse.Identifier):
+        return lhs.name == rhs.name and lhs.binding == rhs.binding
+    elif isinstance(lhs, parse.Const):
+        return repr(lhs.value) == repr(rhs.value) and lhs.type is rhs.type
+    elif isinstance(lhs, parse.UniOp):
+        return lhs.op == rhs.op and lhs.postfix == rhs.postfix and same(lhs.operand, rhs.operand)
+    elif isinstance(lhs, parse.BinOp):
+        return lhs.op == rhs.op and same(lhs.left, rhs.left) and same(lhs.right, rhs.right)
+    elif isinstance(lhs, parse.ArrayIdx):
+        return same(lhs.array, rhs.array) and same(lhs.index, rhs.index)
+    return False
+
+
+# Table key a node is shared under. Operands are shared nodes, keyed by id;
+# repr() keeps 0.0 and -0.0, and 1 and 1.0, apart
+def key_of(expr):
+    if isinstance(expr, parse.Identifier):
+        return ("id", expr.name, expr.binding)
+    elif isinstance(expr, parse.Const):
+        return ("const", expr.value.__class__, repr(expr.value), expr.type)
+    elif isinstance(expr, parse.UniOp):
+        return ("uniop", expr.op, expr.postfix, id(expr.operand))
+    elif isinstance(expr, parse.BinOp):
+        return ("binop", expr.op, id(expr.left), id(expr.right))
+    elif isinstance(expr, parse.ArrayIdx):
+        return ("index", id(expr.array), id(expr.index))
+    return None
@@ -1,4 +1,5 @@
 import sys
+import collections.abc
 
 import functools
 import itertools
@@ -7,6 +8,8 @@ import CFG
 import structure
 import stack
 import analysis
+import aot
+import vm
 
 import re
 
@@ -15,7 +18,7 @@ def val_str(value):
     if (value == None):
         return "N/A"
     else:
-        if (isinstance(value, list)):
+        if (isinstance(value, collections.abc.Sequence)):
             ret = False
             for elem in value:
                 if (elem != None):
@@ -29,25 +32,23 @@ def val_str(value):
             return str(value)
 
 
-def history_str(var, idx, history):
+def history_str(var, history):
     if history == []:
         return "{} not yet initialized".format(var)
     else:
-        if (idx == None):
-            return "\n".join([
-                "{} = {} at line {}".format(var, val_str(val), line)
-                for (val, line) in history])
-        else:
-            return "\n".join([
-                "{} = {} at line {}".format(var, val_str(val[idx]), line)
-                for (val, line) in history])
+        return "\n".join([
+            "{} = {} at line {}".format(var, val_str(val), line)
+            for (val, line) in history])
 
 
 class MainContext:
-    def __init__(self, ast):
-        # TODO CFG?
-        self.CFG = CFG.generate_graph(ast)
-        self.CFG_pc = self.CFG[0]
+    def __init__(self, ast, program=None):
+        self.program = program if program is not None else CFG.Program()
+        self.CFG = CFG.generate_graph(ast, self.program)
+        if self.program.engine == "vm" and isinstance(ast, parse.TranslationUnit) and "main" in CFG.function_table.table:
+            self.CFG_pc = vm.Machine("main", self.program)
+        else:
+            self.CFG_pc = CFG.Stepper(self.CFG[0], self.program)
         self.done = 0
 
         self.global_table = analysis.get_symbol_table(ast.decls)
@@ -85,22 +86,26 @@ class MainContext:
         return vtable.get_address(name)
 
     def cmd_next(self, num=1):
-        # TODO Runs #num statements
-        cfg_node = self.CFG_pc.next_line()
-        iter = 1
-
-        while ((cfg_node != None) and (iter < num)):
-            cfg_node = cfg_node.next_line()
-            iter += 1
-
-        if (cfg_node == None):
+        # Runs #num statements
+        if self.CFG_pc.run(num) < num:
             print("End of program")
             self.done = 1
 
-        self.CFG_pc = cfg_node
-
         return
 
+    def cmd_stats(self):
+        program = self.program
+        print("Functions materialized: {} of {}".format(program.functions_materialized, len(self.func_tables.table)))
+        print("CFG nodes removed: {}, edges removed: {}".format(program.nodes_removed, program.edges_removed))
+        print("CFG nodes compiled: {}, tier-ups: {}".format(program.nodes_compiled, len(program.tier_ups)))
+        for kind, line, runs, nodes in program.tier_ups:
+            print("  {} at line {} tiered up after {} entries, {} nodes compiled".format(kind, line, runs, nodes))
+        loops = CFG.loop_entries()
+        if len(loops) > 0:
+            print("Loop entries:")
+        for line, runs in loops:
+            print("  line {}: {}".format(line, runs))
+
     def cmd_print(self, var, idx):
         if (len(self.call_stack.called) == 0):
             vtable = self.cur_func_table.ref_value
@@ -145,21 +150,21 @@ class MainContext:
 
         if vtable.has_value(var):
             if (idx == None):
-                print(history_str(var, idx, vtable.get_history(var)))
+                print(history_str(var, vtable.get_history(var)))
             else:
                 arr = vtable.get_value(var)
                 if ((-len(arr) <= idx) and (idx < len(arr))):
-                    print(history_str(var, idx, vtable.get_history(var)))
+                    print(history_str(var, vtable.get_element_history(var, idx)))
                 else:
                     print("Invisible variable")
             return
         elif self.global_value_table.has_value(var):
             if (idx == None):
-                print(history_str(var, idx, self.global_value_table.get_history(var)))
+                print(history_str(var, self.global_value_table.get_history(var)))
             else:
                 arr = self.global_value_table.get_value(var)
                 if ((-len(arr) <= idx) and (idx < len(arr))):
-                    print(history_str(var, idx, self.global_value_table.get_history(var)))
+                    print(history_str(var, self.global_value_table.get_element_history(var, idx)))
                 else:
                     print("Invisible variable")
             return
@@ -217,12 +222,30 @@ def print_recursive_deref_pointer(ctxt, expr):
 
 
 if __name__ == '__main__':
-    parser = parse.parser
-
-    input_file = open(sys.argv[1])
-    parsed = parser.parse(input_file.read(), tracking=True)
+    # python main.py [--parser=yacc|rd] [--engine=graph|vm] [--run] <file.c>
+    # --run runs the program to its end, translated to Python by aot, without the debugger
+    args = []
+    run = False
+    for arg in sys.argv[1:]:
+        if arg == "--run":
+            run = True
+        elif arg.startswith("--parser="):
+            parse.backend = arg[len("--parser="):]
+        elif arg.startswith("--engine="):
+            CFG.engine = arg[len("--engine="):]
+        else:
+            args.append(arg)
+    if parse.backend not in ["yacc", "rd"]:
+        print("Unknown parser: {}".format(parse.backend))
+        sys.exit(1)
+    if CFG.engine not in ["graph", "vm"]:
+        print("Unknown engine: {}".format(CFG.engine))
+        sys.exit(1)
+    parsed = parse.parse_file(args[0])
     parsed = analysis.desugar_ast(parsed)
-    input_file.close()
+    if run:
+        aot.run_program(parsed, args[0])
+        sys.exit(0)
     ctxt = MainContext(parsed)
 
     ctxt.begin()
@@ -245,6 +268,8 @@ if __name__ == '__main__':
                     print("Incorrect command usage: try 'next[lines]")
             else:
                 print("End of program")
+        elif args[0] == 'stats' and len(args) == 1:
+            ctxt.cmd_stats()
         elif args[0] == 'print' and len(args) == 2:
             if (rule_1.match(args[1])):
                 var = re.findall(r"([A-Za-z_][\w]*$)", args[1])
@@ -4,31 +4,40 @@ import functools
 import parse
 import analysis
 import CFG
+import hashcons
 
 # Evaluate constant expression before running the code
 # i.e. constant folding
+# Operator nodes may be shared (see hashcons), so they are rebuilt instead of mutated
 def const_expr_eval(expr):
     if(isinstance(expr, parse.UniOp)):
-        expr.operand = const_expr_eval(expr.operand)
-        if(isinstance(expr.operand, parse.Const)):
+        operand = const_expr_eval(expr.operand)
+        if(isinstance(operand, parse.Const)):
             # Only + and - can be simplified
             if expr.op == '+':
-                return expr.operand
+                return operand
             elif expr.op == '-':
-                return parse.Const(- expr.operand.value)
+                return hashcons.const(- operand.value, operand.type)
+        if operand is not expr.operand:
+            return hashcons.uniop(operand, expr.op, expr.postfix)
         return expr
     elif(isinstance(expr, parse.BinOp)):
-        expr.left = const_expr_eval(expr.left)
-        expr.right = const_expr_eval(expr.right)
-        if(isinstance(expr.left, parse.Const) and isinstance(expr.right, parse.Const)):
-            return parse.Const(CFG.binop(expr.op, expr.left.value, expr.right.value))
+        left = const_expr_eval(expr.left)
+        right = const_expr_eval(expr.right)
+        if(isinstance(left, parse.Const) and isinstance(right, parse.Const)):
+            value = CFG.binop(expr.op, left.value, right.value)
+            return hashcons.const(value, parse.Int() if type(value) == int else parse.Float())
+        if left is not expr.left or right is not expr.right:
+            return hashcons.binop(left, right, expr.op)
         return expr
     elif(isinstance(expr, parse.Assign)):
         expr.lvalue = const_expr_eval(expr.lvalue)
         expr.rvalue = const_expr_eval(expr.rvalue)
         return expr
     elif(isinstance(expr, parse.ArrayIdx)): # L-value is not const
-        expr.index = const_expr_eval(expr.index)
+        index = const_expr_eval(expr.index)
+        if index is not expr.index:
+            return hashcons.array_idx(expr.array, index)
         return expr
     elif(isinstance(expr, parse.FuncCall)):
         expr.args = map(const_expr_eval, expr.args)
@@ -51,7 +60,7 @@ def used_in_l_value(expr):
     if isinstance(expr, parse.UniOp): # Always '*'
         return used_in_l_value(expr.operand)
     elif isinstance(expr, parse.ArrayIdx):
-        return used_in_l_value(expr.array) + used_in_expr(expr.index)
+        return used_in_l_value(expr.array) | used_in_expr(expr.index)
     elif isinstance(expr, parse.Identifier):
         return set() # Identifier is not used
 
@@ -61,14 +70,14 @@ def used_in_expr(expr):
         # left side of ++, -- is used in value
         return used_in_expr(expr.operand)
     elif(isinstance(expr, parse.BinOp)):
-        return used_in_expr(expr.left) + used_in_expr(expr.right)
+        return used_in_expr(expr.left) | used_in_expr(expr.right)
     elif(isinstance(expr, parse.Assign)):
         if expr.op == '=':
-            return used_in_l_value(expr.lvalue) + used_in_expr(expr.rvalue)
+            return used_in_l_value(expr.lvalue) | used_in_expr(expr.rvalue)
         else: # left side of +=, -= is used in value
-            return used_in_expr(expr.lvalue) + used_in_expr(expr.rvalue)
+            return used_in_expr(expr.lvalue) | used_in_expr(expr.rvalue)
     elif(isinstance(expr, parse.ArrayIdx)):
-        return used_in_expr(expr.array) + used_in_expr(expr.index)
+        return used_in_expr(expr.array) | used_in_expr(expr.index)
     elif(isinstance(expr, parse.FuncCall)):
         return set(itertools.chain(*map(used_in_expr, expr.args)))
     elif(isinstance(expr, parse.Identifier)):
@@ -93,11 +102,11 @@ def result_of_expr(expr):
             return result_in_l_value(expr.operand)
         return result_of_expr(expr.operand)
     elif(isinstance(expr, parse.BinOp)):
-        return result_of_expr(expr.left) + result_of_expr(expr.right)
+        return result_of_expr(expr.left) | result_of_expr(expr.right)
     elif(isinstance(expr, parse.Assign)):
-        return result_in_l_value(expr.lvalue) + result_of_expr(expr.rvalue)
+        return result_in_l_value(expr.lvalue) | result_of_expr(expr.rvalue)
     elif(isinstance(expr, parse.ArrayIdx)):
-        return result_of_expr(expr.array) + result_of_expr(expr.index)
+        return result_of_expr(expr.array) | result_of_expr(expr.index)
     elif(isinstance(expr, parse.FuncCall)):
         return set(itertools.chain(*map(result_of_expr, expr.args)))
     elif(isinstance(expr, parse.Identifier)):
@@ -106,17 +115,16 @@ def result_of_expr(expr):
         return set()
 
 # Substitute ident with to_sub
+# Operator trees are rebuilt through hashcons, so the parts that do not use ident stay shared
 def substitute_expr(expr, ident, to_sub):
     if(isinstance(expr, parse.UniOp)):
-        res = parse.UniOp(substitute_expr(expr.operand, ident, to_sub), expr.op)
-        res.postfix = expr.postfix
-        return res
+        return hashcons.uniop(substitute_expr(expr.operand, ident, to_sub), expr.op, expr.postfix)
     elif(isinstance(expr, parse.BinOp)):
-        return parse.BinOp(substitute_expr(expr.left, ident, to_sub), substitute_expr(expr.right, ident, to_sub), expr.op)
+        return hashcons.binop(substitute_expr(expr.left, ident, to_sub), substitute_expr(expr.right, ident, to_sub), expr.op)
     elif(isinstance(expr, parse.Assign)):
         return parse.Assign(substitute_expr(expr.lvalue, ident, to_sub), substitute_expr(expr.rvalue, ident, to_sub), expr.op)
     elif(isinstance(expr, parse.ArrayIdx)):
-        return parse.ArrayIdx(substitute_expr(expr.array, ident, to_sub), substitute_expr(expr.index, ident, to_sub))
+        return hashcons.array_idx(substitute_expr(expr.array, ident, to_sub), substitute_expr(expr.index, ident, to_sub))
     elif(isinstance(expr, parse.FuncCall)): # TODO Consider Fn_Call_Stmt
         return list(itertools.chain(*map(functools.partial(substitute_expr, ident=ident, to_sub=to_sub), expr.args)))
     elif(isinstance(expr, parse.Identifier)):
@@ -127,10 +135,13 @@ def substitute_expr(expr, ident, to_sub):
     elif(isinstance(expr, parse.Const)):
         return expr
 
+# Substituted copy of the statement
 def substitute_stmt(stmt, ident, to_sub):
     if(isinstance(stmt, parse.Statement)):
-        stmt.content = substitute_expr(stmt.content, ident, to_sub)
-        return stmt
+        res = parse.Statement(substitute_expr(stmt.content, ident, to_sub))
+        res.returning = stmt.returning
+        res.set_line(stmt.line_num)
+        return res
     elif(isinstance(stmt, parse.EachDecl)):
         if stmt.value != None:
             stmt.value = substitute_expr(stmt.value, ident, to_sub)
@@ -175,7 +186,7 @@ def unroll_loop(stmt):
                 return stmt
             if not isinstance(desc.until.right.type, parse.Int):
                 return stmt
-            if desc.until.left.name != iterator:
+            if not hashcons.same(desc.until.left, desc.init.lvalue):
                 return stmt
             compare = desc.until.op
             final = desc.until.right.value
@@ -187,7 +198,7 @@ def unroll_loop(stmt):
                 return stmt
             if not isinstance(desc.iter.operand, parse.Identifier):
                 return stmt
-            if desc.iter.operand.name != iterator:
+            if not hashcons.same(desc.iter.operand, desc.init.lvalue):
                 return stmt
             operator = desc.iter.op
 
@@ -218,15 +229,16 @@ def unroll_loop(stmt):
                 iter_op = '-='
 
             trailing = (final - initial) % UNIT_ITER
-            new_cond = parse.BinOp(parse.Identifier(iterator), parse.Const(final - trailing, parse.Int()), until_op)
-            new_iter = parse.Assign(parse.Identifier(iterator), parse.Const(UNIT_ITER, parse.Int()), iter_op)
+            new_cond = hashcons.binop(hashcons.identifier(iterator), hashcons.const(final - trailing, parse.Int()), until_op)
+            new_iter = parse.Assign(hashcons.identifier(iterator), hashcons.const(UNIT_ITER, parse.Int()), iter_op)
             new_desc = parse.ForDesc(desc.init, new_cond, new_iter)
             new_body = []
             for j in range(UNIT_ITER):
-                on_ite = parse.BinOp(parse.Identifier(iterator), parse.Const(j, parse.Int())) # i + j
-                new_body_j = map(functools.partial(substitute_stmt, ident=iterator, to_sub = on_ite), body)
-                new_body = new_body + list(new_body_j)
-            return parse.Iteration(new_desc, new_body)
+                on_ite = hashcons.binop(hashcons.identifier(iterator), hashcons.const(j, parse.Int()), '+') # i + j
+                new_body.extend(map(functools.partial(substitute_stmt, ident=iterator, to_sub = on_ite), body))
+            res = parse.Iteration(new_desc, parse.Body(new_body))
+            res.set_line(stmt.line_num)
+            return res
 
     return stmt
 
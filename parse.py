@@ -1,6 +1,8 @@
 import ply.lex as lex
 import ply.yacc as yacc
 import scanner
+import source
+import tablecache
 import sys
 
 tokens = scanner.tokens
@@ -10,7 +12,9 @@ precedence = (
 )
 
 # Register to subs to update
+# AST nodes declare __slots__, so they carry no per-instance __dict__
 class Lined:
+    __slots__ = ()
     # Sets line, and returns the last line
     def set_line(self, line):
         self.line_num = line
@@ -18,6 +22,7 @@ class Lined:
 
 # Translation Unit, holds global declarations or function declarations
 class TranslationUnit:
+    __slots__ = ("decls",)
     def __init__(self, decls):
         self.decls = decls
     def __str__(self):
@@ -35,7 +40,8 @@ def p_top_level_list_01(t):
     t[0] = [ t[1] ]
 def p_top_level_list_02(t):
     '''top_level_list : top_level_list top_level_declaration'''
-    t[0] = t[1] + [ t[2] ]
+    t[1].append(t[2])
+    t[0] = t[1]
 
 def p_external_declaration(t):
     '''top_level_declaration : function_definition
@@ -55,6 +61,7 @@ def desugar_declarator(base_type, ator):
 
 # Need to look into declarator for * and []
 class FunctionDefn(Lined):
+    __slots__ = ("r_type", "declarator", "body", "line_num")
     def __init__(self, r_type, declarator, body):
         self.r_type = r_type
         self.declarator = declarator
@@ -65,6 +72,7 @@ class FunctionDefn(Lined):
         return "{}> [ret: {}, decl: {} >> \n{}]".format(self.line_num, self.r_type, self.declarator, self.body)
 
 class EachDecl(Lined):
+    __slots__ = ("type", "name", "value", "line_num")
     def __init__(self, type, name, line):
         self.type = type
         self.name = name
@@ -93,15 +101,18 @@ class EachDecl(Lined):
 
 # Need to look into declarator for * and []
 class Declaration(Lined):
+    __slots__ = ("base_type", "decl_assigns", "is_const", "line_num", "scope")
     def __init__(self, base_type, decl_assigns):
         self.base_type = base_type
         self.decl_assigns = decl_assigns
         self.is_const = False
+        self.scope = None # Function whose frame it allocates in, from analysis.resolve_names
     def desugar(self):
         return [EachDecl.From(self.line_num, self.base_type, da) for da in self.decl_assigns]
     def __str__(self):
         return "{}> [base: {}, declare: [{}], const: {}]".format(self.line_num, self.base_type, ",".join(map(str, self.decl_assigns)), self.is_const)
 class Assigned():
+    __slots__ = ("decl_in", "value")
     def __init__(self, declarator, value):
         self.decl_in = declarator
         self.value = value
@@ -135,49 +146,69 @@ def p_decl_assign_list_01(t):
     t[0] = [ t[1] ]
 def p_decl_assign_list_02(t):
     '''declarator_assign_list : declarator_assign_list COMMA declarator_assign'''
-    t[0] = t[1] + [ t[3] ]
+    t[1].append(t[3])
+    t[0] = t[1]
 
 
-class Float():
-    def __init__(self):
-        self.type = "float"
-    def __str__(self):
-        return "float"
-class Int():
-    def __init__(self):
-        self.type = "int"
+# Base types have no state, so Int(), Float() and Void() each return one shared object
+class BaseType():
+    __slots__ = ()
+    def __new__(cls):
+        shared = cls.__dict__.get("shared")
+        if shared is None:
+            shared = super().__new__(cls)
+            cls.shared = shared
+        return shared
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        return self
+    def __reduce__(self):
+        return (type(self), ())
     def __str__(self):
-        return "int"
-class Void():
-    def __init__(self):
-        self.type = "void"
-    def __str__(self):
-        return "void"
-
+        return self.type
+class Float(BaseType):
+    __slots__ = ()
+    type = "float"
+class Int(BaseType):
+    __slots__ = ()
+    type = "int"
+class Void(BaseType):
+    __slots__ = ()
+    type = "void"
+
+# Names are interned, so equal names share one string
 class Identifier():
-    def __init__(self, name):
-        self.name = name
+    __slots__ = ("name", "binding")
+    def __init__(self, name, binding=None):
+        self.name = sys.intern(name)
+        self.binding = binding # (scope, slot, type) from analysis.resolve_names
     def __str__(self):
         return str(self.name)
 # Temporary Identifier
 class Temp_Ident():
+    __slots__ = ("name", "slot")
     def __init__(self, name):
         self.name = name
+        self.slot = None # Temporary slot of its activation, from analysis.allocate_temps
     def __str__(self):
         return "[|{}|]".format(self.name)
 
 class Asterisked():
+    __slots__ = ("base",)
     def __init__(self, base):
         self.base = base
     def __str__(self):
         return "<ptr>{}".format(self.base)
 class Arrayed():
+    __slots__ = ("base", "len")
     def __init__(self, base, len):
         self.base = base
         self.len = len
     def __str__(self):
         return "{}[{}]".format(self.base, self.len)
 class Fn_Declarator():
+    __slots__ = ("base", "params")
     def __init__(self, base, params):
         self.base = base
         self.params = params
@@ -217,7 +248,8 @@ def p_parameter_list_01(t):
     t[0] = [ t[1] ]
 def p_parameter_list_02(t):
     '''parameter_list : parameter_list COMMA parameter_declaration'''
-    t[0] = t[1] + [ t[3] ]
+    t[1].append(t[3])
+    t[0] = t[1]
 def p_parameter_list_03(t):
     '''parameter_list : '''
     t[0] = []
@@ -232,6 +264,7 @@ def p_parameter_declaration(t):
 
 
 class Body(Lined):
+    __slots__ = ("stmts", "line_num")
     def __init__(self, stmts):
         self.stmts = stmts
     def __str__(self):
@@ -246,13 +279,15 @@ def p_decl_stmt_list_01(t):
     t[0] = []
 def p_decl_stmt_list_02(t):
     '''decl_stmt_list : decl_stmt_list decl_stmt'''
-    t[0] = t[1] + [ t[2] ]
+    t[1].append(t[2])
+    t[0] = t[1]
 
 def p_body(t):
     '''body : LEFT_BRACE decl_stmt_list RIGHT_BRACE'''
     t[0] = Body(t[2])
 
 class Const:
+    __slots__ = ("value", "type")
     def __init__(self, value, type):
         self.value = value
         self.type = type # Int or Float
@@ -260,10 +295,12 @@ class Const:
         return "{}{}".format(self.value, self.type)
 # ++, --, &, *, +, -
 class UniOp:
+    __slots__ = ("op", "operand", "postfix", "static_type")
     def __init__(self, operand, op):
         self.op = op
         self.operand = operand
         self.postfix = False
+        self.static_type = None # From analysis.infer_types
     def __str__(self):
         if(self.postfix):
             return "({}{})".format(self.operand, self.op)
@@ -272,29 +309,35 @@ class UniOp:
 # +, -, *, /, %
 # >, >=, <, <=, ==, !=
 class BinOp:
+    __slots__ = ("op", "left", "right", "static_type")
     def __init__(self, left, right, op):
         self.op = op
         self.left = left
         self.right = right
+        self.static_type = None # From analysis.infer_types
     def __str__(self):
         return "( {} {} {} )".format(self.left, self.op, self.right)
 
 # =, +=, -=
 class Assign:
+    __slots__ = ("op", "lvalue", "rvalue", "line_num", "convert")
     def __init__(self, lvalue, rvalue, op):
         self.op = op
         self.lvalue = lvalue
         self.rvalue = rvalue
+        self.convert = None # int or float, if the value needs converting, from analysis.infer_types
     def __str__(self):
         return "( {} {} {} )".format(self.lvalue, self.op, self.rvalue)
 
 class FuncCall:
+    __slots__ = ("fn_name", "args")
     def __init__(self, fn_name, args):
         self.fn_name = fn_name
         self.args = args
     def __str__(self):
         return "{}({})".format(self.fn_name, ",".join(map(str, self.args)))
 class ArrayIdx:
+    __slots__ = ("array", "index")
     def __init__(self, array, index):
         self.array = array
         self.index = index
@@ -356,7 +399,8 @@ def p_arg_expr_list_01(t):
     t[0] = [ t[1] ]
 def p_arg_expr_list_02(t):
     '''arg_expr_list : arg_expr_list COMMA expr'''
-    t[0] = t[1] + [ t[3] ]
+    t[1].append(t[3])
+    t[0] = t[1]
 def p_arg_expr_list_03(t):
     '''arg_expr_list : '''
     t[0] = []
@@ -416,6 +460,7 @@ def p_prim_expr_04(t):
 
 
 class Statement(Lined):
+    __slots__ = ("content", "returning", "line_num")
     def __init__(self, content):
         self.content = content
         self.returning = False
@@ -424,6 +469,7 @@ class Statement(Lined):
 
 # While or For loop. Its body is Body
 class Iteration(Lined):
+    __slots__ = ("loopDesc", "body", "line_num")
     # loopDesc: condition expression for while loop, ForDesc for for loop
     def __init__(self, loopDesc, body):
         if not isinstance(body, Body):
@@ -433,6 +479,7 @@ class Iteration(Lined):
     def __str__(self):
         return "{}> ite[{}] [\n{}\n]".format(self.line_num, self.loopDesc, self.body)
 class ForDesc:
+    __slots__ = ("init", "until", "iter")
     def __init__(self, init, until, iter):
         self.init = init
         self.until = until
@@ -442,6 +489,7 @@ class ForDesc:
 
 # If Statement. Its body is Body
 class Selection(Lined):
+    __slots__ = ("cond", "thenB", "elseB", "hasElse", "line_num")
     def __init__(self, cond, thenB, elseB):
         if not isinstance(thenB, Body):
             thenB = Body([ thenB ]) # Single-lined body
@@ -455,6 +503,7 @@ class Selection(Lined):
         return "{}> cond[{}] [\n{}\n] [{}]".format(self.line_num, self.cond, self.thenB, self.elseB)
 
 class PrintStmt(Lined):
+    __slots__ = ("format", "value", "line_num")
     def __init__(self, format, value):
         self.format = format
         self.value = value # Value to print
@@ -516,11 +565,33 @@ def p_error(t):
         print ("Syntx Error, content: {}".format(t)) # Not able to perform..
     raise ParseError()
 
-parser = yacc.yacc(debug=1)
-
-def test_parse():
-    input_file = open(sys.argv[1])
-    result = parser.parse(input_file.read(), tracking=True)
+# The PLY parser, built on first use
+parser = None
+
+# Builds the lexer too, as parse() without lexer= uses the last one PLY built
+def get_parser():
+    global parser
+    if parser is None:
+        scanner.get_lexer()
+        parser = tablecache.build_parser(globals(), lambda **options: yacc.yacc(**options))
+    return parser
+
+# Parser used by parse_file: "yacc" for the PLY tables above,
+# "rd" for the recursive-descent parser in rdparse, which builds the same AST
+backend = "yacc"
+
+# Parses a source file, fed to the lexer through the shared input layer
+def parse_file(path, lexer=None):
+    if lexer is None:
+        lexer = scanner.get_lexer()
+    source.feed(lexer, path)
+    if backend == "rd":
+        import rdparse
+        return rdparse.parse_tokens(lexer)
+    return get_parser().parse(lexer=lexer, tracking=True)
+
+def test_parse(lexer=None):
+    result = parse_file(sys.argv[1], lexer)
     print('Done')
     print('')
     print(result)
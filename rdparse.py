@@ -0,0 +1,354 @@
+import contextlib
+import io
+import re
+import sys
+
+import fastlex
+import parse
+import scanner
+
+# Recursive-descent parser for the grammar of parse.py, selected with parse.backend = "rd".
+# Binary operators are parsed by precedence climbing, so chain rules such as
+# compare_expr : add_expr cost nothing. Builds the same AST as the yacc parser, with
+# the same line numbers (yacc tracking: a rule's line is the line of its first token),
+# and reports syntax errors at the same token through parse.p_error.
+# Usage: python rdparse.py [--diff] <file.c>...
+
+# Binary operator token -> precedence, all left associative
+binary_precedence = {
+    "EQUAL": 1, "NOT_EQUAL": 1,
+    "LESS": 2, "GREATER": 2, "LESS_EQUAL": 2, "GREATER_EQUAL": 2,
+    "PLUS": 3, "MINUS": 3,
+    "MUL": 4, "DIV": 4, "MOD": 4,
+}
+assign_ops = {"ASSIGN", "ASSIGN_PLUS", "ASSIGN_MINUS"}
+prefix_ops = {"MINUS": "-", "MUL": "*", "AMPERSAND": "&", "PLUS_PLUS": "++", "MINUS_MINUS": "--"}
+postfix_ops = {"PLUS_PLUS": "++", "MINUS_MINUS": "--"}
+type_specifiers = {"INT": parse.Int, "FLOAT": parse.Float, "VOID": parse.Void}
+declaration_starts = {"CONST", "INT", "FLOAT", "VOID"}
+
+
+class Parser:
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.tok = None
+        self.type = None # Type of the lookahead token, None at the end of input
+        self.advance()
+
+    def advance(self):
+        tok = self.tok
+        self.tok = self.lexer.token()
+        self.type = self.tok.type if self.tok is not None else None
+        return tok
+
+    def error(self):
+        parse.p_error(self.tok)
+
+    def expect(self, tok_type):
+        if self.type != tok_type:
+            self.error()
+        return self.advance()
+
+    def line(self):
+        if self.tok is None:
+            self.error()
+        return self.tok.lineno
+
+    def translation_unit(self):
+        decls = [self.top_level_declaration()]
+        while self.tok is not None:
+            decls.append(self.top_level_declaration())
+        return parse.TranslationUnit(decls)
+
+    def top_level_declaration(self):
+        if self.type == "CONST":
+            return self.declaration()
+        line = self.line()
+        base_type = self.type_specifier()
+        declarator = self.declarator()
+        if self.type == "LEFT_BRACE":
+            fn = parse.FunctionDefn(base_type, declarator, self.body())
+            fn.set_line(line)
+            return fn
+        return self.declaration_rest(line, base_type, declarator)
+
+    def declaration(self):
+        if self.type == "CONST":
+            self.advance()
+            decl = self.declaration()
+            decl.is_const = True
+            return decl
+        line = self.line()
+        base_type = self.type_specifier()
+        return self.declaration_rest(line, base_type, self.declarator())
+
+    # Rest of a declaration, after its first declarator
+    def declaration_rest(self, line, base_type, declarator):
+        decl_assigns = [self.declarator_assign(declarator)]
+        while self.type == "COMMA":
+            self.advance()
+            decl_assigns.append(self.declarator_assign(self.declarator()))
+        self.expect("SEMICOLON")
+        decl = parse.Declaration(base_type, decl_assigns)
+        decl.set_line(line)
+        return decl
+
+    def declarator_assign(self, declarator):
+        if self.type == "ASSIGN":
+            self.advance()
+            return parse.Assigned(declarator, self.expr())
+        return declarator
+
+    def type_specifier(self):
+        base_type = type_specifiers.get(self.type)
+        if base_type is None:
+            self.error()
+        self.advance()
+        return base_type()
+
+    def declarator(self):
+        if self.type == "MUL":
+            self.advance()
+            return parse.Asterisked(self.declarator())
+        declarator = parse.Identifier(self.expect("ID").value)
+        while True:
+            if self.type == "LEFT_PARENTHESIS":
+                self.advance()
+                params = self.parameter_list()
+                self.expect("RIGHT_PARENTHESIS")
+                declarator = parse.Fn_Declarator(declarator, params)
+            elif self.type == "LEFT_BRACKET":
+                self.advance()
+                length = self.expect("INT_NUM").value
+                self.expect("RIGHT_BRACKET")
+                declarator = parse.Arrayed(declarator, length)
+            else:
+                return declarator
+
+    # parameter_list may be empty or VOID, and either can be followed by ", parameter"
+    def parameter_list(self):
+        if self.type == "RIGHT_PARENTHESIS":
+            return []
+        if self.type == "COMMA":
+            params = []
+        elif self.type == "VOID":
+            line = self.line()
+            self.advance()
+            if self.type in ("RIGHT_PARENTHESIS", "COMMA"):
+                params = []
+            else:
+                params = [self.parameter_declaration_rest(line, parse.Void())]
+        else:
+            params = [self.parameter_declaration()]
+        while self.type == "COMMA":
+            self.advance()
+            params.append(self.parameter_declaration())
+        return params
+
+    def parameter_declaration(self):
+        line = self.line()
+        return self.parameter_declaration_rest(line, self.type_specifier())
+
+    def parameter_declaration_rest(self, line, base_type):
+        decl = parse.Declaration(base_type, [ self.declarator() ])
+        decl.set_line(line)
+        return decl
+
+    def body(self):
+        self.expect("LEFT_BRACE")
+        stmts = []
+        while self.type != "RIGHT_BRACE":
+            if self.type in declaration_starts:
+                stmts.append(self.declaration())
+            else:
+                stmts.append(self.statement())
+        self.advance()
+        return parse.Body(stmts)
+
+    def statement(self):
+        line = self.line()
+        tok_type = self.type
+        if tok_type == "LEFT_BRACE":
+            stmt = self.body()
+        elif tok_type == "PRINTF":
+            stmt = self.print_statement()
+        elif tok_type == "RETURN":
+            self.advance()
+            stmt = parse.Statement(self.expr())
+            self.expect("SEMICOLON")
+            stmt.returning = True
+        elif tok_type == "IF":
+            self.advance()
+            self.expect("LEFT_PARENTHESIS")
+            cond = self.expr()
+            self.expect("RIGHT_PARENTHESIS")
+            then_stmt = self.statement()
+            else_stmt = []
+            if self.type == "ELSE": # Dangling else binds to the nearest if, as yacc shifts
+                self.advance()
+                else_stmt = self.statement()
+            stmt = parse.Selection(cond, then_stmt, else_stmt)
+        elif tok_type == "WHILE":
+            self.advance()
+            self.expect("LEFT_PARENTHESIS")
+            cond = self.expr()
+            self.expect("RIGHT_PARENTHESIS")
+            stmt = parse.Iteration(cond, self.statement())
+        elif tok_type == "FOR":
+            self.advance()
+            self.expect("LEFT_PARENTHESIS")
+            init = self.expr()
+            self.expect("SEMICOLON")
+            until = self.expr()
+            self.expect("SEMICOLON")
+            step = self.expr()
+            self.expect("RIGHT_PARENTHESIS")
+            stmt = parse.Iteration(parse.ForDesc(init, until, step), self.statement())
+        else:
+            stmt = parse.Statement(self.expr())
+            self.expect("SEMICOLON")
+        stmt.set_line(line)
+        return stmt
+
+    def print_statement(self):
+        self.advance()
+        self.expect("LEFT_PARENTHESIS")
+        format = self.expect("STRING").value
+        value = None
+        if self.type == "COMMA":
+            self.advance()
+            value = self.expr()
+        self.expect("RIGHT_PARENTHESIS")
+        self.expect("SEMICOLON")
+        return parse.PrintStmt(format, value)
+
+    # expr : equal_expr | equal_expr ASSIGN expr, right associative
+    def expr(self):
+        line = self.line()
+        left = self.binary(1)
+        if self.type in assign_ops:
+            op = self.advance().value
+            assign = parse.Assign(left, self.expr(), op)
+            assign.line_num = line
+            return assign
+        return left
+
+    # Precedence climbing over equal_expr, compare_expr, add_expr and mult_expr
+    def binary(self, min_precedence):
+        left = self.unary()
+        precedence = binary_precedence.get(self.type)
+        while precedence is not None and precedence >= min_precedence:
+            op = self.advance().value
+            left = parse.BinOp(left, self.binary(precedence + 1), op)
+            precedence = binary_precedence.get(self.type)
+        return left
+
+    def unary(self):
+        if self.type == "PLUS":
+            self.advance()
+            return self.unary()
+        op = prefix_ops.get(self.type)
+        if op is not None:
+            self.advance()
+            return parse.UniOp(self.unary(), op)
+        return self.postfix()
+
+    def postfix(self):
+        expr = self.primary()
+        while True:
+            if self.type == "LEFT_PARENTHESIS":
+                self.advance()
+                args = self.arg_expr_list()
+                self.expect("RIGHT_PARENTHESIS")
+                expr = parse.FuncCall(expr, args)
+            elif self.type == "LEFT_BRACKET":
+                self.advance()
+                index = self.expr()
+                self.expect("RIGHT_BRACKET")
+                expr = parse.ArrayIdx(expr, index)
+            elif self.type in postfix_ops:
+                expr = parse.UniOp(expr, postfix_ops[self.advance().type])
+                expr.postfix = True
+            else:
+                return expr
+
+    # arg_expr_list may be empty, and can start with ", expr"
+    def arg_expr_list(self):
+        if self.type == "RIGHT_PARENTHESIS":
+            return []
+        args = [] if self.type == "COMMA" else [self.expr()]
+        while self.type == "COMMA":
+            self.advance()
+            args.append(self.expr())
+        return args
+
+    def primary(self):
+        tok_type = self.type
+        if tok_type == "ID":
+            return parse.Identifier(self.advance().value)
+        elif tok_type == "INT_NUM":
+            return parse.Const(int(self.advance().value), parse.Int())
+        elif tok_type == "FLOAT_NUM":
+            return parse.Const(float(self.advance().value), parse.Float())
+        elif tok_type == "LEFT_PARENTHESIS":
+            self.advance()
+            expr = self.expr()
+            self.expect("RIGHT_PARENTHESIS")
+            return expr
+        self.error()
+
+
+# Parses the tokens of a lexer that was given its input
+def parse_tokens(lexer):
+    return Parser(lexer).translation_unit()
+
+
+# Every field of a tree, including the ones __str__ leaves out such as line numbers
+def dump(node):
+    if isinstance(node, list):
+        return "[{}]".format(", ".join(map(dump, node)))
+    if type(node).__module__ != parse.__name__:
+        return repr(node)
+    fields = []
+    for cls in reversed(type(node).__mro__):
+        for name in cls.__dict__.get("__slots__", ()):
+            fields.append("{}={}".format(name, dump(getattr(node, name, None))))
+    return "{}({})".format(type(node).__name__, ", ".join(fields))
+
+
+# What parsing a file with a backend gives: the tree's text and fields, or the error printed
+def parse_output(backend, path):
+    saved = parse.backend
+    parse.backend = backend
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            try:
+                tree = parse.parse_file(path, fastlex.FastLexer())
+                print(tree)
+                print(dump(tree))
+            except (parse.ParseError, scanner.Scanner_Error) as error:
+                print(type(error).__name__)
+    finally:
+        parse.backend = saved
+    return re.sub(r" at 0x[0-9a-f]+", "", out.getvalue()) # Default reprs of parameter lists
+
+
+# Compares the backends on each file, returning the files they differ on
+def diff_files(paths):
+    differ = []
+    for path in paths:
+        if parse_output("yacc", path) != parse_output("rd", path):
+            differ.append(path)
+    return differ
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--diff"]:
+        differ = diff_files(sys.argv[2:])
+        for path in differ:
+            print("differs:", path)
+        print("{} of {} files parse the same".format(len(sys.argv[2:]) - len(differ), len(sys.argv[2:])))
+        sys.exit(1 if differ else 0)
+    parse.backend = "rd"
+    parse.test_parse()
@@ -1,7 +1,12 @@
 import ply.lex as lex
+import contextlib
 import re
 import sys
 
+import source
+import tablecache
+import tokstream
+
 
 class Scanner_Error(Exception):
     pass
@@ -277,7 +282,7 @@ def t_SPACE(token):
 
 
 def t_COMMENT(token):
-    r"((/\*([\w\W]*)?\*/)|(//.*))"
+    r"((/\*([\w\W]*?)\*/)|(//.*))"
     token.lexer.lineno += token.value.count("\n")
 
 
@@ -286,26 +291,28 @@ def t_error(token):
     raise Scanner_Error()
 
 
-def lex_scanner():
-    input_file = open(sys.argv[1])
-    lines = input_file.readlines()
-    input_file.close()
+def lex_scanner(scan_lexer=None):
+    if scan_lexer is None:
+        scan_lexer = get_lexer()
 
-    strings = ""
-    for line in lines:
-        strings += line
+    source.feed(scan_lexer, sys.argv[1])
 
-    lexer.input(strings)
+    stream = tokstream.TokenStream(tokens)
+    # Scanner errors are printed through the same buffer, after the tokens before them
+    with tokstream.DumpWriter(sys.stdout) as dump, contextlib.redirect_stdout(dump):
+        for token in iter(scan_lexer.token, None):
+            dump.write_token(stream, stream.append(token.type, token.value, token.lineno))
+    return stream
 
-    while True:
-        token = lexer.token()
-        if token is None:
-            break
-        else:
-            print("Line %d: (%s, '%s')" % (token.lineno, token.type, token.value))
 
+# The PLY lexer, built on first use
+lexer = None
 
-lexer = lex.lex()
+def get_lexer():
+    global lexer
+    if lexer is None:
+        lexer = tablecache.build_lexer(globals(), lambda **options: lex.lex(**options))
+    return lexer
 
 if __name__ == '__main__':
     lex_scanner()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import codecs
+import contextlib
+import io
+import locale
+import mmap
+
+# Input layer shared by the scanner, parser and interpreter entry points.
+# Sources are memory-mapped and decoded the same way open() does in text mode
+# (locale encoding, universal newlines), either at once or in chunks.
+
+CHUNK_SIZE = 1 << 20
+
+
+def new_decoder(encoding=None):
+    decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))()
+    return io.IncrementalNewlineDecoder(decoder, translate=True)
+
+
+# Read-only view of the whole file, without copying it into memory
+@contextlib.contextmanager
+def mapped_view(path):
+    with open(path, "rb") as source_file:
+        try:
+            mapped = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty files cannot be mapped
+            yield memoryview(b"")
+            return
+        with mapped:
+            with memoryview(mapped) as view:
+                yield view
+
+
+# Yields the decoded text of the file in chunks
+def iter_source(path, chunk_size=CHUNK_SIZE, encoding=None):
+    decoder = new_decoder(encoding)
+    with mapped_view(path) as view:
+        for begin in range(0, len(view), chunk_size):
+            text = decoder.decode(view[begin:begin + chunk_size])
+            if text:
+                yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+# Whole decoded text of the file
+def read_source(path, encoding=None):
+    with mapped_view(path) as view:
+        return new_decoder(encoding).decode(view, final=True)
+
+
+# Gives the file to the lexer, in chunks when the lexer can scan them
+def feed(lexer, path, chunk_size=CHUNK_SIZE):
+    if hasattr(lexer, "input_chunks"):
+        lexer.input_chunks(iter_source(path, chunk_size))
+    else:
+        lexer.input(read_source(path))
+    return lexer
@@ -1,3 +1,7 @@
+import array
+import collections.abc
+import copy
+
 # Calls from the caller
 # def function_call(caller_name, caller_line):
 #     call_stack.link(CallContext(caller_name, caller_line))
@@ -7,16 +11,130 @@
 #    callee_val_table.free_local()
 #    return call_stack.ret()
 
+# Scope of a variable bound to the global frame
+GLOBAL = None
+
+# False: declared arrays are always lists of their elements
+typed_arrays = True
+# Elements from which a declared int or float array is a TypedArray instead of a list
+typed_array_length = 1024
+# Typecodes of the buffers of typed arrays, per element type
+typecodes = {'int': 'q', 'float': 'd'}
+# Range of the elements of an int buffer, and of the ints a float buffer holds exactly
+int_min, int_max = -2 ** 63, 2 ** 63 - 1
+exact_float_int = 2 ** 53
+# What each element of a typed array is: not set, the buffer's value, or an int kept
+# in a float buffer
+UNSET, NATIVE, INT = 0, 1, 2
+
+# Declared int or float array: a buffer of 8-byte elements and a byte per element for
+# its kind. Reads like the list of its elements, and only holds values it gives back as is
+class TypedArray(collections.abc.Sequence):
+    __slots__ = ("items", "kinds")
+
+    def __init__(self, typecode, length):
+        self.items = array.array(typecode, bytes(8 * length))
+        self.kinds = bytearray(length)
+
+    def __len__(self):
+        return len(self.items)
+
+    # Index of an element, from an index into a list of the elements
+    def position(self, index, error):
+        if not isinstance(index, int):
+            raise TypeError("list indices must be integers or slices, not {}".format(type(index).__name__))
+        length = len(self.items)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError(error)
+        return index
+
+    def __getitem__(self, index):
+        index = self.position(index, "list index out of range")
+        kind = self.kinds[index]
+        if kind == NATIVE:
+            return self.items[index]
+        elif kind == INT:
+            return int(self.items[index])
+        return None
+
+    # Kind of the element a value is stored as, None if the buffer cannot hold it as is
+    def kind_of(self, value):
+        if value is None:
+            return UNSET
+        elif self.items.typecode == 'q':
+            if type(value) is int and int_min <= value <= int_max:
+                return NATIVE
+        elif type(value) is float:
+            return NATIVE
+        elif type(value) is int and -exact_float_int <= value <= exact_float_int:
+            return INT
+        return None
+
+    def holds(self, value):
+        return self.kind_of(value) is not None
+
+    def __setitem__(self, index, value):
+        index = self.position(index, "list assignment index out of range")
+        kind = self.kind_of(value)
+        if kind is None:
+            raise TypeError("{} array cannot hold {!r}".format(self.items.typecode, value))
+        self.items[index] = value if kind != UNSET else 0
+        self.kinds[index] = kind
+
+    def __iter__(self):
+        for index in range(len(self.items)):
+            yield self[index]
+
+    def tolist(self):
+        return list(self)
+
+    def copy(self):
+        other = TypedArray.__new__(TypedArray)
+        other.items = array.array(self.items.typecode, self.items)
+        other.kinds = bytearray(self.kinds)
+        return other
+
+    def __str__(self):
+        return str(self.tolist())
+
+    __repr__ = __str__
+
+
+# Initial value of a declared array of elements of a type, 'int' or 'float'
+def new_array(base_type, length):
+    if typed_arrays and base_type in typecodes and length >= typed_array_length:
+        return TypedArray(typecodes[base_type], length)
+    return [None] * length
+
+
+# Copy of an array, so that it can be written in place. Other values are returned as they are
+def copy_array(value):
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, TypedArray):
+        return value.copy()
+    return value
+
+
 class ValueTable:
-    def __init__(self):
+    # slot_numbers: name -> slot of the variables of the frame, from analysis.frame_slots
+    def __init__(self, slot_numbers=None):
         self.table = dict()
+        self.slot_numbers = slot_numbers if slot_numbers is not None else {}
+        # Slot -> address, None for variables not allocated yet
+        self.slots = [None] * len(self.slot_numbers)
     # Allocates a local variable
     def allocate_local(self, name, value, line):
-        self.table[name] = value_stack.allocate(value, line)
+        address = value_stack.allocate(value, line)
+        self.table[name] = address
+        self.slots[self.slot_numbers[name]] = address
     # Frees all local variable
     def free_local(self):
         value_stack.free(len(self.table))
         self.table.clear()
+        self.slots = [None] * len(self.slot_numbers)
 
     def has_value(self, name):
         if (name in self.table.keys()):
@@ -33,55 +151,164 @@ class ValueTable:
     def get_value_from_address(self, addr):
         if (isinstance(addr, int) == False):
             return None
-        if addr >= 0 and addr < len(value_stack.values):
+        if addr >= 0 and addr < value_stack.size:
             return value_stack.get_value(addr)
         else:
             return None
+    # Gets address for given slot, None if it is not allocated yet
+    def get_slot_address(self, slot):
+        return self.slots[slot]
+    # Gets value from an address of this table
+    def get_value_at(self, address):
+        return value_stack.get_value(address)
     # Sets value from address
     def set_value_from_address(self, addr, value, line):
         value_stack.set_value(addr, value, line)
+    # Sets an element of the array at an address
+    def set_element_from_address(self, addr, index, value, line):
+        value_stack.set_element(addr, index, value, line)
     def get_value(self, name):
         return value_stack.get_value(self.table[name])
     def get_history(self, name):
         return value_stack.get_history(self.table[name])
+    def get_element_history(self, name, index):
+        return value_stack.get_element_history(self.table[name], index)
     def set_value(self, name, value, line):
         value_stack.set_value(self.table[name], value, line)
 
+# Values of the variables of every frame, in slots indexed by address. Every write is
+# appended to one log, and each slot keeps the offsets of its writes for its history
 class ValueStack:
     def __init__(self):
         # Local variables are stored in symbol table, free as many as that
         self.values = []
+        self.writes = [] # Per slot, offsets in the log of its writes since it was allocated
+        self.shared = [] # Per slot, whether its array is the one in the log
+        self.size = 0 # Slots allocated, the first ones of the arrays
+        # Write log: address, element index (None for a whole value), value and line
+        self.log_addresses = []
+        self.log_indices = []
+        self.log_values = []
+        self.log_lines = []
+    # Appends a write to the log, returning its offset
+    def log(self, address, index, value, line):
+        self.log_addresses.append(address)
+        self.log_indices.append(index)
+        self.log_values.append(value)
+        self.log_lines.append(line)
+        return len(self.log_lines) - 1
     # Allocates a value, returning current address of the value
     def allocate(self, value, line):
-        index = len(self.values)
-        self.values = self.values + [{"value": value, "history": [(value, line)]}]
-        return index
+        address = self.size
+        value = copy_array(value)
+        if address == len(self.values):
+            self.values.append(value)
+            self.writes.append([self.log(address, None, value, line)])
+            self.shared.append(True)
+        else:
+            self.values[address] = value
+            self.writes[address] = [self.log(address, None, value, line)]
+            self.shared[address] = True
+        self.size = address + 1
+        return address
     # Frees num amount of values - Can automate this process
     def free(self, num):
-        if num != 0:
-            self.values = self.values[:-num]
+        size = max(self.size - num, 0)
+        if size < self.size:
+            self.drop_log(size, self.writes[size][0])
+        for address in range(size, self.size):
+            self.values[address] = None
+            self.writes[address] = None
+        self.size = size
+    # Removes from the log the writes to slots from size on, all made from offset start
+    # on, as the slots were allocated in order. Live slots' later writes move down
+    def drop_log(self, size, start):
+        kept = [offset for offset in range(start, len(self.log_lines))
+                if self.log_addresses[offset] < size]
+        for new, offset in enumerate(kept, start):
+            address = self.log_addresses[offset]
+            writes = self.writes[address]
+            writes[writes.index(offset, -(len(self.log_lines) - offset))] = new
+            self.log_addresses[new] = address
+            self.log_indices[new] = self.log_indices[offset]
+            self.log_values[new] = self.log_values[offset]
+            self.log_lines[new] = self.log_lines[offset]
+        end = start + len(kept)
+        del self.log_addresses[end:], self.log_indices[end:], self.log_values[end:], self.log_lines[end:]
 
-    def __get__(self, address):
+    # Checks an address, returning None for -1, a variable not yet initialized
+    def slot(self, address):
         if(isinstance(address, int) == False):
-            return None
+            raise TypeError("Invalid address: {}".format(address))
 
         if(address == -1):
-            return {"value": None, "history": []} # Not yet initialized]
-        if(address > len(self.values) or address < 0):
-            print("Error: Stack inconsistency")
             return None
-        return self.values[address]
+        if(address > self.size or address < 0):
+            print("Error: Stack inconsistency")
+            raise TypeError("Invalid address: {}".format(address))
+        if(address == self.size):
+            raise IndexError("Address out of the stack: {}".format(address))
+        return address
     # Attains certain value via address
     def get_value(self, address):
-        return self.__get__(address)["value"]
+        address = self.slot(address)
+        return self.values[address] if address is not None else None
+    # (value, line) of each write to an address since it was allocated
     def get_history(self, address):
-        return self.__get__(address)["history"]
+        address = self.slot(address)
+        if address is None:
+            return []
+        history = []
+        value = None
+        for offset in self.writes[address]:
+            index = self.log_indices[offset]
+            if index is None:
+                value = self.log_values[offset]
+            else:
+                value = list(value)
+                value[index] = self.log_values[offset]
+            history.append((value, self.log_lines[offset]))
+        return history
+    # (value, line) of an element of the array at an address, at each write to it
+    def get_element_history(self, address, element):
+        address = self.slot(address)
+        if address is None:
+            return []
+        history = []
+        value = None
+        for offset in self.writes[address]:
+            index = self.log_indices[offset]
+            if index is None:
+                value = self.log_values[offset][element]
+            elif index == element:
+                value = self.log_values[offset]
+            history.append((value, self.log_lines[offset]))
+        return history
 
     # Sets the value
     def set_value(self, address, value, line):
-        entry = self.__get__(address)
-        entry["value"] = value
-        entry["history"] = entry["history"] + [(value, line)]
+        address = self.slot(address)
+        if address is not None:
+            value = copy_array(value)
+            self.values[address] = value
+            self.shared[address] = True
+            self.writes[address].append(self.log(address, None, value, line))
+    # Sets an element of the array at an address
+    def set_element(self, address, index, value, line):
+        address = self.slot(address)
+        array = self.values[address] if address is not None else None
+        if isinstance(array, TypedArray) and not array.holds(value):
+            array = array.tolist() # A list from then on, storing the value as it is
+        elif address is not None and self.shared[address]:
+            array = copy_array(array)
+        if isinstance(value, (list, TypedArray)):
+            value = copy.deepcopy(value)
+        array[index] = value
+        self.values[address] = array
+        self.shared[address] = False
+        if index < 0:
+            index += len(array)
+        self.writes[address].append(self.log(address, index, value, line))
 
 class CallStack:
     def __init__(self):
@@ -104,6 +331,16 @@ class CallContext:
     def __init__(self, fn_name, cur_line):
         self.name = fn_name
         self.line = cur_line
+        # Temporary slot -> value of a hoisted call, None if not yet set
+        self.temps = []
+    def get_temp(self, slot):
+        if slot < len(self.temps):
+            return self.temps[slot]
+        return None
+    def set_temp(self, slot, value):
+        if slot >= len(self.temps):
+            self.temps.extend([None] * (slot + 1 - len(self.temps)))
+        self.temps[slot] = value
 
 # These stacks are global
 value_stack = ValueStack()
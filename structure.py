@@ -28,6 +28,11 @@ class Function_Entry:
         self.ref_sym = ref_sym
         self.ref_value = ref_val
         self.return_value = return_value
+        # Definition, and (first node, last nodes) of its CFG, built on the first call
+        self.defn = None
+        self.graph = None
+        # Bytecode of the graph, for vm.Machine
+        self.bytecode = None
 
 class Symbol_Table:
     def __init__(self, ref):
@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+import ply
+import ply.yacc as yacc
+
+# Versioned lexer/parser tables, so startup does not validate or regenerate them.
+# Table modules are named after a hash of the rules they were built from,
+# e.g. grammar_tables/parsetab_<hash>.pickle, and are only rebuilt when that hash changes.
+# Nothing is read or written until the lexer or parser is first built. New tables are
+# written to a temporary directory and moved into place; without a writable table
+# directory, the tables are built in memory only.
+# Usage: python tablecache.py build [--debug]
+
+TABLE_PACKAGE = "grammar_tables"
+table_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), TABLE_PACKAGE)
+
+# False: build the tables on every start like plain lex.lex()/yacc.yacc(debug=1)
+use_cache = True
+# Writes parser.out next to the tables when they are rebuilt
+debug = False
+
+
+# Drops build warnings (unused tokens, known conflicts), keeps errors
+class ErrorLogger(yacc.PlyLogger):
+    def warning(self, msg, *args, **kwargs):
+        pass
+
+    def info(self, msg, *args, **kwargs):
+        pass
+
+    def debug(self, msg, *args, **kwargs):
+        pass
+
+
+def digest(parts):
+    return hashlib.sha1(repr((ply.__version__,) + tuple(parts)).encode("utf-8")).hexdigest()[:12]
+
+
+# Hash of the lexer rules, in the order the lexer sees them
+def lexer_signature(namespace):
+    rules = []
+    for name, rule in namespace.items():
+        if name.startswith("t_"):
+            rules.append((name, rule if isinstance(rule, str) else rule.__doc__))
+    return digest([namespace["tokens"], rules])
+
+
+# Hash of the grammar: productions in definition order, tokens and precedence
+def parser_signature(namespace):
+    functions = [rule for name, rule in namespace.items() if name.startswith("p_") and callable(rule)]
+    functions.sort(key=lambda rule: rule.__code__.co_firstlineno)
+    productions = [(rule.__name__, rule.__doc__) for rule in functions]
+    return digest([namespace["tokens"], namespace.get("precedence"), productions])
+
+
+def lexer_table(namespace):
+    return "lextab_{}.py".format(lexer_signature(namespace))
+
+
+def parser_table(namespace):
+    return "parsetab_{}.pickle".format(parser_signature(namespace))
+
+
+# Result of build(outputdir) with the table file filename in outputdir. If it is not
+# in table_dir yet, build writes it to a temporary directory and it is moved into
+# table_dir, replacing the tables of the same kind built from other rules.
+# build_uncached() is used when table_dir cannot be written
+def cached(filename, build, build_uncached):
+    if os.path.exists(os.path.join(table_dir, filename)):
+        return build(table_dir)
+    try:
+        os.makedirs(table_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=table_dir)
+    except OSError:
+        return build_uncached()
+    try:
+        built = build(staging)
+        if os.path.exists(os.path.join(staging, filename)):
+            kind = filename.split("_")[0]
+            for stale in glob.glob(os.path.join(table_dir, kind + "_*")):
+                os.remove(stale)
+            for name in os.listdir(staging):
+                os.replace(os.path.join(staging, name), os.path.join(table_dir, name))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    importlib.invalidate_caches()
+    return built
+
+
+# Lexer of a scanner module, from build(**options) with the options for lex.lex().
+# build is defined in the scanner module, as lex.lex() reads the rules of its caller
+def build_lexer(namespace, build):
+    if not use_cache:
+        return build()
+    filename = lexer_table(namespace)
+    errorlog = ErrorLogger(sys.stderr)
+    lextab = TABLE_PACKAGE + "." + os.path.splitext(filename)[0]
+    return cached(filename,
+                  lambda outputdir: build(optimize=1, lextab=lextab, outputdir=outputdir, errorlog=errorlog),
+                  lambda: build(errorlog=errorlog))
+
+
+# Parser of a parser module, from build(**options) with the options for yacc.yacc()
+def build_parser(namespace, build):
+    if not use_cache:
+        return build(debug=1)
+    filename = parser_table(namespace)
+    errorlog = yacc.PlyLogger(sys.stderr) if debug else ErrorLogger(sys.stderr)
+    return cached(filename,
+                  lambda outputdir: build(optimize=1, debug=debug, picklefile=os.path.join(outputdir, filename),
+                                          outputdir=outputdir, debugfile="parser.out", errorlog=errorlog),
+                  lambda: build(debug=False, write_tables=False, errorlog=errorlog))
+
+
+# Removes every table, so the next build writes them again
+def clear():
+    for table in glob.glob(os.path.join(table_dir, "*tab_*")) + glob.glob(os.path.join(table_dir, "parser.out")):
+        os.remove(table)
+    importlib.invalidate_caches()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] != ["build"]:
+        print("usage: python tablecache.py build [--debug]")
+        sys.exit(1)
+    debug = "--debug" in sys.argv[2:]
+    sys.modules["tablecache"] = sys.modules[__name__]
+    clear()
+    import scanner
+    import parse
+    scanner.get_lexer()
+    parse.get_parser()
+    print("Built", os.path.join(TABLE_PACKAGE, lexer_table(vars(scanner))))
+    print("Built", os.path.join(TABLE_PACKAGE, parser_table(vars(parse))))
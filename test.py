@@ -2,7 +2,7 @@ import sys
 import parse
 import CFG
 
-sys.argv = ['parse.py', 'sample.txt']
+sys.argv = ['parse.py', 'tests/samples/c3.c']
 result = parse.test_parse()
-graph = CFG.generate_graph(result)
+graph = CFG.generate_graph(result, CFG.Program())
 print(graph)
@@ -0,0 +1,61 @@
+import contextlib
+import glob
+import io
+import os
+import sys
+
+import pytest
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(tests_dir), "benchmarks"))
+
+# Source generators and parsing helpers are the benchmarks' own
+import common
+from common import parse_text, program_with
+import CFG
+import main
+
+# Sample programs every test can run on
+SAMPLES = sorted(glob.glob(os.path.join(tests_dir, "samples", "*.c")))
+
+
+@pytest.fixture
+def gen_source():
+    return common.gen_source
+
+
+@pytest.fixture
+def gen_program():
+    return common.gen_program
+
+
+def read_sample(path):
+    with open(path) as f:
+        return f.read()
+
+
+# Desugared AST of a source text
+@pytest.fixture
+def desugared():
+    return common.parse_desugared
+
+
+# Starts a program in the debugger with the given Program settings. The function
+# table and call stack are shared by every program, so each run starts them empty
+@pytest.fixture
+def start(desugared):
+    def start(data, **settings):
+        CFG.function_table.table.clear()
+        CFG.call_stack.called = []
+        ctxt = main.MainContext(desugared(data), program_with(**settings))
+        ctxt.begin()
+        return ctxt
+    return start
+
+
+# Runs a command of a debugger context, returning what it printed
+def output(command, *args):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        command(*args)
+    return out.getvalue()
@@ -0,0 +1,21 @@
+int fact(int n) {
+    int r;
+    r = 1;
+    if (n > 1) {
+        r = n * 2;
+    }
+    return r;
+}
+
+int main(void) {
+    int i, s;
+    int v[4];
+    s = 0;
+    for (i = 0; i < 4; i++) {
+        v[i] = fact(i);
+        s = s + v[i];
+    }
+    v[0] = v[1] + v[2] * v[3];
+    printf("%d\n", s);
+    i = v[0] / 3;
+}
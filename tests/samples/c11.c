@@ -0,0 +1,23 @@
+int count;
+int arr[3];
+
+int bump(int by) {
+    count = count + by;
+    return count;
+}
+
+int main(void) {
+    int i, t;
+    float z;
+    count = 0;
+    t = 0;
+    z = 0.5;
+    for (i = 0; i < 3; i++) {
+        t = bump(i) + t;
+        z = z * t - 1;
+        arr[i] = t;
+    }
+    t = arr[1];
+    i = 0;
+    i--;
+}
@@ -0,0 +1,17 @@
+int main(void) {
+    int a, b;
+    float f;
+    a = 2;
+    b = 0;
+    f = 0;
+    if (a > 1)
+        if (a > 5)
+            b = 1;
+        else
+            b = 2;
+    for (a = 0; a < 3; a++)
+        f = f + a / 2;
+    b = -a + -b * 2;
+    f = f - -1.5;
+    b = (a + b) * (a - b) / 2 - b % 3;
+}
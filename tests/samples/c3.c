@@ -0,0 +1,30 @@
+/* nested loops,
+   gaps and comments */
+int g;
+float gf;
+
+int main(void) {
+    int i, j, n;
+    float acc;
+    int tab[6];
+
+    n = 3;
+    acc = 0;
+    g = 1;
+
+    // accumulate
+    for (i = 0; i < n; i++) {
+        for (j = 0; j < 2; j++) {
+            acc = acc + i * 0.5;
+
+            tab[i + j] = i * j;
+        }
+        if (i > 0)
+            g = g * 2;
+
+        gf = acc / 3;
+    }
+    i = 10 / 4;
+    acc = 10 / 4;
+    j = 7.9;
+}
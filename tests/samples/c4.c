@@ -0,0 +1,22 @@
+int sq(int x) {
+    int r;
+    r = x * x;
+    return r;
+}
+
+int twice(int y) {
+    int t;
+    t = y + y;
+    return t;
+}
+
+int main(void) {
+    int i, k, m;
+    k = 0;
+    for (i = 1; i < 4; i++) {
+        k = k + sq(i) * 2;
+        m = twice(i);
+        k = k - m;
+    }
+    printf("%d\n", k);
+}
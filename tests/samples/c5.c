@@ -0,0 +1,28 @@
+int main(void) {
+    int a, b, c;
+    a = 1;
+    if (a > 0) {
+        b = 1;
+    } else {
+        b = 2;
+    }
+
+
+
+    c = 3;
+    if (a < 0) {
+        b = 4;
+    } else {
+        b = 5;
+    }
+    c = b * 2;
+    for (a = 0; a < 2; a++) {
+        if (a == 1) {
+            c = c + 1;
+        } else {
+            c = c - 1;
+        }
+
+        b = b + 1;
+    }
+}
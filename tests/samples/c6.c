@@ -0,0 +1,21 @@
+int data[8];
+float w[3];
+
+int main(void) {
+    int i, s;
+    float f;
+    s = 0;
+    for (i = 0; i < 8; i++) {
+        data[i] = i * i;
+    }
+    for (i = 0; i < 8; i++) {
+        s = s + data[i];
+    }
+    w[0] = 1.5;
+    w[1] = 2;
+    w[2] = w[0] + w[1];
+    f = w[2] / 2;
+    printf("%d\n", s);
+    printf("%f\n", f);
+    printf("done\n");
+}
@@ -0,0 +1,15 @@
+int main(void) {
+    int i, t;
+    float x;
+    t = 0;
+    x = 0.25;
+    for (i = 0; i < 20; i++) {
+        t = t + i;
+        x = x * 2;
+        if (t > 50) {
+            x = x / 3;
+        }
+    }
+    i = -t;
+    x = -x + 1;
+}
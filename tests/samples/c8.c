@@ -0,0 +1,23 @@
+int g;
+float h;
+
+float scale(float v, int k) {
+    float r;
+    v = v * 2;
+    k = 2.5;
+    r = v + k;
+    return r;
+}
+
+int main(void) {
+    int a;
+    float b;
+    g = 3;
+    h = 1.25;
+    a = g + 1;
+    b = scale(h, a);
+    g = b;
+    h = b;
+    a = scale(g, 1) + 1;
+    printf("%f\n", b);
+}
@@ -0,0 +1,19 @@
+int x;
+int y;
+
+int inc(int v) {
+    int w;
+    w = v + 1;
+    return w;
+}
+
+int main(void) {
+    x = 5;
+    int x;
+    x = 7;
+    y = inc(inc(x));
+    x += 2;
+    y -= 1;
+    x = y * 2;
+    y = y + 1;
+}
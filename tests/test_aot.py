@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from conftest import SAMPLES, read_sample, output
+import aot
+
+# Samples the interpreter runs to their end
+FINISHED = [path for path in SAMPLES if os.path.basename(path) not in ["c6.c", "c11.c", "c12.c"]]
+
+CALLS = '''float half(float v, int k) {
+    float r;
+    r = v / 2;
+    k = 2.5;
+    r = r + k;
+    v = 7;
+    r = r + v / 2;
+    return r - 0.25;
+}
+int twice(int n) {
+    return n * 2.5;
+}
+int main(void) {
+    int i, x;
+    float b;
+    x = 0;
+    for (i = 0; i < 4; i++) {
+        b = half(i, twice(i)) + twice(half(3, 1));
+        x = x + b;
+        printf("%f\\n", b);
+    }
+    printf("%d\\n", x);
+}
+'''
+
+
+def graph_output(start, data):
+    return output(start(data).cmd_next, 10 ** 6).replace("End of program\n", "")
+
+
+def aot_output(desugared, data):
+    return output(aot.run_program, desugared(data), "<test>")
+
+
+@pytest.mark.parametrize("path", FINISHED, ids=os.path.basename)
+def test_samples_print_alike(start, desugared, path):
+    data = read_sample(path)
+    assert aot_output(desugared, data) == graph_output(start, data)
+
+
+def test_calls_print_alike(start, desugared):
+    printed = aot_output(desugared, CALLS)
+    assert printed == graph_output(start, CALLS)
+    assert len(printed.splitlines()) == 5
+
+
+def test_errors_point_at_c_lines(desugared):
+    with pytest.raises(ZeroDivisionError) as error:
+        aot_output(desugared, "int main(void) {\n    int x;\n    x = 0;\n    x = 1 / x;\n}\n")
+    assert [entry.lineno + 1 for entry in error.traceback if str(entry.path) == "<test>"] == [4]
+
+
+# Array elements keep the values stored to them, unconverted
+def test_element_stores_print_alike(start, desugared):
+    data = 'int main(void) {\n    int a[2];\n    a[0] = 2.7;\n    printf("%f\\n", a[0]);\n    a[1] = a[0] * 2;\n    printf("%f\\n", a[1]);\n}\n'
+    printed = aot_output(desugared, data)
+    assert printed == graph_output(start, data)
+    assert printed.splitlines()[0] == "2.700000"
@@ -0,0 +1,146 @@
+import os
+import re
+
+import pytest
+
+from conftest import SAMPLES, read_sample, output
+import CFG
+
+
+NESTED = '''int main(void) {
+    int i, j, x;
+    x = 0;
+    for (i = 0; i < 3; i++) {
+        if (x > 1) {
+            if (x > 2) {
+                x = x - 1;
+            }
+        } else {
+            for (j = 0; j < 2; j++) {
+                x = x + 1;
+            }
+        }
+    }
+}
+'''
+
+BRANCHES = '''int f(int x) {
+    int r;
+    r = 0;
+    if (x > 3) {
+        r = 1;
+    } else {
+        r = 2;
+    }
+    x = x + r;
+    return x;
+}
+int main(void) {
+    int i;
+    i = f(5);
+    i = f(f(2));
+}
+'''
+
+
+# Lines, output and visible values after each step of a program, up to its end or
+# the error it stops on
+def step_trace(ctxt, data, limit=2000):
+    names = sorted(set(re.findall(r"\b[a-z_]\w*\b", re.sub(r'/\*[\s\S]*?\*/|//.*|"[^"]*"', "", data))))
+    trace = []
+    while not ctxt.done and len(trace) < limit:
+        try:
+            printed = output(ctxt.cmd_next)
+        except Exception as error:
+            trace.append((CFG.line_num, type(error).__name__, str(error)))
+            break
+        values = [(name, output(ctxt.cmd_print, name, None)) for name in names]
+        trace.append((CFG.line_num, printed, values))
+    return trace
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_compacted_graphs_step_alike(start, path):
+    data = read_sample(path)
+    built = step_trace(start(data, compact=False), data)
+    ctxt = start(data, compact=True)
+    assert step_trace(ctxt, data) == built
+
+
+def test_compaction_removes_nodes(start):
+    built = start(NESTED, compact=False)
+    built_nodes = len(CFG.graph_nodes(built.CFG[0]))
+    built_trace = step_trace(built, NESTED)
+    compacted = start(NESTED, compact=True)
+    assert compacted.program.nodes_removed == built_nodes - len(CFG.graph_nodes(compacted.CFG[0])) > 0
+    assert compacted.program.edges_removed > 0
+    assert step_trace(compacted, NESTED) == built_trace
+
+
+# Lines, statements (by identity) and edges of every node of a graph
+def graph_shape(entry):
+    nodes = CFG.graph_nodes(entry)
+    index = {id(node): i for i, node in enumerate(nodes)}
+    return [(node.line_list, [id(getattr(stmt, "content", stmt)) for stmt in node.block if not isinstance(stmt, CFG.Dummy)],
+             index.get(id(node.pred)), [index[id(next_node)] for next_node in node.next]) for node in nodes]
+
+
+def test_building_twice_gives_the_same_graph(desugared):
+    body = desugared(NESTED).decls[-1].body
+    text = str(body)
+    entry = CFG.build_graph(body.stmts)[0]
+    assert graph_shape(CFG.build_graph(body.stmts)[0]) == graph_shape(entry)
+    assert str(body) == text
+
+
+# Graphs are shared by every call, so the lines a call steps through do not depend on
+# the branches earlier calls took
+def test_steps_do_not_depend_on_earlier_calls(start):
+    ctxt = start(BRANCHES)
+    lines = []
+    while not ctxt.done:
+        output(ctxt.cmd_next)
+        lines.append(CFG.line_num)
+    calls = " ".join(map(str, lines)).replace(" 2 3 4 5 6 7 8 9 10", " f")
+    assert calls == "13 13 14 f 14 15 f 15 15 f 15"
+
+
+# Each function has a graph of its own: a call steps into the callee's lines and
+# returns to the line of the call
+def test_calls_step_into_the_callee_and_back(start):
+    ctxt = start(BRANCHES)
+    lines = []
+    while not ctxt.done:
+        output(ctxt.cmd_next)
+        lines.append(CFG.line_num)
+    assert lines[:13] == [13, 13, 14, 2, 3, 4, 5, 6, 7, 8, 9, 10, 14]
+    assert output(ctxt.cmd_print, "i", None) == "5\n"
+    assert CFG.function_table.table["f"].graph[0] is not ctxt.CFG[0]
+
+
+@pytest.mark.parametrize("data, message", [
+    ("int f(int n) {\n    return f(n);\n}\nint main(void) {\n    int x;\n    x = 1;\n}\n",
+     "line 2: recursive call not supported, in f -> f\n"),
+    ("int g(int n) {\n    int r;\n    r = h(n) + 1;\n    return r;\n}\nint h(int n) {\n    return g(n);\n}\n"
+     "int main(void) {\n    int x;\n    x = g(1);\n}\n",
+     "line 3: recursive call not supported, in g -> h -> g\n"),
+])
+def test_recursion_is_rejected_before_running(start, capsys, data, message):
+    with pytest.raises(ValueError, match="semantic error"):
+        start(data)
+    assert capsys.readouterr().out == message
+
+
+def test_functions_are_built_when_first_called(start):
+    data = BRANCHES.replace("int main(void) {", "int unused(int n) {\n    return n;\n}\nint main(void) {")
+    ctxt = start(data)
+    assert ctxt.program.functions_materialized == 1
+    assert list(ctxt.program.call_graph) == ["main"]
+    output(ctxt.cmd_next, 2)
+    assert ctxt.program.functions_materialized == 1
+    output(ctxt.cmd_next, 1) # The call on line 14
+    assert ctxt.program.functions_materialized == 2
+    assert ctxt.program.call_graph == {"main": ["f"], "f": []}
+    output(ctxt.cmd_next, 1000)
+    assert ctxt.program.functions_materialized == 2
+    assert CFG.function_table.table["unused"].graph is None
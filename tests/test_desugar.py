@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import parse_text
+import analysis
+import parse
+
+CALLS = '''int f(int a) {
+    return a;
+}
+int main(void) {
+    int x, y;
+    x = f(1) + f(f(2));
+    if (f(x) > 1) {
+        y = 2;
+    }
+    printf("%d\\n", f(y));
+}
+'''
+
+
+def main_lines(ast):
+    return [(stmt.line_num, str(stmt).split("> ", 1)[-1]) for stmt in ast.decls[-1].body.stmts]
+
+
+# Temporaries are numbered from 0 in each test
+@pytest.fixture(autouse=True)
+def temp_info(monkeypatch):
+    monkeypatch.setattr(analysis, "temp_info", analysis.TempInfo())
+
+
+def test_calls_are_hoisted_before_their_statement(desugared):
+    assert main_lines(desugared(CALLS)) == [
+        (5, "[base: int, declare: [x,y], const: False]"),
+        (6, "( [|0|] = f(1int) )"),
+        (6, "( [|1|] = f(2int) )"),
+        (6, "( [|2|] = f([|1|]) )"),
+        (6, " ( x = ( [|0|] + [|2|] ) )"),
+        (7, "( [|3|] = f(x) )"),
+        (7, "cond[( [|3|] > 1int )] [\n8>  ( y = 2int )\n] [[]]"),
+        (10, "( [|4|] = f(y) )"),
+        (10, "printf('%d\\n', [|4|])"),
+    ]
+
+
+def test_deep_expressions_do_not_recurse(desugared):
+    terms = " + ".join(["x"] * 5000)
+    ast = desugared("int main(void) {\n    int x, y;\n    y = " + terms + ";\n}\n")
+    expr = ast.decls[-1].body.stmts[-1].content.rvalue
+    depth = 0
+    while isinstance(expr, parse.BinOp):
+        expr = expr.left
+        depth += 1
+    assert depth == 4999
+
+
+@pytest.mark.parametrize("loop", ["for (i = 0; i < f(3); i++) {}", "while (f(i)) {}"])
+def test_calls_in_loop_headers_are_rejected(loop, capsys):
+    ast = parse_text("int f(int a) {\n    return a;\n}\nint main(void) {\n    int i;\n    " + loop + "\n}\n")
+    with pytest.raises(ValueError):
+        analysis.desugar_ast(ast)
+    assert "not yet supported" in capsys.readouterr().out
+
+
+def test_declarations_with_initializers_are_rejected():
+    with pytest.raises(ValueError):
+        analysis.desugar_ast(parse_text("int main(void) {\n    int x = 1;\n}\n"))
+
+
+def test_temporaries_share_slots_once_dead(desugared):
+    main = desugared(CALLS).decls[-1]
+    temps = {temp.name: temp.slot for temps in analysis.stmt_temps(main.body, []) for temp in temps}
+    assert temps == {0: 0, 1: 1, 2: 2, 3: 2, 4: 2}
+    assert analysis.allocate_temps(main) == 3
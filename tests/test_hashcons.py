@@ -0,0 +1,44 @@
+import hashcons
+import parse
+
+PROGRAM = '''int main(void) {
+    int a, b, x, y;
+    x = (a + b) * 2;
+    y = (a + b) * 2;
+    x = a + b;
+}
+'''
+
+
+def rvalues(ast):
+    main = ast.decls[-1]
+    return [stmt.content.rvalue for stmt in main.body.stmts if isinstance(stmt, parse.Statement)]
+
+
+def test_equal_expressions_are_shared(desugared):
+    first, second, third = rvalues(desugared(PROGRAM))
+    assert first is second
+    assert third is first.left
+
+
+def test_different_expressions_stay_apart():
+    one = hashcons.const(1, "int")
+    assert hashcons.const(1.0, "float") is not one
+    assert hashcons.const(1, "int") is one
+    assert hashcons.binop(one, hashcons.identifier("x"), "+") is not hashcons.binop(hashcons.identifier("x"), one, "+")
+    assert hashcons.same(hashcons.identifier("x"), parse.Identifier("x"))
+
+
+def test_each_program_starts_a_new_table(desugared):
+    desugared(PROGRAM)
+    first = len(hashcons.nodes)
+    ast = desugared("int main(void) {\n    int c;\n    c = 3;\n}\n")
+    assert len(hashcons.nodes) < first
+    assert rvalues(ast)[0] in hashcons.nodes.values()
+
+
+def test_disabled_sharing_builds_fresh_nodes(desugared, monkeypatch):
+    monkeypatch.setattr(hashcons, "enabled", False)
+    first, second, _ = rvalues(desugared(PROGRAM))
+    assert first is not second
+    assert str(first) == str(second)
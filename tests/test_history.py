@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from conftest import read_sample, output
+import stack
+
+
+@pytest.fixture
+def values():
+    return stack.ValueStack()
+
+
+def test_scalar_history(values):
+    address = values.allocate(None, 3)
+    values.set_value(address, 1, 4)
+    values.set_value(address, 2.5, 6)
+    assert values.get_history(address) == [(None, 3), (1, 4), (2.5, 6)]
+    assert values.get_value(address) == 2.5
+    assert values.get_history(-1) == []
+
+
+def test_history_restarts_when_a_slot_is_reused(values):
+    values.allocate(0, 1)
+    address = values.allocate(1, 2)
+    values.set_value(address, 2, 3)
+    values.free(1)
+    assert values.allocate(5, 7) == address
+    assert values.get_history(address) == [(5, 7)]
+
+
+def test_array_history_replays_element_writes(values):
+    array = [None] * 3
+    address = values.allocate(array, 1)
+    values.set_element(address, 0, 4, 2)
+    values.set_element(address, -1, 6, 3)
+    values.set_value(address, [7, 8, 9], 4)
+    values.set_element(address, 1, 0, 5)
+    array[0] = "changed"
+    assert values.get_history(address) == [
+        ([None, None, None], 1),
+        ([4, None, None], 2),
+        ([4, None, 6], 3),
+        ([7, 8, 9], 4),
+        ([7, 0, 9], 5),
+    ]
+    assert values.get_element_history(address, 2) == [(None, 1), (None, 2), (6, 3), (9, 4), (9, 5)]
+    assert values.get_value(address) == [7, 0, 9]
+
+
+def test_element_writes_do_not_copy_the_array_again(values):
+    address = values.allocate([0] * 4, 1)
+    values.set_element(address, 0, 1, 2)
+    array = values.get_value(address)
+    values.set_element(address, 1, 2, 3)
+    assert values.get_value(address) is array
+    assert values.get_history(address)[1] == ([1, 0, 0, 0], 2)
+
+
+# After each step of a program writing scalars and an array in loops, the trace of
+# each variable and element ends with its current value
+@pytest.mark.parametrize("typed", [False, True], ids=["lists", "typed"])
+def test_traces_end_with_current_values(start, monkeypatch, typed):
+    monkeypatch.setattr(stack, "typed_arrays", typed)
+    monkeypatch.setattr(stack, "typed_array_length", 0)
+    data = read_sample(os.path.join(os.path.dirname(__file__), "samples", "c3.c"))
+    ctxt = start(data)
+    steps = 0
+    while not ctxt.done:
+        output(ctxt.cmd_next)
+        steps += 1
+        for name, index in [("i", None), ("acc", None), ("g", None), ("gf", None), ("tab", 2), ("tab", 3)]:
+            printed = output(ctxt.cmd_print, name, index).strip()
+            trace = output(ctxt.cmd_trace, name, index).strip().splitlines()
+            if printed == "Invisible variable":
+                assert trace == [printed]
+            elif trace[-1].endswith("not yet initialized"):
+                assert printed == "N/A"
+            else:
+                assert trace[-1].startswith("{} = {} at line ".format(name, printed))
+    assert steps > 20
+
+
+def test_freed_slots_leave_the_log(values):
+    kept = values.allocate(0, 1)
+    for line in range(2, 200):
+        address = values.allocate([0, 0], line)
+        values.set_element(address, 1, line, line)
+        values.set_value(kept, line, line)
+        values.allocate(line, line)
+        values.free(2)
+    assert len(values.log_lines) == len(values.writes[kept]) == 199
+    assert values.get_history(kept)[-2:] == [(198, 198), (199, 199)]
+
+
+# Besides the writes of live variables, the write log stays flat however many times a
+# function is called
+def test_log_stays_flat_across_calls(start):
+    data = '''int g;
+int f(int n) {
+    int a[3];
+    int k;
+    a[0] = n;
+    k = a[0] + 1;
+    return k;
+}
+int main(void) {
+    int i;
+    for (i = 0; i < 400; i++) {
+        g = f(i);
+    }
+}
+'''
+    ctxt = start(data)
+    values = stack.value_stack
+    before = len(values.log_lines) # Left by earlier programs
+    while not ctxt.done:
+        output(ctxt.cmd_next)
+        assert len(values.log_lines) == sum(len(values.writes[address]) for address in range(values.size))
+    # Two writes a call, to i and g, are left of the five made
+    assert len(values.log_lines) - before <= 2 * 400 + 4
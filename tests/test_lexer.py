@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from conftest import SAMPLES, read_sample
+import fastlex
+import scanner
+
+
+def tokens(lexer, data):
+    lexer.lineno = 1
+    lexer.input(data)
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in iter(lexer.token, None)]
+
+
+def chunked_tokens(data, size):
+    lexer = fastlex.FastLexer()
+    lexer.input_chunks(data[i:i + size] for i in range(0, len(data), size))
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in iter(lexer.token, None)]
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_sample_tokens_match_ply(path):
+    data = read_sample(path)
+    assert tokens(fastlex.FastLexer(), data) == tokens(scanner.get_lexer(), data)
+
+
+def test_generated_tokens_match_ply(gen_source):
+    data = gen_source(50)
+    assert tokens(fastlex.FastLexer(), data) == tokens(scanner.get_lexer(), data)
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 4096])
+def test_chunked_input_matches_whole_input(gen_source, size):
+    data = gen_source(5)
+    assert chunked_tokens(data, size) == tokens(fastlex.FastLexer(), data)
+
+
+@pytest.mark.parametrize("text", ['x = "a\\"b";', "a\r\nb", "x = 1.e5 + 07 + 0.5f;", "/* a\n * b */ c"])
+def test_edge_cases_match_ply(text):
+    assert tokens(fastlex.FastLexer(), text) == tokens(scanner.get_lexer(), text)
+
+
+def test_unknown_character_is_an_error(capsys):
+    with pytest.raises(scanner.Scanner_Error):
+        tokens(fastlex.FastLexer(), "int x;\nx = $;")
+    assert capsys.readouterr().out == "Syntax error : line 2\n"
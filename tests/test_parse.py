@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+from conftest import tests_dir
+
+
+# A fresh interpreter, where no lexer was built before the parser
+def test_parser_parses_text_on_its_own():
+    code = "import parse; print(parse.get_parser().parse('int main(void) {\\n    int x;\\n}\\n', tracking=True))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(tests_dir), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "declare: [x]" in result.stdout
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from conftest import SAMPLES
+import rdparse
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_sample_trees_match(path):
+    assert rdparse.parse_output("yacc", path) == rdparse.parse_output("rd", path)
+
+
+def test_generated_trees_match(tmp_path, gen_program):
+    path = tmp_path / "generated.c"
+    path.write_text(gen_program(20))
+    assert rdparse.parse_output("yacc", str(path)) == rdparse.parse_output("rd", str(path))
+
+
+@pytest.mark.parametrize("text", ["int main(void) { x = ; }", "int main(void) { int a; a = 1 }"])
+def test_errors_match(tmp_path, text):
+    path = tmp_path / "error.c"
+    path.write_text(text)
+    output = rdparse.parse_output("yacc", str(path))
+    assert output == rdparse.parse_output("rd", str(path))
+    assert output.endswith("ParseError\n")
@@ -0,0 +1,89 @@
+import operator
+
+import parse
+import analysis
+import stack
+import CFG
+
+PROGRAM = '''int g;
+float h;
+int f(int a, float b) {
+    int c;
+    c = a + g;
+    return c;
+}
+int main(void) {
+    int x;
+    g = 1;
+    float g;
+    x = h;
+    g = x * 2;
+    h = x / 2;
+    y = 3;
+}
+'''
+
+
+def analyzed(desugared, data):
+    return analysis.infer_types(analysis.resolve_names(desugared(data)))
+
+
+def assignments(fn):
+    return [stmt.content for stmt in fn.body.stmts if isinstance(stmt, parse.Statement)]
+
+
+def test_slots_are_numbered_per_function(desugared):
+    f, main = analyzed(desugared, PROGRAM).decls[-2:]
+    assert analysis.frame_slots(f) == {"a": 0, "b": 1, "c": 2}
+    assert analysis.frame_slots(main) == {"x": 0, "g": 1}
+
+
+def test_uses_bind_to_their_declaration(desugared):
+    f, main = analyzed(desugared, PROGRAM).decls[-2:]
+    assign = assignments(f)[0]
+    assert assign.lvalue.binding == ("f", 2, "int")
+    assert assign.rvalue.left.binding[:2] == ("f", 0)
+    assert assign.rvalue.right.binding == (stack.GLOBAL, 0, "int")
+    bindings = [assign.lvalue.binding for assign in assignments(main)]
+    assert bindings == [
+        (stack.GLOBAL, 0, "int"), # Before the local g is declared
+        ("main", 0, "int"),
+        ("main", 1, "float"),
+        (stack.GLOBAL, 1, "float"),
+        ("main", None, None), # Never declared
+    ]
+    assert main.body.stmts[2].scope == "main"
+
+
+def test_assignments_convert_only_when_types_differ(desugared):
+    main = analyzed(desugared, PROGRAM).decls[-1]
+    converts = [assign.convert for assign in assignments(main)[:4]]
+    assert converts == [None, int, float, float]
+    assert [assign.rvalue.static_type for assign in assignments(main)[2:4]] == ["int", "int"]
+
+
+def test_equal_expressions_in_other_scopes_bind_apart(desugared):
+    ast = analyzed(desugared, '''int x;
+int f(void) {
+    int y;
+    y = x + 1;
+    return y;
+}
+int main(void) {
+    int x, y;
+    y = x + 1;
+}
+''')
+    f_sum, main_sum = [assignments(fn)[0].rvalue for fn in ast.decls[1:]]
+    assert f_sum.left.binding == (stack.GLOBAL, 0, "int")
+    assert main_sum.left.binding == ("main", 0, "int")
+
+
+def test_division_is_specialized_on_static_types(desugared):
+    f, main = analyzed(desugared, PROGRAM.replace("y = 3;", "h = g / x;")).decls[-2:]
+    int_div, float_div = [assign.rvalue for assign in assignments(main)[3:5]]
+    assert CFG.typed_operation(int_div) is CFG.int_divide
+    assert CFG.typed_operation(float_div) is operator.truediv
+    param_div = parse.BinOp(assignments(f)[0].rvalue.left, parse.Const(2, 'int'), '/')
+    assert CFG.typed_operation(param_div) is CFG.divide # Parameters have the type passed
+    assert CFG.int_divide(-7, 2) == CFG.divide(-7, 2) == -3
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+import fastlex
+import scanner
+import tokstream
+
+
+def scan(data):
+    return tokstream.scan(fastlex.FastLexer(), data, scanner.tokens)
+
+
+def stream_of(toks, type_names=scanner.tokens):
+    stream = tokstream.TokenStream(type_names)
+    for tok in toks:
+        stream.append(*tok)
+    return stream
+
+
+def round_trip(stream, type_names=None):
+    out = io.BytesIO()
+    stream.save(out)
+    return tokstream.load(out.getvalue(), type_names)
+
+
+def test_round_trip(gen_source):
+    stream = scan(gen_source(20))
+    loaded = round_trip(stream)
+    assert tokstream.first_difference(stream, loaded) is None
+    assert list(loaded) == list(stream)
+
+
+def test_values_keep_their_class():
+    stream = stream_of([("INT_NUM", 1, 1), ("FLOAT_NUM", 1.0, 1), ("ID", "1", 2)])
+    loaded = round_trip(stream)
+    assert [value.__class__ for _, value, _ in loaded] == [int, float, str]
+    assert len(loaded.values) == 3
+
+
+def test_load_remaps_types():
+    stream = stream_of([("ID", "x", 1), ("SEMICOLON", ";", 1)], ("ID", "SEMICOLON"))
+    loaded = round_trip(stream, ("SEMICOLON", "ID"))
+    assert list(loaded) == list(stream)
+    assert list(loaded.types) == [1, 0]
+
+
+def test_first_difference():
+    lhs = scan("x = 1;\ny = 2;")
+    assert tokstream.first_difference(lhs, scan("x = 1;\ny = 3;")) == 6
+    assert tokstream.first_difference(lhs, scan("x = 1;\ny = 2.0;")) == 6
+    assert tokstream.first_difference(lhs, scan("x = 1;")) == 4
+    assert tokstream.first_difference(lhs, scan("x = 1;\ny = 2;")) is None
+
+
+@pytest.mark.parametrize("data", [b"CTOX", b"CTOK\x02\x00" + bytes(12)])
+def test_bad_streams_are_rejected(data):
+    with pytest.raises(tokstream.TokenStreamError):
+        tokstream.load(data)
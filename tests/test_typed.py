@@ -0,0 +1,88 @@
+import sys
+
+import pytest
+
+from conftest import output
+import stack
+
+MIXED = '''int main(void) {
+    int a[4];
+    float w[3];
+    int i;
+    a[0] = 2.7;
+    a[1] = 4000000000 * 4000000000 * 4;
+    a[2] = 3 > 1;
+    w[0] = 3;
+    w[1] = 2.5;
+    for (i = 0; i < 3; i++) {
+        a[3] = i;
+    }
+    printf("%f\\n", a[0]);
+}
+'''
+
+FILL = '''int main(void) {
+    int i;
+    int a[2000];
+    float w[2000];
+    for (i = 0; i < 2000; i++) {
+        a[i] = i * 2;
+        w[i] = i / 4.0;
+    }
+}
+'''
+
+
+# Output, values and traces of a program run to its end
+def run_output(start, data, names):
+    ctxt = start(data)
+    printed = [output(ctxt.cmd_next, 1000)]
+    for name, index in names:
+        printed.append(output(ctxt.cmd_print, name, index))
+        printed.append(output(ctxt.cmd_trace, name, index))
+    return printed, ctxt
+
+
+def test_typed_arrays_store_values_as_lists_do(start, monkeypatch):
+    names = [("a", None), ("w", None), ("a", 1), ("a", 3), ("w", 0)]
+    as_lists, _ = run_output(start, MIXED, names)
+    monkeypatch.setattr(stack, "typed_array_length", 0)
+    typed, ctxt = run_output(start, MIXED, names)
+    assert typed == as_lists
+    assert "[2.7, 64000000000000000000, True, 2]" in as_lists[1]
+    assert "[3, 2.5, None]" in as_lists[3]
+    w = ctxt.cur_func_table.ref_value.get_value("w")
+    assert isinstance(w, stack.TypedArray) # Holds ints exactly
+    assert not isinstance(ctxt.cur_func_table.ref_value.get_value("a"), stack.TypedArray)
+
+
+def test_large_arrays_are_typed_by_default(start):
+    ctxt = start(FILL)
+    output(ctxt.cmd_next, 10 ** 5)
+    for name in ["a", "w"]:
+        array = ctxt.cur_func_table.ref_value.get_value(name)
+        assert isinstance(array, stack.TypedArray)
+        size = sys.getsizeof(array.items) + sys.getsizeof(array.kinds)
+        assert size / len(array) < 9.5
+    assert ctxt.cur_func_table.ref_value.get_value("w")[3] == 0.75
+
+
+def test_small_arrays_stay_lists(start):
+    ctxt = start(MIXED)
+    output(ctxt.cmd_next, 4)
+    assert isinstance(ctxt.cur_func_table.ref_value.get_value("a"), list)
+
+
+@pytest.mark.parametrize("typecode, value, kept", [
+    ("q", 5, True), ("q", 2 ** 63, False), ("q", 2.0, False), ("q", True, False),
+    ("d", 2.5, True), ("d", 3, True), ("d", 2 ** 60, False), ("q", None, True),
+])
+def test_values_held_as_they_are(typecode, value, kept):
+    array = stack.TypedArray(typecode, 2)
+    assert array.holds(value) == kept
+    if kept:
+        array[1] = value
+        assert array[1] == value and type(array[1]) is type(value)
+    else:
+        with pytest.raises(TypeError):
+            array[1] = value
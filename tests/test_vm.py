@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from conftest import SAMPLES, read_sample, output
+from test_cfg import BRANCHES, NESTED, step_trace
+import CFG
+import vm
+
+
+SKIPPED = '''int g;
+int f(int a, int b) {
+    int t;
+
+    t = a * b;
+
+    return t / 2;
+}
+int main(void) {
+    int i, s;
+    float y;
+    int a[3];
+    s = 0;
+    y = 0.5;
+
+    for (i = 0; i < 3; i++) {
+        a[i] = f(i, s + 1);
+
+        s = s + a[i];
+        y = y / 2 + s;
+    }
+    g = s;
+    printf("%d\\n", g);
+}
+'''
+
+
+# Values and traces of every variable once a program has run to its end
+def final_state(ctxt, data, names):
+    while not ctxt.done:
+        output(ctxt.cmd_next, 7)
+    return [(output(ctxt.cmd_print, name, None), output(ctxt.cmd_trace, name, None)) for name in names]
+
+
+@pytest.mark.parametrize("path", SAMPLES, ids=os.path.basename)
+def test_samples_step_alike(start, path):
+    data = read_sample(path)
+    stepped = step_trace(start(data, engine="graph"), data)
+    assert step_trace(start(data, engine="vm"), data) == stepped
+
+
+@pytest.mark.parametrize("data", [NESTED, BRANCHES, SKIPPED], ids=["nested", "branches", "skipped"])
+def test_programs_step_alike(start, data):
+    stepped = step_trace(start(data, engine="graph"), data)
+    ctxt = start(data, engine="vm")
+    assert isinstance(ctxt.CFG_pc, vm.Machine)
+    assert step_trace(ctxt, data) == stepped
+
+
+def test_runs_of_several_steps_end_alike(start):
+    names = ["g", "i", "s", "y", "a"]
+    ran = final_state(start(SKIPPED, engine="graph"), SKIPPED, names)
+    assert final_state(start(SKIPPED, engine="vm"), SKIPPED, names) == ran
+
+
+def test_bytecode_is_built_once_per_function(start):
+    ctxt = start(BRANCHES, engine="vm")
+    while not ctxt.done:
+        output(ctxt.cmd_next)
+    code = CFG.function_table.table["f"].bytecode
+    assert code is not None
+    assert vm.function_code("f", ctxt.program) is code
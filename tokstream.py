@@ -0,0 +1,257 @@
+import struct
+import sys
+from array import array
+
+# Compact token stream: token types as small ints, line numbers as unsigned ints,
+# and each distinct value stored once in a side table.
+# Binary layout (little-endian):
+#   "CTOK" | version:H | #types:I | #values:I | #tokens:I
+#   type names  : (len:H, utf-8) * #types
+#   values      : (tag:1, payload) * #values   s: len:I + utf-8, i: len:I + decimal, f: float64
+#   types:H * #tokens | lines:I * #tokens | value ids:I * #tokens
+
+MAGIC = b"CTOK"
+VERSION = 1
+
+
+class TokenStreamError(Exception):
+    pass
+
+
+class TokenStream:
+    def __init__(self, type_names):
+        self.type_names = tuple(type_names)
+        self.type_ids = {name: index for index, name in enumerate(self.type_names)}
+        self.types = array("H")
+        self.lines = array("I")
+        self.value_ids = array("I")
+        self.values = []
+        self.value_index = {}
+
+    def __len__(self):
+        return len(self.types)
+
+    # Interns a value, returning its index in the side table
+    def intern(self, value):
+        key = (value.__class__, value)
+        index = self.value_index.get(key)
+        if index is None:
+            index = len(self.values)
+            self.value_index[key] = index
+            self.values.append(value)
+        return index
+
+    # Appends a token, returning its index
+    def append(self, tok_type, value, lineno):
+        self.types.append(self.type_ids[tok_type])
+        self.lines.append(lineno)
+        self.value_ids.append(self.intern(value))
+        return len(self.types) - 1
+
+    # (type, value, lineno) of the index-th token
+    def __getitem__(self, index):
+        return (self.type_names[self.types[index]], self.values[self.value_ids[index]], self.lines[index])
+
+    def __iter__(self):
+        names = self.type_names
+        values = self.values
+        for tok_type, value_id, lineno in zip(self.types, self.value_ids, self.lines):
+            yield (names[tok_type], values[value_id], lineno)
+
+    def save(self, out):
+        out.write(MAGIC)
+        out.write(struct.pack("<HIII", VERSION, len(self.type_names), len(self.values), len(self.types)))
+        for name in self.type_names:
+            encoded = name.encode("utf-8")
+            out.write(struct.pack("<H", len(encoded)))
+            out.write(encoded)
+        for value in self.values:
+            out.write(pack_value(value))
+        for column in (self.types, self.lines, self.value_ids):
+            out.write(little_endian(column).tobytes())
+
+
+def pack_value(value):
+    if isinstance(value, str):
+        encoded = value.encode("utf-8")
+        return b"s" + struct.pack("<I", len(encoded)) + encoded
+    elif isinstance(value, bool):
+        raise TokenStreamError("Unsupported token value {!r}".format(value))
+    elif isinstance(value, int):
+        encoded = str(value).encode("ascii")
+        return b"i" + struct.pack("<I", len(encoded)) + encoded
+    elif isinstance(value, float):
+        return b"f" + struct.pack("<d", value)
+    raise TokenStreamError("Unsupported token value {!r}".format(value))
+
+
+def little_endian(column):
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise TokenStreamError("Truncated token stream")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def column(self, typecode, count):
+        column = array(typecode)
+        column.frombytes(self.take(column.itemsize * count))
+        return little_endian(column)
+
+
+# Loads a stream written by TokenStream.save.
+# When type_names is given, token types are remapped onto that table
+def load(data, type_names=None):
+    reader = Reader(data)
+    if reader.take(4) != MAGIC:
+        raise TokenStreamError("Not a token stream")
+    version, num_types, num_values, num_tokens = reader.unpack("<HIII")
+    if version != VERSION:
+        raise TokenStreamError("Unsupported token stream version {}".format(version))
+    stored_names = [reader.take(reader.unpack("<H")[0]).decode("utf-8") for _ in range(num_types)]
+
+    stream = TokenStream(stored_names if type_names is None else type_names)
+    for _ in range(num_values):
+        tag = reader.take(1)
+        if tag == b"s":
+            value = reader.take(reader.unpack("<I")[0]).decode("utf-8")
+        elif tag == b"i":
+            value = int(reader.take(reader.unpack("<I")[0]))
+        elif tag == b"f":
+            value = reader.unpack("<d")[0]
+        else:
+            raise TokenStreamError("Unknown value tag {!r}".format(tag))
+        stream.value_index[(value.__class__, value)] = len(stream.values)
+        stream.values.append(value)
+
+    stream.types = reader.column("H", num_tokens)
+    stream.lines = reader.column("I", num_tokens)
+    stream.value_ids = reader.column("I", num_tokens)
+    if type_names is not None:
+        try:
+            remap = [stream.type_ids[name] for name in stored_names]
+        except KeyError as e:
+            raise TokenStreamError("Unknown token type {}".format(e))
+        stream.types = array("H", [remap[tok_type] for tok_type in stream.types])
+    return stream
+
+
+# Index of the first differing token, len of the shorter stream when one is a prefix,
+# None when both streams are equal
+def first_difference(lhs, rhs):
+    if lhs.type_names == rhs.type_names and lhs.values == rhs.values:
+        if lhs.types == rhs.types and lhs.lines == rhs.lines and lhs.value_ids == rhs.value_ids:
+            return None
+    for index, (ltok, rtok) in enumerate(zip(lhs, rhs)):
+        if ltok != rtok or ltok[1].__class__ != rtok[1].__class__:
+            return index
+    if len(lhs) != len(rhs):
+        return min(len(lhs), len(rhs))
+    return None
+
+
+# Buffered writer of the human-readable dump, in scanner.lex_scanner's format.
+# Plain text written through write() goes into the same buffer, so it stays in order
+class DumpWriter:
+    def __init__(self, out, chunk=4096):
+        self.out = out
+        self.chunk = chunk
+        self.pending = []
+        self.formatted = {}
+
+    def write(self, text):
+        self.pending.append(text)
+        if len(self.pending) >= self.chunk:
+            self.flush()
+
+    def write_token(self, stream, index):
+        key = (stream.types[index], stream.value_ids[index])
+        body = self.formatted.get(key)
+        if body is None:
+            body = "(%s, '%s')\n" % (stream.type_names[key[0]], stream.values[key[1]])
+            self.formatted[key] = body
+        self.write("Line %d: %s" % (stream.lines[index], body))
+
+    def write_stream(self, stream):
+        for index in range(len(stream)):
+            self.write_token(stream, index)
+
+    def flush(self):
+        if self.pending:
+            self.out.write("".join(self.pending))
+            self.pending = []
+        self.out.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+        return False
+
+
+# Scans data with the given lexer into a new stream
+def scan(lexer, data, type_names):
+    stream = TokenStream(type_names)
+    append = stream.append
+    lexer.input(data)
+    for tok in iter(lexer.token, None):
+        append(tok.type, tok.value, tok.lineno)
+    return stream
+
+
+def read_stream(path, type_names=None):
+    with open(path, "rb") as stream_file:
+        return load(stream_file.read(), type_names)
+
+
+def main(args):
+    import scanner
+    import fastlex
+
+    if len(args) >= 3 and args[0] == "save":
+        source_file = open(args[1])
+        lexer = fastlex.FastLexer() if "--fast" in args[3:] else scanner.get_lexer()
+        stream = scan(lexer, source_file.read(), scanner.tokens)
+        source_file.close()
+        with open(args[2], "wb") as out:
+            stream.save(out)
+        print("{} tokens, {} distinct values".format(len(stream), len(stream.values)))
+    elif len(args) == 2 and args[0] == "dump":
+        with DumpWriter(sys.stdout) as dump:
+            dump.write_stream(read_stream(args[1]))
+    elif len(args) == 3 and args[0] == "diff":
+        lhs = read_stream(args[1])
+        rhs = read_stream(args[2])
+        index = first_difference(lhs, rhs)
+        if index is None:
+            print("Same {} tokens".format(len(lhs)))
+            return 0
+        left = lhs[index] if index < len(lhs) else "<end>"
+        right = rhs[index] if index < len(rhs) else "<end>"
+        print("Token {} differs: {} vs {}".format(index, left, right))
+        return 1
+    else:
+        print("usage: python tokstream.py save <source> <out.tok> [--fast]")
+        print("       python tokstream.py dump <file.tok>")
+        print("       python tokstream.py diff <lhs.tok> <rhs.tok>")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
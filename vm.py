@@ -0,0 +1,405 @@
+import math
+import operator
+
+import parse
+import analysis
+import CFG
+import stack
+from stack import GLOBAL
+
+# Bytecode machine, run by main when Program.engine is "vm".
+# A function's graph is flattened into parallel opcode and argument lists, kept on its
+# Function_Entry. Statements are steps; branches, calls into other graphs and graph ends
+# are jumps between steps, and each call pushes a frame. Statements the machine
+# understands are compiled to Python functions reading the frame's slots straight from
+# the value stack (integer-indexed locals) and appending their writes to its log, so
+# each source line leaves the same history as on the graph. Other statements run the
+# closures of CFG.compile_stmt. Steps stop on the lines CFG.Stepper stops on.
+
+# Steps: each runs one statement, or stops on a line the step skips
+EXEC = 0 # arg: (statement function, line, line of the next statement's step)
+RUN = 1 # EXEC of a statement that may call or return, after which the frame is reloaded
+EMPTY = 2 # an empty node, passed at the start of a step
+# Jumps, in the step of the statement before them
+JUMP = 3 # arg: (pc, line of its step)
+BRANCH = 4 # arg: (condition function, pc and line if it holds, pc and line otherwise, pc and line of the block)
+CALL = 5 # arg: (function, node the call continues with, pc of that node)
+END = 6 # arg: node ending the graph
+ENTER = 7 # arg: loop header, counting its entries
+
+
+# Bytecode of one function, with the frame whose slot addresses its statements read
+class Code:
+    def __init__(self, fun_name):
+        self.fun_name = fun_name
+        self.table = CFG.function_table.table[fun_name].ref_value
+        self.ops = []
+        self.args = []
+        self.starts = {} # Node -> pc jumps to it go to
+        self.blocks = {} # Node -> pc of its first step
+        self.start = 0 # pc the graph starts at
+        self.line = None # Line of its first step
+
+    def emit(self, op, arg=None):
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+
+
+# Bytecode of a function, assembled from its graph when control first reaches it
+def function_code(fun_name, program):
+    fun_entry = CFG.function_table.table[fun_name]
+    if fun_entry.bytecode is None:
+        fun_entry.bytecode = assemble(fun_name, CFG.function_graph(fun_name, program)[0])
+    return fun_entry.bytecode
+
+
+# Flattens a graph in breadth-first order from its entry
+def assemble(fun_name, entry):
+    code = Code(fun_name)
+    nodes = CFG.graph_nodes(entry)
+    compiler = Compiler(code.table, allocated_slots(nodes, code.table.slot_numbers))
+    branches = [] # (pc of a BRANCH, node)
+    for node in nodes:
+        code.starts[node] = len(code.ops)
+        if node.region is not None and node.region[0] == "loop":
+            code.emit(ENTER, node)
+        code.blocks[node] = len(code.ops)
+        if len(node.block) == 0:
+            code.emit(EMPTY)
+        for index, (stmt, line) in enumerate(zip(node.block, node.line_list)):
+            next_line = node.first_lines[index + 1] if index + 1 < len(node.block) else None
+            op = RUN if CFG.is_call_related(stmt) or has_call(stmt) else EXEC
+            code.emit(op, (compiler.statement(node, index), line, next_line))
+        if node.branch:
+            branches.append((code.emit(BRANCH), node))
+        elif node.callee is not None:
+            code.emit(CALL, (node.callee, node.next[0]))
+        elif len(node.next) > 0:
+            code.emit(JUMP, (node.next[0], node.edge_lines[0]))
+        else:
+            code.emit(END, node)
+    for pc, op in enumerate(code.ops):
+        if op == JUMP:
+            target, line = code.args[pc]
+            code.args[pc] = (code.starts[target], line)
+        elif op == CALL:
+            callee, target = code.args[pc]
+            code.args[pc] = (callee, target, code.starts[target])
+    for pc, node in branches:
+        code.args[pc] = (compiler.condition(node),
+                         code.starts[node.next[0]], node.edge_lines[0],
+                         code.starts[node.next[1]], node.edge_lines[1],
+                         code.blocks[node], node.first_lines[0] if len(node.block) != 0 else None)
+    code.start = code.blocks[entry]
+    code.line = entry.first_lines[0] if len(entry.block) != 0 else None
+    return code
+
+
+# Whether a statement calls a function anywhere in it
+def has_call(stmt):
+    return len(analysis.function_calls(stmt, [])) > 0
+
+
+# Per node, the slots of the frame its statements find allocated on every path from the
+# entry: those of the declarations before them. Parameters are left out, as a call
+# into a function whose last value was not taken does not allocate them
+def allocated_slots(nodes, slot_numbers):
+    declared = {node: declared_slots(node, slot_numbers) for node in nodes}
+    preds = {node: [] for node in nodes}
+    for node in nodes:
+        for next_node in node.next:
+            preds[next_node].append(node)
+    every = set(slot_numbers.values())
+    allocated = {node: set() if node is nodes[0] else every for node in nodes}
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes[1:]:
+            found = set.intersection(*[allocated[pred] | declared[pred] for pred in preds[node]]) if preds[node] else set()
+            if found != allocated[node]:
+                allocated[node] = found
+                changed = True
+    return allocated
+
+
+# Slots a node's declarations allocate
+def declared_slots(node, slot_numbers):
+    slots = set()
+    for stmt in node.block:
+        for name in declared_names(stmt):
+            slots.add(slot_numbers[name])
+    return slots
+
+
+def declared_names(stmt):
+    if isinstance(stmt, parse.Statement) and not stmt.returning:
+        stmt = stmt.content
+    if isinstance(stmt, parse.Declaration):
+        return [variable.name for variable in stmt.desugar()]
+    return []
+
+
+# Operators whose Python operator computes what CFG.operations do
+infix = {operator.add: '+', operator.sub: '-', operator.mul: '*', operator.truediv: '/',
+         operator.lt: '<', operator.gt: '>', operator.eq: '=='}
+
+
+# Python functions of the statements and conditions of a function's graph. Each takes
+# the frame's slot addresses, the calling context and the function entry of the context
+class Compiler:
+    def __init__(self, table, allocated):
+        self.table = table
+        self.allocated = allocated
+        self.constants = [] # K in the functions' source: closures and values
+        self.names = dict(runtime_names())
+        self.names["K"] = self.constants
+        self.names["G"] = CFG.global_value_table.slots
+
+    def constant(self, value):
+        self.constants.append(value)
+        return "K[{}]".format(len(self.constants) - 1)
+
+    # Function running statement index of a node
+    def statement(self, node, index):
+        stmt, line = node.block[index], node.line_list[index]
+        allocated = set(self.allocated[node])
+        for earlier in node.block[:index]:
+            allocated.update(self.table.slot_numbers[name] for name in declared_names(earlier))
+        body = self.stmt_source(stmt, line, allocated)
+        if body is None: # Run as the graph runs it
+            code = CFG.compile_stmt(stmt, line)
+            return lambda slots, context, fun_entry: code()
+        return self.function(body)
+
+    # Function evaluating the branch condition of a node
+    def condition(self, node):
+        allocated = self.allocated[node] | declared_slots(node, self.table.slot_numbers)
+        return self.function(["return " + self.expr(node.pred, 0, allocated)])
+
+    def function(self, body):
+        source = "def run(A, X, E):\n" + "".join("    " + line + "\n" for line in body)
+        names = dict(self.names)
+        exec(compile(source, "<vm>", "exec"), names)
+        return names["run"]
+
+    # Lines of Python running a statement, None for those left to CFG.compile_stmt
+    def stmt_source(self, stmt, line, allocated):
+        if isinstance(stmt, CFG.Dummy):
+            return ["pass"]
+        if not isinstance(stmt, parse.Statement) or stmt.returning or CFG.is_call_related(stmt) or has_call(stmt):
+            return None
+        expr = stmt.content
+        if isinstance(expr, parse.Assign) and isinstance(expr.lvalue, parse.Identifier):
+            var = expr.lvalue
+            lines = ["v = " + self.expr(expr.rvalue, line, allocated), "if v is not None:",
+                     "    a = " + self.address(var, allocated, True)]
+            if expr.convert is not None:
+                lines.append("    v = {}(v)".format(expr.convert.__name__))
+            if var.binding is not None and var.binding[2] in ['int', 'float']: # Never an array
+                lines += ["    V[a] = v", "    S[a] = True", "    W[a].append(len(LL))",
+                          "    LA.append(a)", "    LI.append(None)", "    LV.append(v)", "    LL.append({})".format(line)]
+            else:
+                lines.append("    set_value(a, v, {})".format(line))
+            return lines
+        elif isinstance(expr, parse.Assign) and isinstance(expr.lvalue, parse.Temp_Ident):
+            return ["v = " + self.expr(expr.rvalue, line, allocated), "if v is not None:",
+                    "    X.set_temp({}, v)".format(expr.lvalue.slot)]
+        elif isinstance(expr, parse.Assign) and isinstance(expr.lvalue, parse.ArrayIdx) and isinstance(expr.lvalue.array, parse.Identifier):
+            array = expr.lvalue.array
+            return ["v = " + self.expr(expr.rvalue, line, allocated), "if v is not None:",
+                    "    i = " + self.expr(expr.lvalue.index, 0, allocated),
+                    "    set_element({}, i, v, {})".format(self.address(array, allocated, True), line)]
+        elif isinstance(expr, (parse.Assign, parse.Declaration, parse.PrintStmt)):
+            return None
+        return [self.expr(expr, line, allocated)]
+
+    # Address of a variable, as CFG.address_of finds it. Globals are only looked up as
+    # whole variables or written elements, else they are KeyErrors
+    def address(self, var, allocated, whole):
+        scope, slot = var.binding[0], var.binding[1]
+        if scope is GLOBAL:
+            return "G[{}]".format(slot) if whole else "missing({!r})".format(var.name)
+        elif slot is None:
+            return "missing({!r})".format(var.name)
+        elif slot in allocated:
+            return "A[{}]".format(slot)
+        return "address(A, {}, {!r})".format(slot, var.name)
+
+    # Python expression of an expression, evaluated as CFG.compile_expr's closures do
+    def expr(self, expr, line, allocated):
+        if isinstance(expr, parse.Const):
+            if type(expr.value) == int or (type(expr.value) == float and math.isfinite(expr.value)):
+                return repr(expr.value)
+            return self.constant(expr.value)
+        elif isinstance(expr, parse.Identifier):
+            return "V[{}]".format(self.address(expr, allocated, True))
+        elif isinstance(expr, parse.Temp_Ident):
+            return "temp(X, {}, {!r})".format(expr.slot, expr.name)
+        elif isinstance(expr, parse.ArrayIdx) and isinstance(expr.array, parse.Identifier):
+            index = self.expr(expr.index, 0, allocated)
+            array = expr.array
+            if array.binding[0] is not GLOBAL and array.binding[1] in allocated:
+                return "V[A[{}]][{}]".format(array.binding[1], index) # Reading the index first gives the same list
+            return "element(A, {}, {!r}, {})".format(array.binding[1] if array.binding[0] is not GLOBAL else None, array.name, index)
+        elif isinstance(expr, parse.BinOp):
+            left = self.expr(expr.left, line, allocated)
+            right = self.expr(expr.right, line, allocated)
+            op = CFG.typed_operation(expr)
+            if op in infix:
+                return "({} {} {})".format(left, infix[op], right)
+            elif op is CFG.int_divide:
+                return "int({} / {})".format(left, right)
+            elif op is CFG.divide:
+                return "divide({}, {})".format(left, right)
+            return "no_operator({}, {}, {!r})".format(left, right, expr.op)
+        elif isinstance(expr, parse.UniOp) and expr.op == '++' and isinstance(expr.operand, parse.Identifier):
+            var = expr.operand
+            if var.binding[0] is GLOBAL:
+                return "missing({!r})".format(var.name)
+            return "increment({}, {})".format(self.address(var, allocated, True), line)
+        elif isinstance(expr, parse.UniOp) and expr.op in ['-', '+'] and not expr.postfix:
+            operand = self.expr(expr.operand, line, allocated)
+            return "(-1 * {})".format(operand) if expr.op == '-' else operand
+        elif isinstance(expr, parse.UniOp) and expr.op != '++':
+            return "not_implemented()"
+        return self.constant(CFG.compile_expr(expr, line)) + "(X, E)"
+
+
+# Names the functions of statements use: the value stack's arrays and its write log,
+# and the helpers for the rarer cases
+def runtime_names():
+    values = stack.value_stack
+
+    # Writes a value as ValueStack.set_value does, returning it
+    def store(address, value, line):
+        values.set_value(address, value, line)
+        return value
+
+    def missing(name):
+        raise KeyError(name)
+
+    def address(slots, slot, name):
+        address = slots[slot]
+        if address is None:
+            raise KeyError(name)
+        return address
+
+    def temp(context, slot, name):
+        value = context.get_temp(slot)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    # Element of a local array whose slot may not be allocated, or of a global (slot None)
+    def element(slots, slot, name, index):
+        if slot is None:
+            raise KeyError(name)
+        return values.values[address(slots, slot, name)][index]
+
+    def increment(address, line):
+        value = values.values[address]
+        store(address, value + 1, line)
+        return value + 1
+
+    def no_operator(left, right, op):
+        raise KeyError(op)
+
+    def not_implemented():
+        raise Exception("not implemented uniop")
+
+    return {"V": values.values, "S": values.shared, "W": values.writes,
+            "LA": values.log_addresses, "LI": values.log_indices, "LV": values.log_values, "LL": values.log_lines,
+            "set_value": values.set_value, "set_element": values.set_element, "divide": CFG.divide,
+            "missing": missing, "address": address, "temp": temp, "element": element,
+            "increment": increment, "no_operator": no_operator, "not_implemented": not_implemented}
+
+
+# Position of the running program, as CFG.Stepper keeps it: the code and pc of the next
+# step, the line it stops at, and the frames of the calls to return to
+class Machine:
+    def __init__(self, fun_name, program):
+        self.program = program
+        self.code = function_code(fun_name, program)
+        self.pc = self.code.start
+        self.line = self.code.line
+        self.frames = [] # (code, node the call continues with, its pc)
+
+    # Runs up to count steps, returning how many were taken: fewer at the end of the program
+    def run(self, count):
+        code, pc, line, frames = self.code, self.pc, self.line, self.frames
+        ops, args = code.ops, code.args
+        called = CFG.call_stack
+        table = CFG.function_table.table
+        context = called.called[0] if len(called.called) > 0 else None
+        fun_entry = table[context.name] if context is not None else None
+        slots = code.table.slots
+        line_num = CFG.line_num
+        steps = 0
+        ran = False # Whether the step taken last ran a statement
+        start = (pc, line) # Step the machine is at if the current one fails
+        try:
+            while True:
+                op = ops[pc]
+                if op == EXEC or op == RUN:
+                    if steps == count:
+                        break
+                    start = (pc, line)
+                    run, stmt_line, next_line = args[pc]
+                    if line < stmt_line: # A skipped line
+                        line_num = line
+                        line += 1
+                        steps += 1
+                        ran = True
+                        continue
+                    run(slots, context, fun_entry)
+                    line_num = stmt_line
+                    steps += 1
+                    ran = True
+                    if op == RUN:
+                        context = called.called[0] if len(called.called) > 0 else None
+                        fun_entry = table[context.name] if context is not None else None
+                        slots = code.table.slots
+                    pc += 1
+                    line = next_line
+                elif op == JUMP:
+                    pc, line = args[pc]
+                elif op == BRANCH:
+                    condition, then_pc, then_line, else_pc, else_line, block_pc, block_line = args[pc]
+                    if ran: # If the condition fails, the next step starts the block again
+                        start = (block_pc, block_line)
+                    if condition(slots, context, fun_entry):
+                        pc, line = then_pc, then_line
+                    else:
+                        pc, line = else_pc, else_line
+                elif op == ENTER:
+                    args[pc].runs += 1
+                    pc += 1
+                elif op == EMPTY:
+                    if steps == count:
+                        break
+                    start = (pc, line)
+                    ran = False
+                    pc += 1
+                elif op == CALL:
+                    callee, node, next_pc = args[pc]
+                    frames.append((code, node, next_pc))
+                    code = function_code(callee, self.program)
+                    ops, args = code.ops, code.args
+                    pc, line = code.start, code.line
+                    slots = code.table.slots
+                else: # END
+                    node = args[pc]
+                    if len(frames) == 0: # The step that ends the program is not taken
+                        return steps - 1 if ran else steps
+                    code, next_node, pc = frames.pop()
+                    ops, args = code.ops, code.args
+                    line = CFG.edge_line(node, next_node, False)
+                    slots = code.table.slots
+        except BaseException:
+            pc, line = start
+            raise
+        finally:
+            self.code, self.pc, self.line = code, pc, line
+            CFG.line_num = line_num
+        return steps